@@ -0,0 +1,107 @@
+# Aggregation layer for the SEMS dashboard
+# Most charts and KPIs are a count of SEMS grouped by one or two columns, so instead of
+# running a groupby over the full df for every chart, the df is grouped once into a
+# count cube (one row per combination of the dimensions below that actually occurs)
+# and every chart reads its counts from the much smaller cube.
+import numpy as np
+import pandas as pd
+
+# Dimensions of the count cube
+CUBE_DIMENSIONS = [
+    'FW', 'SEM Status', 'Priority', 'CAT', 'Sales Region', 'Carrier',
+    'Sold-To ID', 'Assigned To Team', 'SEM Issue Type',
+]
+
+
+# Group the df into a count cube with a `Count` column
+# Grouping is done on the integer codes of each column (missing values are kept as their own group,
+# so totals over the cube match the row count of the df), the codes are then mapped back
+# to categoricals
+def count_cube(df, dimensions=CUBE_DIMENSIONS):
+    dims = [dim for dim in dimensions if dim in df.columns]
+    codes = {}
+    categories = {}
+    for dim in dims:
+        col = df[dim]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            codes[dim] = col.cat.codes.to_numpy()
+            categories[dim] = col.cat.categories
+        else:
+            codes[dim], uniques = pd.factorize(col, sort=True)
+            categories[dim] = pd.Index(uniques)
+    cube = pd.DataFrame(codes).groupby(dims, sort=False).size().reset_index(name='Count')
+    for dim in dims:
+        cube[dim] = pd.Categorical.from_codes(cube[dim], categories=categories[dim])
+    return cube
+
+
+# Rows of the cube matching every column == value pair in `where`
+# a list of values matches any of them
+def cube_where(cube, where=None):
+    if not where:
+        return cube
+    mask = pd.Series(True, index=cube.index)
+    for col, value in where.items():
+        if isinstance(value, (list, tuple, set)):
+            mask &= cube[col].isin(value)
+        else:
+            mask &= cube[col] == value
+    return cube[mask]
+
+
+# Total number of SEMS matching `where`
+def cube_total(cube, where=None):
+    return int(cube_where(cube, where)['Count'].sum())
+
+
+# Number of SEMS per value of `by` (a column or list of columns), sorted by `by`
+# Missing values are dropped, the same as a groupby on the df
+def cube_counts(cube, by, where=None):
+    sub = cube_where(cube, where)
+    counts = sub.groupby(by, observed=True)['Count'].sum().sort_index()
+    return counts
+
+
+# Value count dataframe (`by` columns + Count) sorted by Count, largest first
+# n limits it to the top n rows
+def top_counts(cube, by, n=None, where=None):
+    df = cube_counts(cube, by, where).reset_index()
+    df = df.sort_values('Count', ascending=False, kind='mergesort', ignore_index=True)
+    if n is not None:
+        df = df.head(n)
+    # back to plain values so plotly doesn't draw every unused category
+    by_cols = [by] if isinstance(by, str) else list(by)
+    for col in by_cols:
+        df[col] = df[col].astype(object)
+    return df
+
+
+# Value of `by` with the most SEMS matching `where`, None if there are none
+def most_common(cube, by, where=None):
+    df = top_counts(cube, by, n=1, where=where)
+    if df.empty:
+        return None
+    return df[by].iloc[0]
+
+
+# Map every value of `column` to the row positions holding it
+# Built once with a stable argsort of the column codes, so selecting the rows of one carrier or
+# customer is an iloc on its positions rather than a scan of the whole column.
+# Keys are the values as strings (the deep dive widgets pass strings)
+def partition_index(df, column):
+    col = df[column]
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        codes, values = col.cat.codes.to_numpy(), col.cat.categories
+    else:
+        codes, values = pd.factorize(col)
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes[codes >= 0], minlength=len(values))
+    # missing values (code -1) sort to the front
+    bounds = np.concatenate([[0], np.cumsum(counts)]) + np.count_nonzero(codes < 0)
+    return {str(values[i]): order[bounds[i]:bounds[i + 1]] for i in range(len(values)) if counts[i]}
+
+
+# Rows of df whose partitioned column is exactly `value`
+def partition_rows(df, index, value):
+    positions = index.get(str(value), np.empty(0, dtype=np.intp))
+    return df.iloc[positions]
@@ -1,12 +1,21 @@
 # import packages
 import streamlit as st
 import pandas as pd
-import numpy as np
 import plotly.express as px
-from natsort import natsort_keygen
 from datetime import date,timedelta
 import os
 import io
+import ingest
+import aggregate
+import kpi
+import charts
+import followup
+import backend
+import diagnostics
+import report
+import registry
+import store
+import trend
 
 # page title
 st.set_page_config(page_title = 'SEMs Dashboard',layout='wide',page_icon=':bar_chart')
@@ -14,6 +23,11 @@ st.set_page_config(page_title = 'SEMs Dashboard',layout='wide',page_icon=':bar_c
 
 st.sidebar.markdown("## Dashboard Parameters")
 
+# prepared datasets and their aggregates, one copy per process shared by every session (see registry.py)
+@st.cache_resource
+def dataset_registry():
+    return registry.new_registry()
+
 # Password authentication to access app
 # Password is changed in secrets.toml file
 def check_password():
@@ -47,49 +61,135 @@ def check_password():
 # if Password is correct load sidebar
 if check_password():
 
-    # Upload Raw excel file
-    sems = st.sidebar.file_uploader("Upload SEMS data", type="xlsx")
-    # if a file has been uploaded run
-    if sems is not None:
-
-        # read in excel file to pandas df
-        # @st.experimental_memo used to cache computationally heavy functions
-        @st.experimental_memo
-        def read_excel(df):
-            sems_df = pd.read_excel(df, sheet_name=0, engine="openpyxl")
-            return sems_df
-        sems_df = read_excel(sems)
-
-        # Filter df to specifications required for dashboard
-        # Drop all AOU,RMA,C2C sems
-        # Only region needed for dashboard is Western Europe
-        @st.experimental_memo
-        def data_filter(df):
-            # 1. Drop unneeded columns
-            # 2. Drop non Western Europe
-            # 3. Drop RMA -> Failed Pickup etc
-            # 4. Drop AOU
-            # 5. Drop C2C
-            cols_to_drop = ['RMA  Nr', 'Assigned To User Name', 'Resolution', 'Wk 12/13', 'Sales District']
-            df.drop(cols_to_drop, inplace=True, axis=1)
-            regions_to_keep = ['South Europe', "DACH", 'UK&I', 'North Europe']
-            df = df[df["Sales Region"].isin(regions_to_keep)]
-            df = df[~df["Created by Team Name"].str.contains("RMA")]
-            df = df[~df["Created by Team Name"].str.contains("CSS CRU")]
-            df = df[~df["Created by Team Name"].str.contains("C2C")]
-            df = df[~df["Carrier"].str.contains("RMA",na=False)]
-            df = df[~df["CAT"].str.contains("AOU")]
-            df = df[~df["Assigned To Team"].str.contains("C2C",na=False)]
-
-            return df
-
-
-        sems_df = data_filter(sems_df)
+    # Upload Raw excel files, e.g. one weekly extract each
+    sems_files = st.sidebar.file_uploader("Upload SEMS data", type="xlsx", accept_multiple_files=True)
+    # optionally keep every upload in the local history store (see store.py), the dashboard then
+    # runs on the history of the chosen dates and opens without an upload
+    use_store = st.sidebar.checkbox("Keep SEMS history in local store", value="SEMS_STORE_PATH" in os.environ)
+    # if a file has been uploaded (or there is history) run
+    if sems_files or (use_store and store.row_count() > 0):
+
+        # read in excel file and filter it to the specifications required for dashboard
+        # the filtered df is cached on disk keyed by a hash of the file (see ingest.py) and kept in
+        # memory once in the dataset registry, sessions uploading the same files share it
+        # very large exports are streamed in chunks so the whole workbook is never held in memory
+        datas = [sems.getvalue() for sems in sems_files]
+        streaming = st.sidebar.checkbox("Low memory ingest (large files)",
+                                        value=max((len(data) for data in datas), default=0) > ingest.STREAMING_THRESHOLD_BYTES)
+        ingest_progress = st.sidebar.empty()
+
+        def show_ingest_progress(rows_read, total_rows):
+            if total_rows:
+                ingest_progress.progress(min(rows_read / total_rows, 1.0))
+            else:
+                ingest_progress.caption(f"Read {rows_read} rows...")
+
+        def load_file(data):
+            return ingest.load_sems(data, streaming=streaming, progress=show_ingest_progress)
+
+        # files are merged into one dataset with one row per SEM ID (the latest Modified Date Time wins)
+        # the session remembers its dataset, so adding a file only parses and merges that file
+        # (as long as the dataset it adds to is still in the registry)
+        datasets = dataset_registry()
+        rules = ingest.load_exclusion_rules()
+        uploads = dict(zip((ingest.fingerprint(data, rules) for data in datas), datas))
+        if use_store:
+            # only files not in the store yet are loaded and upserted
+            stored = store.stored_keys()
+            new = [data for key, data in uploads.items() if key not in stored]
+            if new:
+                store.upsert([load_file(data) for data in new])
+            # only the SEMS created in the date range last submitted with the form are read (the form's
+            # date widgets keep it in session_state), again only after an upsert or a new range
+            history_start = st.session_state.get("start_date", date.today() - timedelta(30))
+            history_end = st.session_state.get("end_date", date.today())
+            dataset_key = store.store_key(start=history_start, end=history_end)
+            sems_df, ingest_info = registry.get_dataset(
+                datasets, dataset_key, lambda: store.load_history(start=history_start, end=history_end))
+        else:
+            dataset_key = ingest.combined_fingerprint(list(uploads))
+
+            def load_dataset():
+                sems_df, ingest_info = None, None
+                previous = registry.peek(datasets, st.session_state.get("sems_dataset_key"))
+                if previous is not None and set(previous[1]["keys"]) <= set(uploads):
+                    sems_df, ingest_info = previous
+                new = [data for key, data in uploads.items() if ingest_info is None or key not in ingest_info["keys"]]
+                return ingest.merge_loaded([load_file(data) for data in new], sems_df, ingest_info)
+            sems_df, ingest_info = registry.get_dataset(datasets, dataset_key, load_dataset)
+            st.session_state["sems_dataset_key"] = dataset_key
+        ingest_progress.empty()
+        if use_store:
+            st.sidebar.caption(f"History store: {ingest_info['files']} file(s), {ingest_info['rows_kept']} SEMS "
+                               f"created {history_start} to {history_end} read in {ingest_info['seconds']:.2f}s, "
+                               f"{ingest_info['memory_bytes'] / 1e6:.1f} MB in memory")
+        else:
+            st.sidebar.caption(f"{ingest_info['files']} file(s), {ingest_info['rows_kept']} SEMS "
+                               f"({ingest_info['duplicates']} duplicate SEM IDs dropped). "
+                               f"Parsed {ingest_info['rows_parsed']} new rows via {ingest_info['engine']} "
+                               f"in {ingest_info['seconds']:.2f}s, "
+                               f"{ingest_info['memory_bytes'] / 1e6:.1f} MB in memory")
+        # rows removed by each exclusion rule in config/exclusion_rules.json
+        filter_report = ingest_info["filter"]
+        if filter_report is not None:
+            with st.sidebar.expander("Data filter summary"):
+                st.caption(f"{filter_report['rows_in']} rows in, {filter_report['rows_out']} kept "
+                           f"in {filter_report['seconds']:.3f}s")
+                st.table(pd.DataFrame(list(filter_report["removed"].items()), columns=["Rule", "Rows Removed"]))
+
+        # group-bys of the Region, Partner, Carrier and Customer sections run on this backend (see backend.py)
+        query_backends = backend.available_backends()
+        query_backend = backend.QUERY_BACKEND if backend.QUERY_BACKEND in query_backends else "pandas"
+        if len(query_backends) > 1:
+            query_backend = st.sidebar.selectbox("Query backend", query_backends,
+                                                 index=query_backends.index(query_backend))
+
+        # every chart goes through show_chart so the size of the figure sent to the browser can be checked
+        show_payload = st.sidebar.checkbox("Show chart payload sizes")
+        figure_cache_status = st.sidebar.empty()
+        registry_status = st.sidebar.empty()
+
+        def show_registry_status():
+            with registry_status.container():
+                st.caption(registry.registry_summary(datasets))
+                with st.expander("Dataset registry"):
+                    st.dataframe(registry.registry_table(datasets))
+        show_registry_status()
+
+        # opt in timing / memory / payload table per section (see diagnostics.py), ?diagnostics=1 in the url
+        diagnostics_on = diagnostics.enabled(st.query_params.to_dict(), st.secrets)
+        diagnostics_panel = st.sidebar.empty()
+
+        # built figures are shared by every session, keyed by the dataset and view (see charts.py)
+        @st.cache_resource
+        def figure_cache():
+            return charts.new_figure_cache()
+
+        # build() makes the figure, it is only called when the figure for this dataset, date range,
+        # query backend, section, chart and entity (a carrier/customer deep dive) isn't cached yet
+        def show_chart(section, chart, build, entity=None):
+            cache = figure_cache()
+            key = (ingest_info["key"], start_date, end_date, query_backend, section, chart, entity)
+            entry = charts.cached_figure(cache, key, build)
+            st.plotly_chart(entry["fig"], use_container_width=True)
+            if diag is not None:
+                diagnostics.add_figure(diag, charts.entry_bytes(entry))
+            if show_payload:
+                st.caption(f"Figure payload: {charts.format_bytes(charts.entry_bytes(entry))}")
+            figure_cache_status.caption(charts.figure_cache_summary(cache))
+
+        # In store mode only the date range is in memory, the top customers / carriers are counted over
+        # the whole history by sqlite instead, once per store contents and range
+        def stored_top_values(column, minimum):
+            return registry.get_derived(datasets, dataset_key, ("top values", column, minimum),
+                                        lambda: store.top_values(column, minimum))
 
         # Get customers who have had >75 SEMS. This is arbitrary and chosen for performance and usability
         # To include all customers remove lambda or reduce threshold
         # This function is used to populate customer multiselect widget in the additional parameter section
         def get_top_customers(df):
+            if use_store:
+                return stored_top_values("Sold-To ID", 75)
             return (list(df["Sold-To ID"].value_counts().loc[lambda x: x>75].index))
 
 
@@ -98,6 +198,8 @@ if check_password():
         # This function is used to populate carrier multiselect widget in the additional parameter section
         unique_customer_list = get_top_customers(sems_df)
         def get_top_carriers(df):
+            if use_store:
+                return stored_top_values("Carrier", 40)
             return (list(df["Carrier"].value_counts().loc[lambda x: x>40].index))
 
 
@@ -110,7 +212,7 @@ if check_password():
             with st.sidebar:
                 # Used for the start date calender widget
                 def start_data_date():
-                    start_date = st.date_input('Start Date', value=(date.today() - timedelta(30)))
+                    start_date = st.date_input('Start Date', value=(date.today() - timedelta(30)), key="start_date")
                     start_date = str(start_date)
                     return start_date
                 start_date = start_data_date()
@@ -118,14 +220,14 @@ if check_password():
 
                 # Used for the end date calender widget
                 def end_data_date():
-                    end = st.date_input('End Date', value=date.today())
+                    end = st.date_input('End Date', value=date.today(), key="end_date")
                     end_date = str(end)
                     return end_date
                 end_date = end_data_date()
 
                 # Filter out all rows that fall outside the range chosen by the user
-                sems_df["Created On"] = sems_df["Created On"].astype(str)
-                sems_df = sems_df[(sems_df["Created On"] >= start_date) & (sems_df["Created On"] <=end_date)]
+                # sems_df is sorted by Created On so this is a binary search, not a scan
+                sems_df = ingest.slice_dates(sems_df, start_date, end_date)
 
                 # Multiselect button to allow the user to populate a dashboard on an area of focus
                 def dashboard_section_selector():
@@ -141,6 +243,13 @@ if check_password():
                     days = st.slider("Select minimum number of Action Days for Excel File Generator", min_value = 0, max_value = 30, value = 10)
                     return days
                 action_days = action_day_selector()
+                # file format of the follow up file, Excel by default
+                export_format = st.selectbox("Follow up file format", list(followup.EXPORT_FORMATS),
+                                             format_func=lambda key: followup.EXPORT_FORMATS[key][0])
+                # optionally one sheet (or with zip, one file) per carrier or team
+                export_split = st.selectbox("Split follow up file by", [None] + followup.EXPORT_SPLITS,
+                                            format_func=lambda split: "No split" if split is None else split)
+                export_zip = st.checkbox("Zip of one file per group")
                 st.header("Additional Parameters")
 
                 # This section is for if the user needs a specific carrier/ customer that is not in the top results.
@@ -174,20 +283,6 @@ if check_password():
 
 
 
-                # Helper Function to a sorted unique list of which customers are present in the uploaded excel file
-                @st.experimental_memo
-                def sort_quarters(df):
-                    year_quarter_list = df["FW"].unique()
-                    year_quarter_list = [i.split('W', 1)[0] for i in year_quarter_list]
-                    quarter_list = []
-                    for i in year_quarter_list:
-                        if i not in quarter_list:
-                            quarter_list.append(i)
-
-                    fq_params = sorted(quarter_list,reverse=True)
-                    return fq_params
-                fq_params = sort_quarters(sems_df)
-
                 # unique list of weeks present
                 def number_of_weeks(df):
                     return len(list(df['FW'].unique()))
@@ -197,319 +292,174 @@ if check_password():
 
 
         # If the submit button is pressed we batch import the parameters and run the script
+        # the dashboard stays up after the first submit so buttons on it (like generating the
+        # follow up file) don't clear it, form values only change when it is submitted again
         if submit_button:
+            st.session_state["dashboard_submitted"] = True
+        if st.session_state.get("dashboard_submitted"):
+            diag = None
+            if diagnostics_on:
+                diag = diagnostics.new_run(dataset_key=ingest_info["key"], start_date=start_date, end_date=end_date,
+                                           query_backend=query_backend, sections=dashboard_selection)
+            # tracemalloc (started by new_run) is stopped however the rerun ends: an error, st.stop or a
+            # widget change interrupting it
+            try:
+                diagnostics.section(diag, "Date slicing and count cube", len(sems_df))
+
+                # aggregates of the dataset for this date range, built once and shared through the
+                # dataset registry so graph_data itself is never hashed or copied on a rerun
+                def derived(name, build, *args):
+                    return registry.get_derived(datasets, dataset_key, (name, start_date, end_date) + args, build)
+
+                # drop rows that fall outside the specified date range and add a quarters column
+                # graph_data will be main dataframe we call for graphing
+                graph_data = derived("dashboard frame", lambda: report.dashboard_frame(sems_df, start_date, end_date))
+                if len(graph_data["FW"].unique())==0:
+                    st.error("ERROR: No SEMS Data to Analyse")
+
+                # Count cube shared by the sections, one groupby instead of one per chart (see aggregate.py)
+                cube = derived("count cube", lambda: aggregate.count_cube(graph_data))
+                open_sems = {"SEM Status": "Open"}
+
+                # SEMS per value of `by` from the count cube, largest first, on the chosen query backend
+                def cube_top_counts(by, n=None, where=None):
+                    return backend.top_counts(cube, by, n=n, where=where, weight='Count', backend=query_backend)
+
+                # row positions of every carrier and customer, used to slice the deep dives (see aggregate.py)
+                def build_entity_index(column):
+                    return derived("entity index", lambda: aggregate.partition_index(graph_data, column), column)
+
+                # daily counts and OLS trendline of every carrier / customer in one pass (see trend.py)
+                def build_trend_lines(column):
+                    return derived("trend lines", lambda: trend.trend_lines(graph_data, column), column)
+
+                st.markdown("# SEMS DASHBOARD")
 
-            # drop rows that fall outside the specified date range
-            @st.experimental_memo
-            def drop_unneeded_date_row(df,start,end):
-                sems_df = df[(df["Created On"] >= start) & (df["Created On"] <= end)]
-                return sems_df
-            # graph_data will be main dataframe we call for graphing
-            graph_data = drop_unneeded_date_row(sems_df,start_date,end_date)
-            if len(graph_data["FW"].unique())==0:
-                st.error("ERROR: No SEMS Data to Analyse")
-
-            # add a quarters column to our dataframe (Not sure if its actually used so might delete)
-            @st.experimental_memo
-            def add_quarters_column(df):
-                df['Quarter'] = (np.where(df['FW'].str.contains('W'),
-                                       df['FW'].str.split('W').str[0],
-                                       df['FW']))
-                return df
-            graph_data = add_quarters_column(graph_data)
-
-
-            # Function to create a dataframe with open status only
-            # Used for graphing
-            @st.experimental_memo
-            def open_status_df(df):
-                status = ["Open"]
-                df = df[df["SEM Status"].isin(status)]
-                return df
-
-
-            # Function to create a dataframe with closed status only
-            # Used for graphing
-            @st.experimental_memo
-            def closed_status_df(df):
-                status = ["Closed"]
-                df = df[df["SEM Status"].isin(status)]
-                return df
-            st.markdown("# SEMS DASHBOARD")
-
-            st.markdown("<hr/>", unsafe_allow_html=True)
-
-            # Helper Function that returns percentage of the two parameters passed. Used for KPIs
-            def percentage(part, whole):
-                if round(float(whole), 0) == 0:
-                    return str(round(100 * float(part), 2))
-                Percentage = round(100 * float(part) / float(whole), 2)
-                return str(Percentage) + '%'
-
-            # Get a count of the number of rows in the df
-            def row_count(df):
-                num_rows = len(df.index)
-                return num_rows
-
-            # get just open and closed status (delete)
-            def open_closed_status_df(df):
-                status = ["Open", "Closed"]
-                df = df[df["SEM Status"].isin(status)]
-                return df
-            # produce a value count dataframe
-            def value_counts_df(df, col):
-
-                df = df.groupby(col).size()
-                df = pd.DataFrame(df, columns=['Count'])
-                df.index.name = col
-                df[col] = df.index
-                return df
-
-            # helper function
-            def df_with_two(df, col):
-                values = sorted(list(df[col].unique()), reverse=True)
-                values = values[:2]
-                df_compare = df[df[col].isin(values)]
-                return df_compare
-
-            # helper functions for week on week metrics
-            # current_df generates a dataframe with the current weeks metrics
-            def current_df(df, col):
-                values = sorted(list(df[col].unique()), reverse=True)
-                df_compare = df[df[col] == values[0]]
-                return df_compare
-
+                st.markdown("<hr/>", unsafe_allow_html=True)
 
-            # helper functions for week on week metrics
-            # previous_df generates a dataframe with the previous weeks metrics
-            def previous_df(df, col):
-                values = sorted(list(df[col].unique()), reverse=True)
-                df_compare = df[df[col] == values[1]]
-                return df_compare
+                # Helper Function that returns percentage of the two parameters passed. Used for KPIs
+                def percentage(part, whole):
+                    if round(float(whole), 0) == 0:
+                        return str(round(100 * float(part), 2))
+                    Percentage = round(100 * float(part) / float(whole), 2)
+                    return str(Percentage) + '%'
 
+                # every Main KPI (overall, per week and per quarter) in one table (see kpi.py)
+                kpi_table = derived("kpi table", lambda: kpi.kpi_table(cube))
 
 
-            # If Main KPI is included in multiselect button run this block of code
-            if "Main KPI's" in dashboard_selection:
 
-                st.markdown("## Main KPIs")
+                # If Main KPI is included in multiselect button run this block of code
+                if "Main KPI's" in dashboard_selection:
+                    diagnostics.section(diag, "Main KPI's", len(graph_data))
 
-                first_kpi, second_kpi, third_kpi = st.columns(3)
+                    st.markdown("## Main KPIs")
 
+                    first_kpi, second_kpi, third_kpi = st.columns(3)
+                    totals = kpi.kpi_row(kpi_table)
 
 
-                # FIRST ROW OF KPIS
-                with first_kpi:
-                    st.markdown("**Number of SEMS**")
-                    num_sems = len(graph_data.index)
-                    st.markdown(f"<h1 style='text-align: left; color: gold;'>{num_sems}</h1>", unsafe_allow_html=True)
-                with second_kpi:
-                    st.markdown("**Number of Open Cases**")
-                    num_open = graph_data['SEM Status'].str.contains(r"Open").sum()
-                    st.markdown(f"<h1 style='text-align: left; color: gold;'>{num_open}</h1>", unsafe_allow_html=True)
-                with third_kpi:
-                    st.markdown("**No. Open Priority 1**")
-                    open_df = open_status_df(graph_data)
-                    num_p1 = open_df['Priority'].str.contains(r"P1").sum()
 
-                    st.markdown(f"<h1 style='text-align: left; color: gold;'>{num_p1}</h1>",
-                                unsafe_allow_html=True)
+                    # FIRST ROW OF KPIS
+                    with first_kpi:
+                        st.markdown("**Number of SEMS**")
+                        num_sems = totals['SEMS']
+                        st.markdown(f"<h1 style='text-align: left; color: gold;'>{num_sems}</h1>", unsafe_allow_html=True)
+                    with second_kpi:
+                        st.markdown("**Number of Open Cases**")
+                        num_open = totals['Open']
+                        st.markdown(f"<h1 style='text-align: left; color: gold;'>{num_open}</h1>", unsafe_allow_html=True)
+                    with third_kpi:
+                        st.markdown("**No. Open Priority 1**")
+                        num_p1 = totals['Open P1']
 
+                        st.markdown(f"<h1 style='text-align: left; color: gold;'>{num_p1}</h1>",
+                                    unsafe_allow_html=True)
 
 
 
 
 
-                # SECOND ROW OF KPIS
-                st.markdown("<hr/>", unsafe_allow_html=True)
 
-                st.markdown("## Secondary KPIs")
+                    # SECOND ROW OF KPIS
+                    st.markdown("<hr/>", unsafe_allow_html=True)
 
+                    st.markdown("## Secondary KPIs")
 
 
 
 
 
-                first_kpi, second_kpi, third_kpi, fourth_kpi, fifth_kpi = st.columns(5)
-                with first_kpi:
-                    st.markdown("**% of Cases Open**")
-                    open_status_count  = graph_data['SEM Status'].str.contains(r"Open").sum()
-                    open_percent = percentage(open_status_count,row_count(graph_data))
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{open_percent}</h1>", unsafe_allow_html=True)
 
-                with second_kpi:
-                    st.markdown("**Team Most Cases**")
-                    open_df = open_status_df(graph_data)
-                    x = open_df.groupby('Assigned To Team').size()
-                    df = pd.DataFrame(x, columns=['Count'])
-                    df["Team"] = df.index
-                    df = df.sort_values('Count')
-                    team_name = (df['Team'].values[-1])
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 15px;'>{team_name}</h1>",unsafe_allow_html=True)
+                    first_kpi, second_kpi, third_kpi, fourth_kpi, fifth_kpi = st.columns(5)
+                    with first_kpi:
+                        st.markdown("**% of Cases Open**")
+                        open_percent = kpi.format_kpi(totals['% Open'], percent=True)
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{open_percent}</h1>", unsafe_allow_html=True)
 
-                with third_kpi:
-                    st.markdown("**Most Common Issue**")
-                    open_df = open_status_df(graph_data)
-                    x = open_df.groupby('SEM Issue Type').size()
-                    df = pd.DataFrame(x, columns=['Count'])
-                    df["Issue"] = df.index
-                    df = df.sort_values('Count')
-                    issue_name = (df['Issue'].values[-1])
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 15px;'>{issue_name}</h1>", unsafe_allow_html=True)
+                    with second_kpi:
+                        st.markdown("**Team Most Cases**")
+                        team_name = aggregate.most_common(cube, 'Assigned To Team', open_sems)
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 15px;'>{team_name}</h1>",unsafe_allow_html=True)
 
-                with fourth_kpi:
-                    st.markdown("**% of Open Priority 1**")
-                    open_df = open_status_df(graph_data)
-                    num_p1 = open_df['Priority'].str.contains(r"P1").sum()
+                    with third_kpi:
+                        st.markdown("**Most Common Issue**")
+                        issue_name = aggregate.most_common(cube, 'SEM Issue Type', open_sems)
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 15px;'>{issue_name}</h1>", unsafe_allow_html=True)
 
-                    percent_p1 = percentage(num_p1, row_count(open_df))
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{percent_p1}</h1>",unsafe_allow_html=True)
+                    with fourth_kpi:
+                        st.markdown("**% of Open Priority 1**")
+                        percent_p1 = kpi.format_kpi(totals['% Open P1'], percent=True)
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{percent_p1}</h1>",unsafe_allow_html=True)
 
-                with fifth_kpi:
-                    st.markdown("**N. of Priority 1**")
-                    num_p1 = graph_data['Priority'].str.contains(r"P1").sum()
-                    st.markdown(f"<h1 style='text-align: left; color: gold;font-size: 30px;'>{num_p1}</h1>", unsafe_allow_html=True)
-                st.markdown("<hr/>", unsafe_allow_html=True)
+                    with fifth_kpi:
+                        st.markdown("**N. of Priority 1**")
+                        num_p1 = totals['P1']
+                        st.markdown(f"<h1 style='text-align: left; color: gold;font-size: 30px;'>{num_p1}</h1>", unsafe_allow_html=True)
+                    st.markdown("<hr/>", unsafe_allow_html=True)
 
-                # if there are multiple weeks this code will execute (cant compare week on week with 1 week)
-                if len(graph_data["FW"].unique())>=2:
-                    st.markdown("## Week on Week Markers")
+                    # Show a st.metric for one KPI of a period comparison, the delta is the change since the previous period
+                    def kpi_marker(comparison, kpi_name, label):
+                        percent = kpi_name in kpi.PERCENT_KPIS
+                        st.metric(label=label,
+                                  value=kpi.format_kpi(comparison.loc[kpi_name, 'Current'], percent),
+                                  delta=kpi.format_kpi(comparison.loc[kpi_name, 'Change'], percent=True),
+                                  delta_color="inverse")
 
+                    # if there are multiple weeks this code will execute (cant compare week on week with 1 week)
+                    weekly = kpi.period_comparison(kpi_table, "FW")
+                    if weekly is not None:
+                        st.markdown("## Week on Week Markers")
 
-                    # GENERATE WEEK ON WEEK KPIS
-                    weeks_to_compare = df_with_two(graph_data,"FW")
-                    df_weeks = value_counts_df(weeks_to_compare,'FW')
 
-                    first_weekly_marker, second_weekly_marker,third_weekly_marker, fourth_weekly_marker,fifth_weekly_marker= st.columns(5)
-                    def num_sems_weekly_marker():
-                        df = value_counts_df(weeks_to_compare, 'FW')
+                        # GENERATE WEEK ON WEEK KPIS
+                        first_weekly_marker, second_weekly_marker,third_weekly_marker, fourth_weekly_marker,fifth_weekly_marker= st.columns(5)
                         with first_weekly_marker:
-                            percent_diff = percentage((int(df['Count'].iloc[1])-int(df['Count'].iloc[0])),df['Count'].iloc[0])
-                            st.metric(label="No. SEMS",value=df['Count'].iloc[1], delta=percent_diff,delta_color = "inverse")
-
-                    num_sems_weekly_marker()
-
-                    def num_sems_open_weekly_marker():
-                        current_week = current_df(graph_data,"FW")
-                        current_week = current_week['SEM Status'].str.contains(r"Open").sum()
-                        previous_week = previous_df(graph_data,"FW")
-                        previous_week = previous_week['SEM Status'].str.contains(r"Open").sum()
-
+                            kpi_marker(weekly, 'SEMS', "No. SEMS")
                         with second_weekly_marker:
-                            percent_diff = percentage((int(current_week)-int(previous_week)),previous_week)
-                            st.metric(label="No. Open SEMS",value=current_week, delta=percent_diff,delta_color = "inverse")
-
-                    num_sems_open_weekly_marker()
-
-
-                    def num_sems_open_percent_weekly_marker():
-                        current_week = current_df(graph_data,"FW")
-                        current_week_open = current_week['SEM Status'].str.contains(r"Open").sum()
-                        previous_week = previous_df(graph_data,"FW")
-                        previous_week_open = previous_week['SEM Status'].str.contains(r"Open").sum()
-                        current_percent = percentage(current_week_open, row_count(current_week))
-                        previous_percent = percentage(previous_week_open, row_count(previous_week))
-                        current_percent_int = float(str(current_percent).replace("%", ""))
-                        previous_percent_int = float(str(previous_percent).replace("%", ""))
-                        print("current_percent" + str(current_percent))
-                        print("previous_percent" + str(previous_percent))
-
-
+                            kpi_marker(weekly, 'Open', "No. Open SEMS")
                         with third_weekly_marker:
-                            percent_diff = str(round(current_percent_int - previous_percent_int,2))+"%"
-                            st.metric(label="% Open SEMS",value=current_percent, delta=percent_diff,delta_color = "inverse")
-
-                    num_sems_open_percent_weekly_marker()
-
-                    def num_priority1_weekly_marker():
-                        current_week = current_df(graph_data,"FW")
-                        current_week = current_week['Priority'].str.contains(r"P1").sum()
-                        previous_week = previous_df(graph_data,"FW")
-                        previous_week = previous_week['Priority'].str.contains(r"P1").sum()
-                        print("previous prioity1 " + str(previous_week))
-
+                            kpi_marker(weekly, '% Open', "% Open SEMS")
                         with fourth_weekly_marker:
-                            percent_diff = percentage((int(current_week)-int(previous_week)),previous_week)
-                            st.metric(label="No. Priority 1",value=current_week, delta=percent_diff,delta_color = "inverse")
-
-
-                    num_priority1_weekly_marker()
-
-                    def num_priority1_open_weekly_marker():
-                        current_week = current_df(graph_data,"FW")
-                        current_week  = current_week[current_week["SEM Status"] == "Open"]
-                        current_week = current_week['Priority'].str.contains(r"P1").sum()
-                        previous_week = previous_df(graph_data,"FW")
-                        previous_week = previous_week[previous_week["SEM Status"] == "Open"]
-                        previous_week = previous_week['Priority'].str.contains(r"P1").sum()
-
+                            kpi_marker(weekly, 'P1', "No. Priority 1")
                         with fifth_weekly_marker:
-                            percent_diff = percentage((int(current_week)-int(previous_week)),previous_week)
-                            st.metric(label="No. Open Priority 1",value=current_week, delta=percent_diff,delta_color = "inverse")
-
-
-                    num_priority1_open_weekly_marker()
+                            kpi_marker(weekly, 'Open P1', "No. Open Priority 1")
 
+                        st.markdown("<hr/>", unsafe_allow_html=True)
 
 
-
-
-
-
-                    st.markdown("<hr/>", unsafe_allow_html=True)
-
-
-                # If there are 2 or more quarters we can do quarter on quarter metrics
-                if len(fq_params) >= 2:
-                    st.markdown("## Quarter on Quarter Markers")
-                    first_quarterly_marker, second_quarterly_marker, third_quarterly_marker = st.columns(3)
-
-
-
-                    quarters_to_compare = df_with_two(graph_data,"Quarter")
-
-                    def num_sems_quarterly_marker():
-                        df = value_counts_df(quarters_to_compare, 'Quarter')
+                    # If there are 2 or more quarters we can do quarter on quarter metrics
+                    quarterly = kpi.period_comparison(kpi_table, "Quarter")
+                    if quarterly is not None:
+                        st.markdown("## Quarter on Quarter Markers")
+                        first_quarterly_marker, second_quarterly_marker, third_quarterly_marker = st.columns(3)
                         with first_quarterly_marker:
-                            percent_diff = percentage((int(df['Count'].iloc[1]) - int(df['Count'].iloc[0])),
-                                                      df['Count'].iloc[0])
-                            st.metric(label="No. SEMS", value=df['Count'].iloc[1], delta=percent_diff, delta_color="inverse")
-
-
-                    num_sems_quarterly_marker()
-                    def num_priority1_quarterly_marker():
-                        current_quarter = current_df(graph_data,"Quarter")
-                        current_quarter = current_quarter['Priority'].str.contains(r"P1").sum()
-                        previous_quarter = previous_df(graph_data,"Quarter")
-                        previous_quarter = previous_quarter['Priority'].str.contains(r"P1").sum()
-
-
+                            kpi_marker(quarterly, 'SEMS', "No. SEMS")
                         with second_quarterly_marker:
-                            percent_diff = percentage((int(current_quarter)-int(previous_quarter)),previous_quarter)
-                            st.metric(label="No. Priority 1",value=current_quarter, delta=percent_diff,delta_color = "inverse")
-
-
-                    num_priority1_quarterly_marker()
-                    def percent_p1_quarterly_marker():
-                        current_quarter = current_df(graph_data, "Quarter")
-                        current_quarter_sum = current_quarter['Priority'].str.contains(r"P1").sum()
-                        previous_quarter = previous_df(graph_data, "Quarter")
-                        previous_quarter_sum = previous_quarter['Priority'].str.contains(r"P1").sum()
-                        current_percent = percentage(current_quarter_sum, row_count(current_quarter))
-                        previous_percent = percentage(previous_quarter_sum, row_count(previous_quarter))
-                        current_percent_int = float(str(current_percent).replace("%", ""))
-                        previous_percent_int = float(str(previous_percent).replace("%", ""))
-                        print("current_percent_int" + str(current_percent_int))
-                        print("previous_percent_int" + str(previous_percent_int))
-
-
+                            kpi_marker(quarterly, 'P1', "No. Priority 1")
                         with third_quarterly_marker:
-                            percent_diff = str(round(current_percent_int - previous_percent_int,2))+"%"
-                            st.metric(label="% Priority 1",value=current_percent, delta=percent_diff,delta_color = "inverse")
-
-
-                    percent_p1_quarterly_marker()
-                st.markdown("<hr/>", unsafe_allow_html=True)
+                            kpi_marker(quarterly, '% P1', "% Priority 1")
+                    st.markdown("<hr/>", unsafe_allow_html=True)
 
 
 
@@ -519,33 +469,34 @@ if check_password():
 
 
 
-            # GENERATE DASHBOARD BASED ON OPEN SEMS
+                # GENERATE DASHBOARD BASED ON OPEN SEMS
 
-            if "Open SEMS" in dashboard_selection:
+                if "Open SEMS" in dashboard_selection:
+                    diagnostics.section(diag, "Open SEMS", len(graph_data))
 
-                st.markdown("## Open SEM Status")
+                    st.markdown("## Open SEM Status")
 
-                first_chart, second_chart = st.columns(2)
+                    first_chart, second_chart = st.columns(2)
 
-                def plot_hist_sem_status():
+                    def plot_hist_sem_status():
+                        df = charts.count_frame(cube, 'SEM Status')
+                        fig = charts.count_bar(df, 'SEM Status', title='Histogram of SEM Status',color_discrete_sequence = ['gold']).update_xaxes(categoryorder='total descending')
+                        return fig
                     with first_chart:
-                        fig = px.histogram(data_frame=graph_data, x='SEM Status', title='Histogram of SEM Status',color_discrete_sequence = ['gold'],text_auto=True).update_xaxes(categoryorder='total descending')
-                        st.plotly_chart(fig, use_container_width=True)
-                plot_hist_sem_status()
+                        show_chart("Open SEMS", "sem_status", plot_hist_sem_status)
 
-                def hist_open_region():
-                    with second_chart:
-                        df = open_status_df(graph_data)
-                        fig = px.histogram(data_frame=df, x='Sales Region', title='Histogram of Open SEMS by Region',color_discrete_sequence = ['gold'],text_auto=True).update_xaxes(
+                    def hist_open_region():
+                        df = charts.count_frame(cube, 'Sales Region', open_sems)
+                        fig = charts.count_bar(df, 'Sales Region', title='Histogram of Open SEMS by Region',color_discrete_sequence = ['gold']).update_xaxes(
                             categoryorder='total descending')
-                        st.plotly_chart(fig, use_container_width=True)
-                hist_open_region()
-                first_chart_row2, second_chart_row2 = st.columns([3,6])
+                        return fig
+                    with second_chart:
+                        show_chart("Open SEMS", "open_region", hist_open_region)
+                    first_chart_row2, second_chart_row2 = st.columns([3,6])
 
-                def hist_cat_open_frequency():
-                    with first_chart_row2:
-                        df_open = open_status_df(graph_data)
-                        fig = px.histogram(data_frame=df_open, x='CAT', title='Histogram of CAT Frequency', text_auto=True,
+                    def hist_cat_open_frequency():
+                        df_open = charts.count_frame(cube, 'CAT', open_sems)
+                        fig = charts.count_bar(df_open, 'CAT', title='Histogram of CAT Frequency',
                                            color='CAT',
                                            color_discrete_map={'RO': 'gold',
                                                                'AOU': '#c552e4',
@@ -553,938 +504,852 @@ if check_password():
                                                                }
                                            )
 
-                        st.plotly_chart(fig, use_container_width=True)
-                hist_cat_open_frequency()
+                        return fig
+                    with first_chart_row2:
+                        show_chart("Open SEMS", "open_cat", hist_cat_open_frequency)
 
-                def hist_top10_partners_open():
-                    with second_chart_row2:
-                        df_open = open_status_df(graph_data)
-                        x = df_open.groupby('Sold-To ID').size()
-                        df = pd.DataFrame(x, columns=['Count'])
-                        df["Sold-To ID"] = df.index
-                        df = df.sort_values('Count', ascending=[False])
-                        df = df.head(n=10)
+                    def hist_top10_partners_open():
+                        df = aggregate.top_counts(cube, 'Sold-To ID', n=10, where=open_sems)
                         fig = px.histogram(data_frame=df, x='Sold-To ID', y="Count", title = "Top 10 Partners by Open Orders",color_discrete_sequence=['gold'],
                                            text_auto=True)
-                        st.plotly_chart(fig, use_container_width=True)
-                hist_top10_partners_open()
-
-
-
-                def hist_top10_open_team():
-                    df_open = open_status_df(graph_data)
-                    x = df_open.groupby('Assigned To Team').size()
-                    df = pd.DataFrame(x, columns=['Count'])
-                    df['Assigned To Team'] = df.index
-                    df = df.sort_values('Count', ascending=[False])
-                    df = df.head(n=10)
-                    fig = px.histogram(data_frame=df, x='Assigned To Team', y="Count", title="Top 10 Teams by Open Orders",
-                                       color_discrete_sequence=['gold'],
-                                       text_auto=True)
-
-                    st.plotly_chart(fig, use_container_width=True)
-                hist_top10_open_team()
-                def hist_top10_open_issue():
-                    df_open = open_status_df(graph_data)
-                    x = df_open.groupby('SEM Issue Type').size()
-                    df = pd.DataFrame(x, columns=['Count'])
-                    df['SEM Issue Type'] = df.index
-                    df = df.sort_values('Count', ascending=[False])
-                    df = df.head(n=10)
-                    fig = px.histogram(data_frame=df, x='SEM Issue Type', y="Count", title="Top 10 Issues by Open Orders",
-                                       color_discrete_sequence=['gold'],
-                                       text_auto=True)
-
-                    st.plotly_chart(fig, use_container_width=True)
-                hist_top10_open_issue()
-                if len(graph_data["FW"].unique())>=3:
-
-                    def open_order_trend():
-                        x = graph_data.groupby(["FW"]).size().reset_index(name  ="Count")
-                        fig = px.scatter(data_frame=x, x="FW", y="Count", title='Open SEM Trend',
-                                         color_discrete_sequence=['gold'])
-                        fig.update_layout(xaxis=dict(showgrid=False),
-                                          yaxis=dict(showgrid=False)
-                                          )
-                        fig.update_traces(mode='lines')
-                        st.plotly_chart(fig, use_container_width=True)
-                    open_order_trend()
-
-                if len(graph_data["FW"].unique()) >= 2:
-                    status = ["Open", "Closed"]
-                    df = graph_data[graph_data["SEM Status"].isin(status)]
-                    from natsort import natsort_keygen
-                    df = df.sort_values(by="FW",key=natsort_keygen())
-
-                    fig = px.histogram(data_frame=df, x='FW', title='SEM Status Weekly',
-                                       color = "SEM Status",text_auto=True,
-                                       color_discrete_map={'Open': 'gold',
-                                                           'Closed': '#00d1ff',
-                                                           }
-                                       )
-                    fig.update_layout(barmode='group')
-
-
-
-
-                    st.plotly_chart(fig, use_container_width=True)
-                    fig.update_layout(xaxis=dict(showgrid=False),
-                                      yaxis=dict(showgrid=True)
-                                      )
-                # SUMMARY KPIS FOR OPEN SEMs
-                st.markdown("### Open SEM Summary")
-                first_open, second_open, third_open, fourth_open = st.columns(4)
-                with first_open:
-                    st.markdown("**Team Most Open Cases**")
-                    open_df = open_status_df(graph_data)
-                    x = open_df.groupby('Assigned To Team').size()
-                    df = pd.DataFrame(x, columns=['Count'])
-                    df["Team"] = df.index
-                    df = df.sort_values('Count')
-                    team_name = (df['Team'].values[-1])
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 20px;'>{team_name}</h1>",
-                                unsafe_allow_html=True)
-                with second_open:
-                    st.markdown("**Region Most Open Cases**")
-                    x = open_df.groupby('Sales Region').size()
-                    df = pd.DataFrame(x, columns=['Count'])
-                    df["Sales Region"] = df.index
-                    df = df.sort_values('Count')
-                    region_name = (df['Sales Region'].values[-1])
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 20px;'>{region_name}</h1>",
-                                unsafe_allow_html=True)
-                with third_open:
-                    st.markdown("**CAT Most Open Cases**")
-                    x = open_df.groupby('CAT').size()
-                    df = pd.DataFrame(x, columns=['Count'])
-                    df['CAT'] = df.index
-                    df = df.sort_values('Count')
-                    region_name = (df['CAT'].values[-1])
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 20px;'>{region_name}</h1>",
-                                unsafe_allow_html=True)
-                with fourth_open:
-                    st.markdown("**Partner Most Open Cases**")
-                    x = open_df.groupby('Sold-To ID').size()
-                    df = pd.DataFrame(x, columns=['Count'])
-                    df['Sold-To ID'] = df.index
-                    df = df.sort_values('Count')
-                    region_name = (df['Sold-To ID'].values[-1])
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 20px;'>{region_name}</h1>",
-                                unsafe_allow_html=True)
-
-
-
-
-                st.markdown("----", unsafe_allow_html=True)
-            if "Priority" in dashboard_selection:
-                st.markdown("## Priority")
-
-                priority_column1, priority_column2 = st.columns(2)
-
-                df = graph_data.sort_values(by="FW", key=natsort_keygen())
-
-                fig = px.histogram(data_frame=df, x='FW', title='Priority 1 vs 2 Weekly',
-                                       color="Priority",text_auto=True,
-                                   color_discrete_map={'P1': 'gold',
-                                                       'P2': '#00d1ff',
-                                                       }
-                                   )
-                fig.update_layout(barmode='group')
-
-                st.plotly_chart(fig, use_container_width=True)
-
-
-                open = open_status_df(graph_data)
-                df = open.sort_values(by="FW", key=natsort_keygen())
-
-                fig = px.histogram(data_frame=df, x='FW', title='Priority 1 vs 2 Weekly Open',
-                                       color="Priority",text_auto=True,
-                                   color_discrete_map={'P1': 'gold',
-                                                       'P2': '#00d1ff',
-                                                      }
-                )
-                fig.update_layout(barmode='group')
-
-                st.plotly_chart(fig, use_container_width=True)
-
-
-                open = open_status_df(graph_data)
-                x = open.groupby(['Sales Region','Priority']).size()
-                new_df = x.to_frame(name='Count').reset_index()
-                new_df = new_df.sort_values('Count', ascending=[False])
-                fig = px.histogram(data_frame=new_df, x='Sales Region',y="Count", title='Open P1 vs P2 by Region',
-                                   color="Priority", text_auto=True,
-                                   color_discrete_map={'P1': 'gold',
-                                                       'P2': '#00d1ff',
-                                                       }
-                                   )
-                fig.update_layout(barmode='group')
-
-                st.plotly_chart(fig, use_container_width=True)
-                first_priority, second_priority = st.columns(2)
-                with first_priority:
-                    open = open_status_df(graph_data)
-                    x = open.groupby(['CAT', 'Priority']).size()
-                    new_df = x.to_frame(name='Count').reset_index()
-                    new_df = new_df.sort_values('Count', ascending=[False])
-                    fig = px.histogram(data_frame=new_df, x='CAT', y="Count", title='Open P1 vs P2 by CAT',
-                                       color="Priority", text_auto=True,
-                                       color_discrete_map={'P1': 'gold',
-                                                           'P2': '#00d1ff',
-                                                           }
-                                       )
-                    fig.update_layout(barmode='group')
-
-                    st.plotly_chart(fig, use_container_width=True)
-                with second_priority:
-                    open = open_status_df(graph_data)
-                    fig = px.histogram(data_frame=open, x='Priority', title='Total Open P1 vs P2',
-                                       color="Priority", text_auto=True,
-                                       color_discrete_map={'P1': 'gold',
-                                                           'P2': '#00d1ff',
-                                                           }
-                                       )
-                    fig.update_layout(barmode='group')
-
-                    st.plotly_chart(fig, use_container_width=True)
-
-                st.markdown("### Priority Summary")
-                first_priority, second_priority, third_priority, fourth_priority, fifth_priority = st.columns(5)
-                open_dataframe = open_status_df(graph_data)
-                with first_priority:
-                    st.markdown("**No. Open Priority 1**")
-                    num_p1 = open_dataframe['Priority'].str.contains(r"P1").sum()
-
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{num_p1}</h1>",
-                                unsafe_allow_html=True)
-
-
-                with second_priority:
-                    st.markdown("**No. Open Priority 2**")
-                    num_p2 = open_dataframe['Priority'].str.contains(r"P2").sum()
-
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{num_p2}</h1>",
-                                unsafe_allow_html=True)
-
-                with third_priority:
-                    st.markdown("**% of Open Priority 1**")
-                    open_df = open_status_df(graph_data)
-                    num_p1 = open_df['Priority'].str.contains(r"P1").sum()
-
-                    percent_p1 = percentage(num_p1, row_count(open_df))
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{percent_p1}</h1>",
-                                unsafe_allow_html=True)
-
-
-                with fourth_priority:
-                    st.markdown("**% of Open Priority 2**")
-                    open_df = open_status_df(graph_data)
-                    num_p2 = open_df['Priority'].str.contains(r"P2").sum()
-
-                    percent_p2 = percentage(num_p2, row_count(open_df))
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{percent_p2}</h1>",
-                                unsafe_allow_html=True)
-                with fifth_priority:
-                    st.markdown("**No. of P1 Total**")
-                    num_p1 = graph_data['Priority'].str.contains(r"P1").sum()
-                    st.markdown(f"<h1 style='text-align: left; color: gold;font-size: 30px;'>{num_p1}</h1>",
-                                unsafe_allow_html=True)
-                st.markdown("<hr/>", unsafe_allow_html=True)
+                        return fig
+                    with second_chart_row2:
+                        show_chart("Open SEMS", "top10_partners_open", hist_top10_partners_open)
 
-            if "Category" in dashboard_selection:
-                st.markdown("## Category Analysis (RO/TEL/AOU)")
-
-
-
-
-                first_chart, second_chart = st.columns(2)
-
-
-                with first_chart:
-                    fig =px.histogram(data_frame=graph_data, x='CAT',title ='Histogram of CAT Frequency',text_auto=True,color = 'CAT',
-                                      color_discrete_map={'RO': 'gold',
-                                                          'AOU': '#c552e4',
-                                                          'TEL': '#00d1ff'
-                                                          }
-                                      )
-                    st.plotly_chart(fig,use_container_width=True)
-
-
-
-
-                with second_chart:
-                    fig = px.pie(graph_data, values='SEM ID', names='CAT',title ='PieChart of CAT Frequency', hole = 0.6,color = 'CAT',color_discrete_map={'RO': 'gold',
-                                                          'AOU': '#c552e4',
-                                                          'TEL': '#00d1ff'
-                                                          })
-                    st.plotly_chart(fig, use_container_width=True)
-
-
-                if len(graph_data["FW"].unique())>2:
-                    x = graph_data.groupby(["FW", "CAT"]).size().reset_index(name="Count")
-                    fig = px.scatter(data_frame=x, x="FW", y="Count", color='CAT',title = 'Total No. SEM Trend',color_discrete_map={'RO': 'gold',
-                                                          'AOU': '#c552e4',
-                                                          'TEL': '#00d1ff'
-                                                          })
-                    fig.update_layout(xaxis=dict(showgrid=False),
-                                      yaxis=dict(showgrid=False)
-                                      )
-                    fig.update_traces(mode='lines')
-                    st.plotly_chart(fig, use_container_width=True)
-
-                    x = graph_data.loc[graph_data['SEM Status'] == "Open"]
-                    # stops the graph going mental and misconnecting
-                    x = x.groupby(["FW", "CAT"]).size().unstack(fill_value=0).stack().reset_index(name="Count")
-
-                    fig = px.line(data_frame=x, x="FW", y="Count", color='CAT', title='Open SEM Trend',color_discrete_map={'RO': 'gold',
-                                                          'AOU': '#c552e4',
-                                                          'TEL': '#00d1ff'
-                                                          })
-                    fig.update_layout(xaxis=dict(showgrid=False),
-                                      yaxis=dict(showgrid=False)
-                                      )
-                    #fig.update_traces(mode='lines')
-                    st.plotly_chart(fig, use_container_width=True)
-
-                    st.markdown("### CAT Summary")
-                first_cat, second_cat, third_cat, fourth_cat, fifth_cat = st.columns(5)
-                open_dataframe = open_status_df(graph_data)
-                with first_cat:
-                    st.markdown("**Largest CAT**")
-                    largest = graph_data
-                    x = largest.groupby('CAT').size()
-                    df = pd.DataFrame(x, columns=['Count'])
-                    df["CAT"] = df.index
-                    df = df.sort_values('Count')
-                    print(df['Count'].values[-1])
-                    team_name = (df['CAT'].values[-1])
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{team_name}</h1>",
-                                unsafe_allow_html=True)
-
-
-                with second_cat:
-                    st.markdown("**% of Total**")
-                    largest_sum = df['Count'].values[-1]
-                    total = df["Count"].sum()
-                    percent = percentage(largest_sum,total)
-
-
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{percent}</h1>",
-                                unsafe_allow_html=True)
-
-                with third_cat:
-                    st.markdown("**Total No. SEMS**")
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{df['Count'].values[-1]}</h1>",
-                                unsafe_allow_html=True)
-
-                with fourth_cat:
-                    st.markdown("**No. Open SEMS**")
-                    open_df = open_status_df(graph_data)
-                    x = open_df.groupby('CAT').size()
-                    df = pd.DataFrame(x, columns=['Count'])
-                    df["CAT"] = df.index
-                    df = df.sort_values('Count')
-
-
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{df['Count'].values[-1]}</h1>",
-                                unsafe_allow_html=True)
-                with fifth_cat:
-                    st.markdown("**No. of Open P1**")
-                    open_p1 = open_df[open_df["CAT"] == team_name]
-                    num_p1 = open_p1['Priority'].str.contains(r"P1").sum()
-                    st.markdown(f"<h1 style='text-align: left; color: gold;font-size: 30px;'>{num_p1}</h1>",
-                                unsafe_allow_html=True)
-                st.markdown("<hr/>", unsafe_allow_html=True)
 
 
+                    def hist_top10_open_team():
+                        df = aggregate.top_counts(cube, 'Assigned To Team', n=10, where=open_sems)
+                        fig = px.histogram(data_frame=df, x='Assigned To Team', y="Count", title="Top 10 Teams by Open Orders",
+                                           color_discrete_sequence=['gold'],
+                                           text_auto=True)
 
+                        return fig
+                    show_chart("Open SEMS", "top10_open_team", hist_top10_open_team)
+                    def hist_top10_open_issue():
+                        df = aggregate.top_counts(cube, 'SEM Issue Type', n=10, where=open_sems)
+                        fig = px.histogram(data_frame=df, x='SEM Issue Type', y="Count", title="Top 10 Issues by Open Orders",
+                                           color_discrete_sequence=['gold'],
+                                           text_auto=True)
 
+                        return fig
+                    show_chart("Open SEMS", "top10_open_issue", hist_top10_open_issue)
+                    if len(graph_data["FW"].unique())>=3:
+
+                        def open_order_trend():
+                            x = aggregate.cube_counts(cube, "FW").reset_index(name="Count")
+                            fig = px.scatter(data_frame=x, x="FW", y="Count", title='Open SEM Trend',
+                                             color_discrete_sequence=['gold'])
+                            fig.update_layout(xaxis=dict(showgrid=False),
+                                              yaxis=dict(showgrid=False)
+                                              )
+                            fig.update_traces(mode='lines')
+                            return fig
+                        show_chart("Open SEMS", "open_trend", open_order_trend)
+
+                    if len(graph_data["FW"].unique()) >= 2:
+                        def status_weekly():
+                            status = ["Open", "Closed"]
+                            df = charts.count_frame(cube, ['FW', 'SEM Status'], {"SEM Status": status})
+
+                            fig = charts.count_bar(df, 'FW', title='SEM Status Weekly',
+                                               color = "SEM Status",
+                                               color_discrete_map={'Open': 'gold',
+                                                                   'Closed': '#00d1ff',
+                                                                   }
+                                               )
+                            fig.update_layout(barmode='group')
+                            return fig
+
+
+
+
+                        show_chart("Open SEMS", "status_weekly", status_weekly)
+                    # SUMMARY KPIS FOR OPEN SEMs
+                    st.markdown("### Open SEM Summary")
+                    first_open, second_open, third_open, fourth_open = st.columns(4)
+                    with first_open:
+                        st.markdown("**Team Most Open Cases**")
+                        team_name = aggregate.most_common(cube, 'Assigned To Team', open_sems)
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 20px;'>{team_name}</h1>",
+                                    unsafe_allow_html=True)
+                    with second_open:
+                        st.markdown("**Region Most Open Cases**")
+                        region_name = aggregate.most_common(cube, 'Sales Region', open_sems)
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 20px;'>{region_name}</h1>",
+                                    unsafe_allow_html=True)
+                    with third_open:
+                        st.markdown("**CAT Most Open Cases**")
+                        region_name = aggregate.most_common(cube, 'CAT', open_sems)
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 20px;'>{region_name}</h1>",
+                                    unsafe_allow_html=True)
+                    with fourth_open:
+                        st.markdown("**Partner Most Open Cases**")
+                        region_name = aggregate.most_common(cube, 'Sold-To ID', open_sems)
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 20px;'>{region_name}</h1>",
+                                    unsafe_allow_html=True)
+
+
+
+
+                    st.markdown("----", unsafe_allow_html=True)
+                if "Priority" in dashboard_selection:
+                    diagnostics.section(diag, "Priority", len(graph_data))
+                    st.markdown("## Priority")
+
+                    priority_column1, priority_column2 = st.columns(2)
+
+                    def priority_weekly():
+                        df = charts.count_frame(cube, ['FW', 'Priority'])
+
+                        fig = charts.count_bar(df, 'FW', title='Priority 1 vs 2 Weekly',
+                                               color="Priority",
+                                           color_discrete_map={'P1': 'gold',
+                                                               'P2': '#00d1ff',
+                                                               }
+                                           )
+                        fig.update_layout(barmode='group')
+                        return fig
 
+                    show_chart("Priority", "priority_weekly", priority_weekly)
 
 
+                    def priority_weekly_open():
+                        df = charts.count_frame(cube, ['FW', 'Priority'], open_sems)
 
+                        fig = charts.count_bar(df, 'FW', title='Priority 1 vs 2 Weekly Open',
+                                               color="Priority",
+                                           color_discrete_map={'P1': 'gold',
+                                                               'P2': '#00d1ff',
+                                                              }
+                        )
+                        fig.update_layout(barmode='group')
+                        return fig
 
-                # top 10 partners
+                    show_chart("Priority", "priority_weekly_open", priority_weekly_open)
 
-            if "Partner" in dashboard_selection:
-                st.markdown("## Top Partner Analysis")
-                x = graph_data.groupby('Sold-To ID').size()
-                df_partner = pd.DataFrame(x, columns=['Count'])
-                df_partner["Sold-To ID"] = df_partner.index
-                df_partner = df_partner.sort_values('Count',ascending=[False])
-                df_partner = df_partner.head(n=10)
 
+                    def priority_open_region():
+                        new_df = aggregate.top_counts(cube, ['Sales Region', 'Priority'], where=open_sems)
+                        fig = px.histogram(data_frame=new_df, x='Sales Region',y="Count", title='Open P1 vs P2 by Region',
+                                           color="Priority", text_auto=True,
+                                           color_discrete_map={'P1': 'gold',
+                                                               'P2': '#00d1ff',
+                                                               }
+                                           )
+                        fig.update_layout(barmode='group')
+                        return fig
+
+                    show_chart("Priority", "priority_open_region", priority_open_region)
+                    first_priority, second_priority = st.columns(2)
+                    with first_priority:
+                        def priority_open_cat():
+                            new_df = aggregate.top_counts(cube, ['CAT', 'Priority'], where=open_sems)
+                            fig = px.histogram(data_frame=new_df, x='CAT', y="Count", title='Open P1 vs P2 by CAT',
+                                               color="Priority", text_auto=True,
+                                               color_discrete_map={'P1': 'gold',
+                                                                   'P2': '#00d1ff',
+                                                                   }
+                                               )
+                            fig.update_layout(barmode='group')
+                            return fig
+
+                        show_chart("Priority", "priority_open_cat", priority_open_cat)
+                    with second_priority:
+                        def priority_open_total():
+                            open = charts.count_frame(cube, 'Priority', open_sems)
+                            fig = charts.count_bar(open, 'Priority', title='Total Open P1 vs P2',
+                                               color="Priority",
+                                               color_discrete_map={'P1': 'gold',
+                                                                   'P2': '#00d1ff',
+                                                                   }
+                                               )
+                            fig.update_layout(barmode='group')
+                            return fig
+
+                        show_chart("Priority", "priority_open_total", priority_open_total)
+
+                    st.markdown("### Priority Summary")
+                    first_priority, second_priority, third_priority, fourth_priority, fifth_priority = st.columns(5)
+                    with first_priority:
+                        st.markdown("**No. Open Priority 1**")
+                        num_p1 = aggregate.cube_total(cube, {**open_sems, "Priority": "P1"})
+
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{num_p1}</h1>",
+                                    unsafe_allow_html=True)
+
+
+                    with second_priority:
+                        st.markdown("**No. Open Priority 2**")
+                        num_p2 = aggregate.cube_total(cube, {**open_sems, "Priority": "P2"})
+
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{num_p2}</h1>",
+                                    unsafe_allow_html=True)
+
+                    with third_priority:
+                        st.markdown("**% of Open Priority 1**")
+                        num_p1 = aggregate.cube_total(cube, {**open_sems, "Priority": "P1"})
+
+                        percent_p1 = percentage(num_p1, aggregate.cube_total(cube, open_sems))
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{percent_p1}</h1>",
+                                    unsafe_allow_html=True)
+
+
+                    with fourth_priority:
+                        st.markdown("**% of Open Priority 2**")
+                        num_p2 = aggregate.cube_total(cube, {**open_sems, "Priority": "P2"})
+
+                        percent_p2 = percentage(num_p2, aggregate.cube_total(cube, open_sems))
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{percent_p2}</h1>",
+                                    unsafe_allow_html=True)
+                    with fifth_priority:
+                        st.markdown("**No. of P1 Total**")
+                        num_p1 = aggregate.cube_total(cube, {"Priority": "P1"})
+                        st.markdown(f"<h1 style='text-align: left; color: gold;font-size: 30px;'>{num_p1}</h1>",
+                                    unsafe_allow_html=True)
+                    st.markdown("<hr/>", unsafe_allow_html=True)
 
-                fig = px.histogram(data_frame=df_partner,title = "SEMS per Top 10 Partners",x='Sold-To ID',y="Count",color_discrete_sequence=['gold'],text_auto=True)
+                if "Category" in dashboard_selection:
+                    diagnostics.section(diag, "Category", len(graph_data))
+                    st.markdown("## Category Analysis (RO/TEL/AOU)")
 
-                st.plotly_chart(fig, use_container_width=True)
 
-                open_df = open_status_df(graph_data)
-                x = open_df.groupby('Sold-To ID').size()
-                df = pd.DataFrame(x, columns=['Count'])
-                df["Sold-To ID"] = df.index
-                df = df.sort_values('Count', ascending=[False])
-                df = df.head(n=10)
-                fig = px.histogram(data_frame=df, title="Open SEMS by Partner", x='Sold-To ID', y="Count", color_discrete_sequence=['gold'],
-                                   text_auto=True)
 
-                st.plotly_chart(fig, use_container_width=True)
 
-                top_10_partners = list(df["Sold-To ID"])
-                x = graph_data.groupby(['Sold-To ID', 'Priority']).size()
-                new_df = x.to_frame(name='Count').reset_index()
-                new_df = new_df.sort_values('Count', ascending=[False])
-                new_df = new_df[new_df["Sold-To ID"].isin(top_10_partners)]
-                fig = px.histogram(data_frame=new_df, x='Sold-To ID', y="Count", title='P1 vs P2 by Partner',
-                                   color="Priority", text_auto=True,
-                                   color_discrete_map={'P1': 'gold',
-                                                       'P2': '#00d1ff',
-                                                       }
-                                   )
-                fig.update_layout(barmode='group')
+                    first_chart, second_chart = st.columns(2)
 
-                st.plotly_chart(fig, use_container_width=True)
 
-                top_10_partners = list(df["Sold-To ID"])
-                open = open_status_df(graph_data)
-                x = open.groupby(['Sold-To ID', 'Priority']).size()
-                new_df = x.to_frame(name='Count').reset_index()
-                new_df = new_df.sort_values('Count', ascending=[False])
-                new_df = new_df[new_df["Sold-To ID"].isin(top_10_partners)]
-                fig = px.histogram(data_frame=new_df, x='Sold-To ID', y="Count", title='P1 vs P2 Open SEMS by Partner',
-                                   color="Priority", text_auto=True,
-                                   color_discrete_map={'P1': 'gold',
-                                                       'P2': '#00d1ff',
-                                                       }
-                                   )
-                fig.update_layout(barmode='group')
+                    cat_counts = charts.count_frame(cube, 'CAT')
+                    with first_chart:
+                        def cat_frequency():
+                            fig =charts.count_bar(cat_counts, 'CAT',title ='Histogram of CAT Frequency',color = 'CAT',
+                                              color_discrete_map={'RO': 'gold',
+                                                                  'AOU': '#c552e4',
+                                                                  'TEL': '#00d1ff'
+                                                                  }
+                                              )
+                            return fig
+                        show_chart("Category", "cat_frequency", cat_frequency)
 
-                st.plotly_chart(fig, use_container_width=True)
 
-                st.markdown("### Top 10 Partners Summary")
-                first_partner, second_partner,third_partner ,fourth_partner,fifth_partner = st.columns(5)
 
-                with first_partner:
-                    st.markdown("**Number of SEMS**")
-                    num_sems = df_partner['Count'].sum()
-                    st.markdown(f"<h1 style='text-align: left; color: gold;font-size: 30px;'>{num_sems}</h1>", unsafe_allow_html=True)
-                with second_partner:
-                    st.markdown("**No Open SEMS**")
-                    num_sems_open = new_df['Count'].sum()
-                    st.markdown(f"<h1 style='text-align: left; color: gold;font-size: 30px;'>{num_sems_open}</h1>", unsafe_allow_html=True)
 
-                with third_partner:
-                    st.markdown("**Percent of Total**")
-                    sem_percent = percentage(num_sems,row_count(graph_data))
-                    st.markdown(f"<h1 style='text-align: left; color: gold;font-size: 30px;'>{sem_percent}</h1>", unsafe_allow_html=True)
-                with fourth_partner:
-                    st.markdown("**Percent Open**")
-                    num_open_sems = new_df['Count'].sum()
-                    sems_percent_open = percentage(num_open_sems,num_sems)
-                    st.markdown(f"<h1 style='text-align: left; color: gold;font-size: 30px;'>{sems_percent_open}</h1>", unsafe_allow_html=True)
-                with fifth_partner:
-                    st.markdown("**Largest Partner**")
-                    largest = df_partner["Sold-To ID"].iloc[0]
-                    st.markdown(f"<h1 style='text-align: left; color: gold;font-size: 20px;'>{largest}</h1>", unsafe_allow_html=True)
+                    with second_chart:
+                        def cat_pie():
+                            fig = charts.count_pie(cat_counts, 'CAT',title ='PieChart of CAT Frequency', hole = 0.6,color = 'CAT',color_discrete_map={'RO': 'gold',
+                                                                  'AOU': '#c552e4',
+                                                                  'TEL': '#00d1ff'
+                                                                  })
+                            return fig
+                        show_chart("Category", "cat_pie", cat_pie)
+
+
+                    if len(graph_data["FW"].unique())>2:
+                        def cat_trend():
+                            x = aggregate.cube_counts(cube, ["FW", "CAT"]).reset_index(name="Count")
+                            fig = px.scatter(data_frame=x, x="FW", y="Count", color='CAT',title = 'Total No. SEM Trend',color_discrete_map={'RO': 'gold',
+                                                                  'AOU': '#c552e4',
+                                                                  'TEL': '#00d1ff'
+                                                                  })
+                            fig.update_layout(xaxis=dict(showgrid=False),
+                                              yaxis=dict(showgrid=False)
+                                              )
+                            fig.update_traces(mode='lines')
+                            return fig
+                        show_chart("Category", "cat_trend", cat_trend)
+
+                        def cat_open_trend():
+                            # stops the graph going mental and misconnecting
+                            x = aggregate.cube_counts(cube, ["FW", "CAT"], where=open_sems).unstack(fill_value=0).stack().reset_index(name="Count")
+
+                            fig = px.line(data_frame=x, x="FW", y="Count", color='CAT', title='Open SEM Trend',color_discrete_map={'RO': 'gold',
+                                                                  'AOU': '#c552e4',
+                                                                  'TEL': '#00d1ff'
+                                                                  })
+                            fig.update_layout(xaxis=dict(showgrid=False),
+                                              yaxis=dict(showgrid=False)
+                                              )
+                            #fig.update_traces(mode='lines')
+                            return fig
+                        show_chart("Category", "cat_open_trend", cat_open_trend)
+
+                        st.markdown("### CAT Summary")
+                    first_cat, second_cat, third_cat, fourth_cat, fifth_cat = st.columns(5)
+                    with first_cat:
+                        st.markdown("**Largest CAT**")
+                        df = aggregate.top_counts(cube, 'CAT')
+                        team_name = df['CAT'].values[0]
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{team_name}</h1>",
+                                    unsafe_allow_html=True)
+
+
+                    with second_cat:
+                        st.markdown("**% of Total**")
+                        largest_sum = df['Count'].values[0]
+                        total = df["Count"].sum()
+                        percent = percentage(largest_sum,total)
+
+
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{percent}</h1>",
+                                    unsafe_allow_html=True)
+
+                    with third_cat:
+                        st.markdown("**Total No. SEMS**")
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{df['Count'].values[0]}</h1>",
+                                    unsafe_allow_html=True)
+
+                    with fourth_cat:
+                        st.markdown("**No. Open SEMS**")
+                        df = aggregate.top_counts(cube, 'CAT', where=open_sems)
+
+
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{df['Count'].values[0]}</h1>",
+                                    unsafe_allow_html=True)
+                    with fifth_cat:
+                        st.markdown("**No. of Open P1**")
+                        num_p1 = aggregate.cube_total(cube, {**open_sems, "CAT": team_name, "Priority": "P1"})
+                        st.markdown(f"<h1 style='text-align: left; color: gold;font-size: 30px;'>{num_p1}</h1>",
+                                    unsafe_allow_html=True)
+                    st.markdown("<hr/>", unsafe_allow_html=True)
 
-                st.markdown("<hr/>", unsafe_allow_html=True)
 
-                ## REGION
-            if "Region" in dashboard_selection:
-                st.markdown("## Region Analysis")
-                x = graph_data.groupby('Sales Region').size()
-                df_region = pd.DataFrame(x, columns=['Count'])
-                df_region['Sales Region'] = df_region.index
-                df_region = df_region.sort_values('Count', ascending=[False])
-
-
-                fig = px.histogram(data_frame=df_region, title="Total SEMS by Region", x='Sales Region', y="Count",
-                                   color_discrete_sequence=['gold'], text_auto=True)
-
-                st.plotly_chart(fig, use_container_width=True)
-
-                open = open_status_df(graph_data)
-                x = open.groupby(['Sales Region', 'Priority']).size()
-                new_df = x.to_frame(name='Count').reset_index()
-                new_df = new_df.sort_values('Count', ascending=[False])
-                fig = px.histogram(data_frame=new_df, x='Sales Region', y="Count", title='P1 vs P2 Open SEMS by Partner',
-                                   color="Priority", text_auto=True,
-                                   color_discrete_map={'P1': 'gold',
-                                                       'P2': '#00d1ff',
-                                                       }
-                                   )
-                fig.update_layout(barmode='group')
-
-                st.plotly_chart(fig, use_container_width=True)
-
-                x = graph_data.groupby(['Sales Region', 'CAT']).size()
-                new_df = x.to_frame(name='Count').reset_index()
-                new_df = new_df.sort_values('Count', ascending=[False])
-                fig = px.histogram(data_frame=new_df, x='Sales Region', y="Count", title='Total SEMS per CAT Breakdown by Region',
-                                   color="CAT", text_auto=True,
-                                   color_discrete_map={'RO': 'gold',
-                                                       'AOU': '#c552e4',
-                                                       'TEL': '#00d1ff'
-                                                       }
-                                   )
-
-                fig.update_layout(barmode='group')
-
-                st.plotly_chart(fig, use_container_width=True)
-
-                st.markdown("### Region Summary")
-                first_region,second_region, third_region , fourth_region= st.columns(4)
-                with first_region:
-                    st.markdown("**Region Most SEMS**")
-
-                    x = graph_data.groupby('Sales Region').size()
-                    df = pd.DataFrame(x, columns=['Count'])
-                    df["Region"] = df.index
-                    df = df.sort_values('Count')
-                    region_name = (df['Region'].values[-1])
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{region_name}</h1>",
-                                unsafe_allow_html=True)
-                with second_region:
-                    st.markdown("**No. SEMS**")
-                    x = graph_data.groupby('Sales Region').size()
-                    df = pd.DataFrame(x, columns=['Count'])
-                    df["Region"] = df.index
-                    df = df.sort_values('Count')
-                    count_total = (df['Count'].values[-1])
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{count_total}</h1>",
-                                unsafe_allow_html=True)
-                with third_region:
-                    st.markdown("**No. Open SEMS**")
-                    open = open_status_df(graph_data)
-                    x = open.groupby('Sales Region').size()
-                    df = pd.DataFrame(x, columns=['Count'])
-                    df["Region"] = df.index
-                    df = df.sort_values('Count')
-                    count_total_open = (df['Count'].values[-1])
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{count_total_open}</h1>",
-                                unsafe_allow_html=True)
-                with fourth_region:
-                    st.markdown("**Percent Open**")
-                    open = open_status_df(graph_data)
-                    x = open.groupby('Sales Region').size()
-                    df = pd.DataFrame(x, columns=['Count'])
-                    df["Region"] = df.index
-                    df = df.sort_values('Count')
-                    percent_open_region = percentage(count_total_open,count_total)
-                    st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{percent_open_region}</h1>",
-                                unsafe_allow_html=True)
 
-                st.markdown("<hr/>", unsafe_allow_html=True)
-                # Additional Analysis
-            if "Additional Analysis" in dashboard_selection:
-                st.markdown("## Additional Analysis")
-                if len(graph_data["FW"].unique())>2:
-                        x = graph_data.groupby('FW').size()
-                        df = pd.DataFrame(x, columns=['Count'])
-                        df["FW"]  = df.index
-                        fig = px.scatter(data_frame=df, x="FW", y="Count",title = "Overall Trend of SEMS",color_discrete_sequence = ['gold'])
-                        fig.update_layout(xaxis=dict(showgrid=False),
-                                          yaxis=dict(showgrid=False)
-                                          )
-                        fig.update_traces(mode='lines')
-                        st.plotly_chart(fig, use_container_width=True)
-                x = graph_data.groupby('SEM Issue Type').size()
-                df = pd.DataFrame(x, columns=['Count'])
-                df["SEM Issue Type"] = df.index
-                df = df.sort_values('Count', ascending=[False])
-                df = df.head(n=10)
-                fig = px.histogram(data_frame=df, x="SEM Issue Type", y="Count", title="Top 10 Most Common Issues", text_auto=True,
-                                   color_discrete_sequence=['gold'])
-                fig.update_layout(xaxis=dict(showgrid=False),
-                                  yaxis=dict(showgrid=False)
-                                  )
-
-                st.plotly_chart(fig, use_container_width=True)
-                x = graph_data.groupby('Root Cause').size()
-                df = pd.DataFrame(x, columns=['Count'])
-                df["Root Cause"] = df.index
-                df = df.sort_values('Count', ascending=[False])
-                df = df.head(n=10)
-                fig = px.histogram(data_frame=df, x="Root Cause", y="Count", title="Top 10 Root Cause",text_auto=True,
-                                 color_discrete_sequence=['gold'])
-                fig.update_layout(xaxis=dict(showgrid=False),
-                                  yaxis=dict(showgrid=False)
-                                  )
-
-                st.plotly_chart(fig, use_container_width=True)
-
-                # ----------------------------- Carrier Analysis -------------------------
-                st.markdown("<hr/>", unsafe_allow_html=True)
-            if "Carrier" in dashboard_selection:
-                st.markdown("## Carrier Analysis")
-
-
-                # Carriers by Total Sems
-                x = graph_data.groupby('Carrier').size()
-                df_total = pd.DataFrame(x, columns=['Count'])
-                df_total["Carrier"] = df_total.index
-                df_total = df_total.sort_values('Count', ascending=[False])
-                df_total_head = df_total.head(n=10)
-                fig = px.histogram(data_frame=df_total_head, x='Carrier', y="Count", title = "Top 10 Carriers by SEMS created",color_discrete_sequence=['gold'],
-                                   text_auto=True)
-                st.plotly_chart(fig, use_container_width=True)
-
-
-                def previously_visualised_carriers():
-                    lst = []
-                    for i in range(5):
-                        carrier = str(df_total['Carrier'].iloc[i])
-                        lst.append(carrier)
-                    return lst
-
-
-                prev_viz = previously_visualised_carriers()
-
-                # Carrier by Open SEMS
-                df_open = open_status_df(graph_data)
-                x = df_open.groupby('Carrier').size()
-                df_open = pd.DataFrame(x, columns=['Count'])
-                df_open['Carrier'] = df_open.index
-                df_open = df_open.sort_values('Count', ascending=[False])
-                df_open_head = df_open.head(n=10)
-                fig = px.histogram(data_frame=df_open_head, x='Carrier', y="Count",
-                                   title="Top 10 Carriers by Open SEMS", color_discrete_sequence=['gold'],
-                                   text_auto=True)
-                st.plotly_chart(fig, use_container_width=True)
-                def action_day_hist():
-                    x = graph_data.groupby('Carrier')["Action Age [Days]"].mean()
-                    df_open = pd.DataFrame(x, columns=["Action Age [Days]"])
-                    df_open["Action Age [Days]"] = df_open["Action Age [Days]"].round(2)
-                    df_open['Carrier'] = df_open.index
-                    df_open = df_open.sort_values("Action Age [Days]", ascending=[False])
-                    df_open = df_open.head(n=10)
-                    fig = px.histogram(data_frame=df_open, x='Carrier', y="Action Age [Days]",
-                                       title="Top 10 Carriers by Action Day Length", color_discrete_sequence=['gold'],
-                                       text_auto=True)
-                    st.plotly_chart(fig, use_container_width=True)
-                action_day_hist()
-
-
-                #-------------------------- Carrier DEEP DIVE ----------------------------
-                st.markdown("<hr/>", unsafe_allow_html=True)
-                st.markdown("## Top 5 Carrier Deep Dive")
 
 
 
 
 
-                # TOP CARRIER
-                def carrier(number_or_name,colour):
-                    if isinstance(number_or_name,int):
 
-                        st.markdown("### " +str(number_or_name+1) + ". " + str(df_total['Carrier'].iloc[number_or_name]))
-                        carrier = str(df_total['Carrier'].iloc[number_or_name])
-                        carrier_df = graph_data[graph_data["Carrier"].str.contains(carrier, na=False)]
-                    if isinstance(number_or_name,str):
-                        st.markdown("### " + number_or_name)
-                        carrier = number_or_name
-                        carrier_df = graph_data[graph_data["Carrier"].str.contains(carrier, na=False)]
+                    # top 10 partners
 
+                if "Partner" in dashboard_selection:
+                    diagnostics.section(diag, "Partner", len(graph_data))
+                    st.markdown("## Top Partner Analysis")
+                    df_partner = cube_top_counts('Sold-To ID', n=10)
 
-                    def issue_graph():
-                        x = carrier_df.groupby('SEM Sub issue Type').size()
-                        carrier_issue_df = pd.DataFrame(x, columns=['Count'])
-                        carrier_issue_df["SEM Sub issue Type"] = carrier_issue_df.index
-                        carrier_issue_df = carrier_issue_df.sort_values('Count', ascending=[False])
-                        carrier_issue_df = carrier_issue_df.head(n=10)
-                        fig = px.histogram(data_frame=carrier_issue_df, x='SEM Sub issue Type', y="Count", title="Top 10 SEM Sub-Issues for " + carrier,
-                                           color_discrete_sequence=[colour],
-                                           text_auto=True)
-                        st.plotly_chart(fig, use_container_width=True)
-                    def customer_affected_graph():
-                        x = carrier_df.groupby('Sold-To ID').size()
-                        carrier_cust_affected_df = pd.DataFrame(x, columns=['Count'])
-                        carrier_cust_affected_df["Sold-To ID"] = carrier_cust_affected_df.index
-                        carrier_cust_affected_df= carrier_cust_affected_df.sort_values('Count', ascending=[False])
-                        carrier_cust_affected_df = carrier_cust_affected_df.head(n=10)
-                        fig = px.histogram(data_frame=carrier_cust_affected_df, x='Sold-To ID', y="Count",
-                                           title="Top 10 Customers affected by " + carrier,
-                                           color_discrete_sequence=[colour],
-                                           text_auto=True)
-                        st.plotly_chart(fig, use_container_width=True)
-
-                    def carrier_sem_trend():
-                        x = carrier_df.groupby('Created On').size()
-                        carrier_cust_affected_df = pd.DataFrame(x, columns=['Count'])
-                        carrier_cust_affected_df["Date"] = carrier_cust_affected_df.index
-                        carrier_cust_affected_df= carrier_cust_affected_df.sort_values('Date', ascending=[False])
-                        carrier_cust_affected_df['Date'] = pd.to_datetime(carrier_cust_affected_df['Date'])
-                        fig = px.scatter(data_frame=carrier_cust_affected_df, x="Date", y="Count", trendline="ols",
-                                         title=str(carrier + ' SEM Trend'),
-                                         color_discrete_sequence=[colour], trendline_color_override="gold")
-                        fig.update_layout(xaxis=dict(showgrid=False),
-                                          yaxis=dict(showgrid=False)
-                                          )
-                        fig.update_traces(mode='lines')
-                        st.plotly_chart(fig, use_container_width=True)
-                    issue_graph()
-                    customer_affected_graph()
-                    carrier_sem_trend()
-                    st.markdown("<hr/>", unsafe_allow_html=True)
-                carrier(0,"#FFAC81")
-                carrier(1,"#FF928B")
-                carrier(2,"#FEC3A6")
-                carrier(3,"#EFE9AE")
-                carrier(4,"#CDEAC0")
 
-                if additional_choice:
-                    if chosen_unique_carrier is not None:
-                        st.markdown("## Additional Chosen Carriers")
-                        not_visualised = [x for x in chosen_unique_carrier if x not in prev_viz]
-                        for i in chosen_unique_carrier:
-                            if i not in prev_viz:
-                                carrier(i, "gold")
-                            else:
-                                st.info(i + " was visualised above")
+                    def top10_partners():
+                        fig = px.histogram(data_frame=df_partner,title = "SEMS per Top 10 Partners",x='Sold-To ID',y="Count",color_discrete_sequence=['gold'],text_auto=True)
+                        return fig
 
+                    show_chart("Partner", "top10_partners", top10_partners)
 
+                    df = cube_top_counts('Sold-To ID', n=10, where=open_sems)
+                    def open_by_partner():
+                        fig = px.histogram(data_frame=df, title="Open SEMS by Partner", x='Sold-To ID', y="Count", color_discrete_sequence=['gold'],
+                                           text_auto=True)
+                        return fig
 
+                    show_chart("Partner", "open_by_partner", open_by_partner)
 
+                    top_10_partners = list(df["Sold-To ID"])
+                    def priority_by_partner():
+                        new_df = cube_top_counts(['Sold-To ID', 'Priority'], where={"Sold-To ID": top_10_partners})
+                        fig = px.histogram(data_frame=new_df, x='Sold-To ID', y="Count", title='P1 vs P2 by Partner',
+                                           color="Priority", text_auto=True,
+                                           color_discrete_map={'P1': 'gold',
+                                                               'P2': '#00d1ff',
+                                                               }
+                                           )
+                        fig.update_layout(barmode='group')
+                        return fig
+
+                    show_chart("Partner", "priority_by_partner", priority_by_partner)
+
+                    new_df = cube_top_counts(['Sold-To ID', 'Priority'],
+                                                  where={**open_sems, "Sold-To ID": top_10_partners})
+                    def open_priority_by_partner():
+                        fig = px.histogram(data_frame=new_df, x='Sold-To ID', y="Count", title='P1 vs P2 Open SEMS by Partner',
+                                           color="Priority", text_auto=True,
+                                           color_discrete_map={'P1': 'gold',
+                                                               'P2': '#00d1ff',
+                                                               }
+                                           )
+                        fig.update_layout(barmode='group')
+                        return fig
+
+                    show_chart("Partner", "open_priority_by_partner", open_priority_by_partner)
+
+                    st.markdown("### Top 10 Partners Summary")
+                    first_partner, second_partner,third_partner ,fourth_partner,fifth_partner = st.columns(5)
+
+                    with first_partner:
+                        st.markdown("**Number of SEMS**")
+                        num_sems = df_partner['Count'].sum()
+                        st.markdown(f"<h1 style='text-align: left; color: gold;font-size: 30px;'>{num_sems}</h1>", unsafe_allow_html=True)
+                    with second_partner:
+                        st.markdown("**No Open SEMS**")
+                        num_sems_open = new_df['Count'].sum()
+                        st.markdown(f"<h1 style='text-align: left; color: gold;font-size: 30px;'>{num_sems_open}</h1>", unsafe_allow_html=True)
+
+                    with third_partner:
+                        st.markdown("**Percent of Total**")
+                        sem_percent = percentage(num_sems, aggregate.cube_total(cube))
+                        st.markdown(f"<h1 style='text-align: left; color: gold;font-size: 30px;'>{sem_percent}</h1>", unsafe_allow_html=True)
+                    with fourth_partner:
+                        st.markdown("**Percent Open**")
+                        num_open_sems = new_df['Count'].sum()
+                        sems_percent_open = percentage(num_open_sems,num_sems)
+                        st.markdown(f"<h1 style='text-align: left; color: gold;font-size: 30px;'>{sems_percent_open}</h1>", unsafe_allow_html=True)
+                    with fifth_partner:
+                        st.markdown("**Largest Partner**")
+                        largest = df_partner["Sold-To ID"].iloc[0]
+                        st.markdown(f"<h1 style='text-align: left; color: gold;font-size: 20px;'>{largest}</h1>", unsafe_allow_html=True)
 
+                    st.markdown("<hr/>", unsafe_allow_html=True)
 
+                    ## REGION
+                if "Region" in dashboard_selection:
+                    diagnostics.section(diag, "Region", len(graph_data))
+                    st.markdown("## Region Analysis")
+                    df_region = cube_top_counts('Sales Region')
 
 
-            # ----------------------- CUSTOMERS -------------------
+                    def total_by_region():
+                        fig = px.histogram(data_frame=df_region, title="Total SEMS by Region", x='Sales Region', y="Count",
+                                           color_discrete_sequence=['gold'], text_auto=True)
+                        return fig
 
-            if "Customer" in dashboard_selection:
-                st.markdown("<hr/>", unsafe_allow_html=True)
-                st.markdown("## Customer Analysis")
-
-                # graph of customer by sems
-                def customer_total_sems():
-                    x = graph_data.groupby('Sold-To ID').size()
-                    df_total = pd.DataFrame(x, columns=['Count'])
-                    df_total['Sold-To ID'] = df_total.index
-                    df_total = df_total.sort_values('Count', ascending=[False])
-                    df_total = df_total.head(n=15)
-                    fig = px.histogram(data_frame=df_total, x='Sold-To ID', y="Count",
-                                       title="Top 15 Customers by Total SEMS", color_discrete_sequence=['gold'],
-                                       text_auto=True)
-                    st.plotly_chart(fig, use_container_width=True)
-                customer_total_sems()
-
-                def customer_open_sems():
-                    x = open_status_df(graph_data)
-                    x = x.groupby('Sold-To ID').size()
-                    df_total = pd.DataFrame(x, columns=['Count'])
-                    df_total['Sold-To ID'] = df_total.index
-                    df_total = df_total.sort_values('Count', ascending=[False])
-                    df_total = df_total.head(n=10)
-                    fig = px.histogram(data_frame=df_total, x='Sold-To ID', y="Count",
-                                       title="Top 10 Customers by Open SEMS", color_discrete_sequence=['gold'],
-                                       text_auto=True)
-                    st.plotly_chart(fig, use_container_width=True)
-                customer_open_sems()
-
-                def df_customer_total():
-                    x = graph_data.groupby('Sold-To ID').size()
-                    df_total = pd.DataFrame(x, columns=['Count'])
-                    df_total['Sold-To ID'] = df_total.index
-                    df_total = df_total.sort_values('Count', ascending=[False])
-
-                    return df_total
-                def customer_action_day_hist_top10():
-                    x = graph_data.groupby('Sold-To ID')["Action Age [Days]"].mean()
-                    df_open = pd.DataFrame(x, columns=["Action Age [Days]"])
-                    df_open["Action Age [Days]"] = df_open["Action Age [Days]"].round(2)
-                    df_open['Sold-To ID'] = df_open.index
-                    df_open = df_open.sort_values("Action Age [Days]", ascending=[False])
-                    df_open = df_open.head(10)
-                    fig = px.histogram(data_frame=df_open, x='Sold-To ID', y="Action Age [Days]",
-                                       title="Longest waiting Customers (by Average Action Day)", color_discrete_sequence=['gold'],
-                                       text_auto=True)
-                    st.plotly_chart(fig, use_container_width=True)
-
-
-                customer_action_day_hist_top10()
-                def customer_action_day_hist():
-                    x = graph_data.groupby('Sold-To ID')["Action Age [Days]"].mean()
-                    df_open = pd.DataFrame(x, columns=["Action Age [Days]"])
-                    df_open["Action Age [Days]"] = df_open["Action Age [Days]"].round(2)
-                    df_open['Sold-To ID'] = df_open.index
-                    df_open = df_open.sort_values("Action Age [Days]", ascending=[False])
-                    df_open = df_open[df_open["Action Age [Days]"]>10]
-                    fig = px.histogram(data_frame=df_open, x='Sold-To ID', y="Action Age [Days]",
-                                       title="Customers whose Avg Action Days >10", color_discrete_sequence=['gold'],
-                                       text_auto=True)
-                    st.plotly_chart(fig, use_container_width=True)
-                customer_action_day_hist()
-
-                def previously_visualised_customers():
-                    df_total = df_customer_total()
-                    lst = []
-                    for i in range(5):
-                        customer = str(df_total['Sold-To ID'].iloc[i])
-                        lst.append(customer)
-                    return lst
-
-
-                prev_viz_cust = previously_visualised_customers()
-
-                # TOP CARRIER
-                def customer(number_or_name, colour):
-                    df_total = df_customer_total()
-
-                    if isinstance(number_or_name,int):
-                        st.markdown("### " + str(number_or_name + 1) + ". " + str(df_total['Sold-To ID'].iloc[number_or_name]))
-                        customer = str(df_total['Sold-To ID'].iloc[number_or_name])
-                        customer_df = graph_data[graph_data["Sold-To ID"].str.contains(customer, na=False)]
-
-
-                    if isinstance(number_or_name,str):
-                        st.markdown("### " + number_or_name)
-                        customer = number_or_name
-                        customer_df = graph_data[graph_data["Sold-To ID"].str.contains(customer, na=False)]
-
-
-                    def issue_graph():
-                        x = customer_df.groupby('SEM Issue Type').size()
-                        customer_issue_df = pd.DataFrame(x, columns=['Count'])
-                        customer_issue_df["SEM Issue Type"] = customer_issue_df.index
-                        customer_issue_df= customer_issue_df.sort_values('Count', ascending=[False])
-                        customer_issue_df = customer_issue_df.head(n=3)
-                        fig = px.histogram(data_frame=customer_issue_df, x='SEM Issue Type', y="Count",
-                                           title="SEM Issues for " + customer,
-                                           color_discrete_sequence=[colour],
-                                           text_auto=True)
-                        fig.update_layout(
-                            xaxis=dict(
-                                tickfont=dict(size=7.5)))
-                        st.plotly_chart(fig, use_container_width=True)
-
-
-                    def sub_issue_graph():
-                        x = customer_df.groupby('SEM Sub issue Type').size()
-                        customer_issue_df = pd.DataFrame(x, columns=['Count'])
-                        customer_issue_df["SEM Sub issue Type"] = customer_issue_df.index
-                        customer_issue_df= customer_issue_df.sort_values('Count', ascending=[False])
-                        customer_issue_df = customer_issue_df.head(n=8)
-                        fig = px.histogram(data_frame=customer_issue_df, x='SEM Sub issue Type', y="Count",
-                                           title="SEM Sub-Issues for " + customer,
-                                           color_discrete_sequence=[colour],
-                                           text_auto=True)
-                        fig.update_layout(
-                            xaxis=dict(
-                                tickfont=dict(size=7.5)))
-                        st.plotly_chart(fig, use_container_width=True)
-
-
-                    def customer_affected_graph():
-                        x = customer_df.groupby('Carrier').size()
-                        customer_carrier_affected_df = pd.DataFrame(x, columns=['Count'])
-                        customer_carrier_affected_df["Carrier"] = customer_carrier_affected_df.index
-                        customer_carrier_affected_df = customer_carrier_affected_df.sort_values('Count', ascending=[False])
-                        customer_carrier_affected_df = customer_carrier_affected_df.head(n=5)
-                        fig = px.histogram(data_frame=customer_carrier_affected_df, x='Carrier', y="Count",
-                                           title="Carriers affecting " + customer,
-                                           color_discrete_sequence=[colour],
-                                           text_auto=True)
-                        st.plotly_chart(fig, use_container_width=True)
-
-                    def customer_trend_graph():
-                        x = customer_df.groupby('Created On').size()
-                        customer_carrier_affected_df = pd.DataFrame(x, columns=['Count'])
-                        customer_carrier_affected_df["Date"] = customer_carrier_affected_df.index
-                        customer_carrier_affected_df = customer_carrier_affected_df.sort_values('Date',
-                                                                                                ascending=[False])
-
-                        customer_carrier_affected_df = customer_carrier_affected_df.sort_values(by='Date', ascending=True)
-                        customer_carrier_affected_df['Date'] = pd.to_datetime( customer_carrier_affected_df['Date'])
-                        fig = px.scatter(data_frame=customer_carrier_affected_df, x="Date", y="Count", trendline = "ols",title= str(customer + ' SEM Trend'),
-                                         color_discrete_sequence=[colour], trendline_color_override="gold")
-                        fig.update_layout(xaxis=dict(showgrid=False),
-                                          yaxis=dict(showgrid=False)
-                                          )
-                        fig.update_traces(mode='lines')
-                        st.plotly_chart(fig, use_container_width=True)
+                    show_chart("Region", "total_by_region", total_by_region)
 
-                    col_1,col_2 = st.columns(2)
-                    row_2_col_1, row_2_col_2 = st.columns([3,6])
-                    with col_1:
-                        sub_issue_graph()
+                    def open_priority_by_region():
+                        new_df = cube_top_counts(['Sales Region', 'Priority'], where=open_sems)
+                        fig = px.histogram(data_frame=new_df, x='Sales Region', y="Count", title='P1 vs P2 Open SEMS by Partner',
+                                           color="Priority", text_auto=True,
+                                           color_discrete_map={'P1': 'gold',
+                                                               'P2': '#00d1ff',
+                                                               }
+                                           )
+                        fig.update_layout(barmode='group')
+                        return fig
+
+                    show_chart("Region", "open_priority_by_region", open_priority_by_region)
 
-                    with col_2:
-                        customer_affected_graph()
+                    def cat_by_region():
+                        new_df = cube_top_counts(['Sales Region', 'CAT'])
+                        fig = px.histogram(data_frame=new_df, x='Sales Region', y="Count", title='Total SEMS per CAT Breakdown by Region',
+                                           color="CAT", text_auto=True,
+                                           color_discrete_map={'RO': 'gold',
+                                                               'AOU': '#c552e4',
+                                                               'TEL': '#00d1ff'
+                                                               }
+                                           )
 
+                        fig.update_layout(barmode='group')
+                        return fig
+
+                    show_chart("Region", "cat_by_region", cat_by_region)
+
+                    st.markdown("### Region Summary")
+                    first_region,second_region, third_region , fourth_region= st.columns(4)
+                    with first_region:
+                        st.markdown("**Region Most SEMS**")
+                        region_name = df_region['Sales Region'].values[0]
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{region_name}</h1>",
+                                    unsafe_allow_html=True)
+                    with second_region:
+                        st.markdown("**No. SEMS**")
+                        count_total = df_region['Count'].values[0]
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{count_total}</h1>",
+                                    unsafe_allow_html=True)
+                    with third_region:
+                        st.markdown("**No. Open SEMS**")
+                        count_total_open = cube_top_counts('Sales Region', n=1, where=open_sems)['Count'].values[0]
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{count_total_open}</h1>",
+                                    unsafe_allow_html=True)
+                    with fourth_region:
+                        st.markdown("**Percent Open**")
+                        percent_open_region = percentage(count_total_open,count_total)
+                        st.markdown(f"<h1 style='text-align: left; color: gold; font-size: 30px;'>{percent_open_region}</h1>",
+                                    unsafe_allow_html=True)
 
-                    with row_2_col_1:
-                        issue_graph()
-                    with row_2_col_2:
-                        customer_trend_graph()
                     st.markdown("<hr/>", unsafe_allow_html=True)
+                    # Additional Analysis
+                if "Additional Analysis" in dashboard_selection:
+                    diagnostics.section(diag, "Additional Analysis", len(graph_data))
+                    st.markdown("## Additional Analysis")
+                    if len(graph_data["FW"].unique())>2:
+                            def overall_trend():
+                                x = graph_data.groupby('FW', observed=True).size()
+                                df = pd.DataFrame(x, columns=['Count'])
+                                df["FW"]  = df.index
+                                fig = px.scatter(data_frame=df, x="FW", y="Count",title = "Overall Trend of SEMS",color_discrete_sequence = ['gold'])
+                                fig.update_layout(xaxis=dict(showgrid=False),
+                                                  yaxis=dict(showgrid=False)
+                                                  )
+                                fig.update_traces(mode='lines')
+                                return fig
+                            show_chart("Additional Analysis", "overall_trend", overall_trend)
+                    def top10_issues():
+                        x = graph_data.groupby('SEM Issue Type', observed=True).size()
+                        df = pd.DataFrame(x, columns=['Count'])
+                        df["SEM Issue Type"] = df.index
+                        df = df.sort_values('Count', ascending=[False])
+                        df = df.head(n=10)
+                        fig = px.histogram(data_frame=df, x="SEM Issue Type", y="Count", title="Top 10 Most Common Issues", text_auto=True,
+                                           color_discrete_sequence=['gold'])
+                        fig.update_layout(xaxis=dict(showgrid=False),
+                                          yaxis=dict(showgrid=False)
+                                          )
+                        return fig
 
+                    show_chart("Additional Analysis", "top10_issues", top10_issues)
+                    def top10_root_causes():
+                        x = graph_data.groupby('Root Cause', observed=True).size()
+                        df = pd.DataFrame(x, columns=['Count'])
+                        df["Root Cause"] = df.index
+                        df = df.sort_values('Count', ascending=[False])
+                        df = df.head(n=10)
+                        fig = px.histogram(data_frame=df, x="Root Cause", y="Count", title="Top 10 Root Cause",text_auto=True,
+                                         color_discrete_sequence=['gold'])
+                        fig.update_layout(xaxis=dict(showgrid=False),
+                                          yaxis=dict(showgrid=False)
+                                          )
+                        return fig
 
+                    show_chart("Additional Analysis", "top10_root_causes", top10_root_causes)
 
-                customer(0, "#FFAC81")
-                customer(1, "#FF928B")
-                customer(2, "#FEC3A6")
-                customer(3, "#EFE9AE")
-                customer(4, "#CDEAC0")
-                if additional_choice:
-                    if chosen_unique_customers is not None:
-                        st.markdown("## Additional Chosen Customers")
-                        not_visualised = [x for x in chosen_unique_customers if x not in prev_viz_cust]
-                        for i in chosen_unique_customers:
-                            if i not in prev_viz_cust:
-                                customer(i, "gold")
-                            else:
-                                st.info(i + " was visualised above")
-
-            if "Action Day Follow Up" in dashboard_selection:
+                    # ----------------------------- Carrier Analysis -------------------------
+                    st.markdown("<hr/>", unsafe_allow_html=True)
+                if "Carrier" in dashboard_selection:
+                    diagnostics.section(diag, "Carrier", len(graph_data))
+                    st.markdown("## Carrier Analysis")
+                    carrier_index = build_entity_index("Carrier")
+                    carrier_trends = build_trend_lines("Carrier")
+
+
+                    # Carriers by Total Sems
+                    df_total = backend.top_counts(graph_data, 'Carrier', backend=query_backend)
+                    def top10_carriers():
+                        df_total_head = df_total.head(n=10)
+                        fig = px.histogram(data_frame=df_total_head, x='Carrier', y="Count", title = "Top 10 Carriers by SEMS created",color_discrete_sequence=['gold'],
+                                           text_auto=True)
+                        return fig
+                    show_chart("Carrier", "top10_carriers", top10_carriers)
 
-                sems_df['Dates'] = pd.to_datetime(sems_df['Modified Date Time']).dt.date
-                date_to_compare = [d.date() for d in sems_df['Modified Date Time']]
-                sems_df["Business Days Since Action"] = np.busday_count(date_to_compare, date.today())
 
-                sems_df = sems_df[(sems_df["Business Days Since Action"] >=action_days) & (sems_df["SEM Status"]=="Open")]
+                    def previously_visualised_carriers():
+                        lst = []
+                        for i in range(5):
+                            carrier = str(df_total['Carrier'].iloc[i])
+                            lst.append(carrier)
+                        return lst
 
 
+                    prev_viz = previously_visualised_carriers()
 
-                def write_to_excel(merged):
-                    merged["Created On"] = merged['Date']= pd.to_datetime(merged["Created On"])
-                    merged["Action Age [Days]"] = merged["Action Age [Days]"].round(0)
-                    # Writing df to Excel Sheet
-                    buffer = io.BytesIO()
-                    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                        # Write each dataframe to a different worksheet.
-                        # data["Date"] = pd.to_datetime(data["Date"])
+                    # Carrier by Open SEMS
+                    def top10_carriers_open():
+                        df_open_head = backend.top_counts(graph_data, 'Carrier', n=10, where=open_sems, backend=query_backend)
+                        fig = px.histogram(data_frame=df_open_head, x='Carrier', y="Count",
+                                           title="Top 10 Carriers by Open SEMS", color_discrete_sequence=['gold'],
+                                           text_auto=True)
+                        return fig
+                    show_chart("Carrier", "top10_carriers_open", top10_carriers_open)
+                    def action_day_hist():
+                        df_open = backend.top_means(graph_data, 'Carrier', "Action Age [Days]", n=10, backend=query_backend)
+                        fig = px.histogram(data_frame=df_open, x='Carrier', y="Action Age [Days]",
+                                           title="Top 10 Carriers by Action Day Length", color_discrete_sequence=['gold'],
+                                           text_auto=True)
+                        return fig
+                    show_chart("Carrier", "action_day_hist", action_day_hist)
 
-                        # pd.to_datetime('date')
-                        merged.to_excel(writer, sheet_name='Sheet1', index=False)
-                        workbook = writer.book
-                        worksheet = writer.sheets['Sheet1']
 
-                        # Light yellow fill with dark yellow text.
+                    #-------------------------- Carrier DEEP DIVE ----------------------------
+                    st.markdown("<hr/>", unsafe_allow_html=True)
+                    st.markdown("## Top 5 Carrier Deep Dive")
+
+
+
+
+
+                    # TOP CARRIER
+                    def carrier(number_or_name,colour):
+                        if isinstance(number_or_name,int):
+
+                            st.markdown("### " +str(number_or_name+1) + ". " + str(df_total['Carrier'].iloc[number_or_name]))
+                            carrier = str(df_total['Carrier'].iloc[number_or_name])
+                            carrier_df = aggregate.partition_rows(graph_data, carrier_index, carrier)
+                        if isinstance(number_or_name,str):
+                            st.markdown("### " + number_or_name)
+                            carrier = number_or_name
+                            carrier_df = aggregate.partition_rows(graph_data, carrier_index, carrier)
+                        diagnostics.start(diag, "deep dive: " + carrier, len(carrier_df))
+
+
+                        def issue_graph():
+                            carrier_issue_df = backend.top_counts(carrier_df, 'SEM Sub issue Type', n=10, backend=query_backend)
+                            fig = px.histogram(data_frame=carrier_issue_df, x='SEM Sub issue Type', y="Count", title="Top 10 SEM Sub-Issues for " + carrier,
+                                               color_discrete_sequence=[colour],
+                                               text_auto=True)
+                            return fig
+                        def customer_affected_graph():
+                            carrier_cust_affected_df = backend.top_counts(carrier_df, 'Sold-To ID', n=10, backend=query_backend)
+                            fig = px.histogram(data_frame=carrier_cust_affected_df, x='Sold-To ID', y="Count",
+                                               title="Top 10 Customers affected by " + carrier,
+                                               color_discrete_sequence=[colour],
+                                               text_auto=True)
+                            return fig
+
+                        def carrier_sem_trend():
+                            # daily counts and trendline precomputed for every carrier (see trend.py)
+                            carrier_cust_affected_df = trend.entity_trend(carrier_trends, carrier)
+                            fig = px.scatter(data_frame=carrier_cust_affected_df, x="Date", y="Count",
+                                             title=str(carrier + ' SEM Trend'),
+                                             color_discrete_sequence=[colour])
+                            fig.add_scatter(x=carrier_cust_affected_df["Date"], y=carrier_cust_affected_df["Trend"],
+                                            name="Trend", line_color="gold", showlegend=False)
+                            fig.update_layout(xaxis=dict(showgrid=False),
+                                              yaxis=dict(showgrid=False)
+                                              )
+                            fig.update_traces(mode='lines')
+                            return fig
+                        # the colour is part of the entity, a carrier is drawn in gold when chosen as an additional carrier
+                        show_chart("Carrier", "sub_issues", issue_graph, entity=(carrier, colour))
+                        show_chart("Carrier", "customers_affected", customer_affected_graph, entity=(carrier, colour))
+                        show_chart("Carrier", "trend", carrier_sem_trend, entity=(carrier, colour))
+                        st.markdown("<hr/>", unsafe_allow_html=True)
+                        diagnostics.stop(diag)
+                    carrier(0,"#FFAC81")
+                    carrier(1,"#FF928B")
+                    carrier(2,"#FEC3A6")
+                    carrier(3,"#EFE9AE")
+                    carrier(4,"#CDEAC0")
+
+                    if additional_choice:
+                        if chosen_unique_carrier is not None:
+                            st.markdown("## Additional Chosen Carriers")
+                            not_visualised = [x for x in chosen_unique_carrier if x not in prev_viz]
+                            for i in chosen_unique_carrier:
+                                if i not in prev_viz:
+                                    carrier(i, "gold")
+                                else:
+                                    st.info(i + " was visualised above")
+
+
+
+
+
+
+
+
+                # ----------------------- CUSTOMERS -------------------
+
+                if "Customer" in dashboard_selection:
+                    diagnostics.section(diag, "Customer", len(graph_data))
+                    st.markdown("<hr/>", unsafe_allow_html=True)
+                    st.markdown("## Customer Analysis")
+                    customer_index = build_entity_index("Sold-To ID")
+                    customer_trends = build_trend_lines("Sold-To ID")
+
+                    # graph of customer by sems
+                    def customer_total_sems():
+                        df_total = backend.top_counts(graph_data, 'Sold-To ID', n=15, backend=query_backend)
+                        fig = px.histogram(data_frame=df_total, x='Sold-To ID', y="Count",
+                                           title="Top 15 Customers by Total SEMS", color_discrete_sequence=['gold'],
+                                           text_auto=True)
+                        return fig
+                    show_chart("Customer", "top15_customers", customer_total_sems)
 
-                        for column in merged:
-                            column_width = max(merged[column].astype(str).map(len).max(), len(column))
-                            col_idx = merged.columns.get_loc(column)
-                            writer.sheets['Sheet1'].set_column(col_idx, col_idx, column_width)
-                            worksheet.autofilter(0, 0, merged.shape[0], merged.shape[1])
-                        header_format = workbook.add_format({'bold': True,
-                                                             'bottom': 2,
-                                                             'bg_color': '#0AB2F7'})
+                    def customer_open_sems():
+                        df_total = backend.top_counts(graph_data, 'Sold-To ID', n=10, where=open_sems, backend=query_backend)
+                        fig = px.histogram(data_frame=df_total, x='Sold-To ID', y="Count",
+                                           title="Top 10 Customers by Open SEMS", color_discrete_sequence=['gold'],
+                                           text_auto=True)
+                        return fig
+                    show_chart("Customer", "top10_customers_open", customer_open_sems)
+
+                    def df_customer_total():
+                        return backend.top_counts(graph_data, 'Sold-To ID', backend=query_backend)
+                    def customer_action_day_hist_top10():
+                        df_open = backend.top_means(graph_data, 'Sold-To ID', "Action Age [Days]", n=10, backend=query_backend)
+                        fig = px.histogram(data_frame=df_open, x='Sold-To ID', y="Action Age [Days]",
+                                           title="Longest waiting Customers (by Average Action Day)", color_discrete_sequence=['gold'],
+                                           text_auto=True)
+                        return fig
 
-                        # Write the column headers with the defined format.
-                        for col_num, value in enumerate(merged.columns.values):
-                            worksheet.write(0, col_num, value, header_format)
 
-                        writer.save()
+                    show_chart("Customer", "action_day_hist_top10", customer_action_day_hist_top10)
+                    def customer_action_day_hist():
+                        df_open = backend.top_means(graph_data, 'Sold-To ID', "Action Age [Days]", backend=query_backend)
+                        df_open = df_open[df_open["Action Age [Days]"]>10]
+                        fig = px.histogram(data_frame=df_open, x='Sold-To ID', y="Action Age [Days]",
+                                           title="Customers whose Avg Action Days >10", color_discrete_sequence=['gold'],
+                                           text_auto=True)
+                        return fig
+                    show_chart("Customer", "action_day_hist", customer_action_day_hist)
+
+                    def previously_visualised_customers():
+                        df_total = df_customer_total()
+                        lst = []
+                        for i in range(5):
+                            customer = str(df_total['Sold-To ID'].iloc[i])
+                            lst.append(customer)
+                        return lst
+
+
+                    prev_viz_cust = previously_visualised_customers()
+
+                    # TOP CARRIER
+                    def customer(number_or_name, colour):
+                        df_total = df_customer_total()
+
+                        if isinstance(number_or_name,int):
+                            st.markdown("### " + str(number_or_name + 1) + ". " + str(df_total['Sold-To ID'].iloc[number_or_name]))
+                            customer = str(df_total['Sold-To ID'].iloc[number_or_name])
+                            customer_df = aggregate.partition_rows(graph_data, customer_index, customer)
+
+
+                        if isinstance(number_or_name,str):
+                            st.markdown("### " + number_or_name)
+                            customer = number_or_name
+                            customer_df = aggregate.partition_rows(graph_data, customer_index, customer)
+                        diagnostics.start(diag, "deep dive: " + customer, len(customer_df))
+
+
+                        def issue_graph():
+                            customer_issue_df = backend.top_counts(customer_df, 'SEM Issue Type', n=3, backend=query_backend)
+                            fig = px.histogram(data_frame=customer_issue_df, x='SEM Issue Type', y="Count",
+                                               title="SEM Issues for " + customer,
+                                               color_discrete_sequence=[colour],
+                                               text_auto=True)
+                            fig.update_layout(
+                                xaxis=dict(
+                                    tickfont=dict(size=7.5)))
+                            return fig
+
+
+                        def sub_issue_graph():
+                            customer_issue_df = backend.top_counts(customer_df, 'SEM Sub issue Type', n=8, backend=query_backend)
+                            fig = px.histogram(data_frame=customer_issue_df, x='SEM Sub issue Type', y="Count",
+                                               title="SEM Sub-Issues for " + customer,
+                                               color_discrete_sequence=[colour],
+                                               text_auto=True)
+                            fig.update_layout(
+                                xaxis=dict(
+                                    tickfont=dict(size=7.5)))
+                            return fig
+
+
+                        def customer_affected_graph():
+                            customer_carrier_affected_df = backend.top_counts(customer_df, 'Carrier', n=5, backend=query_backend)
+                            fig = px.histogram(data_frame=customer_carrier_affected_df, x='Carrier', y="Count",
+                                               title="Carriers affecting " + customer,
+                                               color_discrete_sequence=[colour],
+                                               text_auto=True)
+                            return fig
+
+                        def customer_trend_graph():
+                            # daily counts and trendline precomputed for every customer (see trend.py)
+                            customer_carrier_affected_df = trend.entity_trend(customer_trends, customer)
+                            fig = px.scatter(data_frame=customer_carrier_affected_df, x="Date", y="Count", title= str(customer + ' SEM Trend'),
+                                             color_discrete_sequence=[colour])
+                            fig.add_scatter(x=customer_carrier_affected_df["Date"], y=customer_carrier_affected_df["Trend"],
+                                            name="Trend", line_color="gold", showlegend=False)
+                            fig.update_layout(xaxis=dict(showgrid=False),
+                                              yaxis=dict(showgrid=False)
+                                              )
+                            fig.update_traces(mode='lines')
+                            return fig
+
+                        col_1,col_2 = st.columns(2)
+                        row_2_col_1, row_2_col_2 = st.columns([3,6])
+                        with col_1:
+                            show_chart("Customer", "sub_issues", sub_issue_graph, entity=(customer, colour))
+
+                        with col_2:
+                            show_chart("Customer", "carriers_affecting", customer_affected_graph, entity=(customer, colour))
+
+
+                        with row_2_col_1:
+                            show_chart("Customer", "issues", issue_graph, entity=(customer, colour))
+                        with row_2_col_2:
+                            show_chart("Customer", "trend", customer_trend_graph, entity=(customer, colour))
+                        st.markdown("<hr/>", unsafe_allow_html=True)
+                        diagnostics.stop(diag)
+
+
+
+                    customer(0, "#FFAC81")
+                    customer(1, "#FF928B")
+                    customer(2, "#FEC3A6")
+                    customer(3, "#EFE9AE")
+                    customer(4, "#CDEAC0")
+                    if additional_choice:
+                        if chosen_unique_customers is not None:
+                            st.markdown("## Additional Chosen Customers")
+                            not_visualised = [x for x in chosen_unique_customers if x not in prev_viz_cust]
+                            for i in chosen_unique_customers:
+                                if i not in prev_viz_cust:
+                                    customer(i, "gold")
+                                else:
+                                    st.info(i + " was visualised above")
+
+                if "Action Day Follow Up" in dashboard_selection:
+                    diagnostics.section(diag, "Action Day Follow Up", len(graph_data))
+
+                    # business days since the last action skip weekends and the public holidays of each
+                    # Sales Region (config/holidays, see followup.py)
+                    @st.cache_resource
+                    def holiday_calendars():
+                        return followup.load_holiday_calendars()
+
+                    # outside the years a calendar covers only weekends are skipped, say so
+                    @st.cache_resource
+                    def holiday_coverage():
+                        return followup.load_holiday_coverage()
+                    for message in followup.calendar_coverage_warnings(sems_df, date.today(), holiday_coverage()):
+                        st.warning(message)
+
+                    # the follow up file is only built when asked for, the bytes are kept in the dataset
+                    # registry per date range, action day threshold and format (counting towards its byte
+                    # budget) so other sidebar changes never rebuild it
+                    # the Excel export streams rows to disk (see followup.write_xlsx)
+                    def build_follow_up_file(action_days, export_format, today, split_by, zip_groups):
+                        def build():
+                            buffer = io.BytesIO()
+                            rows = report.write_follow_up(sems_df, action_days, today, holiday_calendars(), export_format,
+                                                          buffer, split_by=split_by, zip_groups=zip_groups,
+                                                          coverage=holiday_coverage())
+                            return buffer.getvalue(), rows
+                        return derived("follow up file", build, action_days, export_format, today, split_by, zip_groups)
+
+                    def write_to_excel():
                         today = date.today()
-                        d1 = today.strftime("%d/%m/%Y")
-                        st.write("Download Completed File:")
+                        export_key = (ingest_info["key"], start_date, end_date, action_days, export_format, today,
+                                      export_split, export_zip)
+                        if st.button("Generate follow up file"):
+                            st.session_state["follow_up_file"] = export_key
+                        # stays available on reruns until the parameters change
+                        if st.session_state.get("follow_up_file") != export_key:
+                            return
+                        diagnostics.start(diag, "follow up file", len(sems_df))
+                        data, rows = build_follow_up_file(*export_key[3:])
+                        diagnostics.stop(diag)
+                        label = followup.EXPORT_FORMATS[export_format][0]
+                        if followup.is_zip_export(export_format, export_split, export_zip):
+                            label = "zipped " + label
+                        st.write(f"Download Completed File ({rows} open SEMS without action for {action_days}+ business days):")
                         st.download_button(
-                            label="Download Excel worksheets",
-                            data=buffer,
-                            file_name="SEM-Follow-Up-" + d1 + ".xlsx",
-                            mime="application/vnd.ms-excel"
+                            label="Download " + label + " file",
+                            data=data,
+                            file_name=followup.export_file_name(export_format, today, export_split, export_zip),
+                            mime=followup.export_mime(export_format, export_split, export_zip)
                         )
-                write_to_excel(sems_df)
+                    write_to_excel()
+            finally:
+                diagnostics.finish(diag)
+
+            # diagnostics of this rerun in the sidebar, with the json for the benchmark history
+            if diag is not None:
+                with diagnostics_panel.container():
+                    st.markdown("### Diagnostics")
+                    st.dataframe(diagnostics.table(diag))
+                    st.download_button("Download diagnostics json", diagnostics.to_json(diag),
+                                       file_name="sems-diagnostics-" + diag["started"].replace(":", "") + ".json",
+                                       mime="application/json")
+            # occupancy again now the aggregates of this view are in the registry
+            show_registry_status()
 
 
 
@@ -0,0 +1,306 @@
+# Query backend for the dashboard group-bys
+# The Region, Partner, Carrier and Customer sections ask for "SEMS per value of a column" and
+# "average of a column per value" tables through the functions below. They run on pandas by
+# default, as SQL on an in-process DuckDB relation over the same df (multi-threaded, and
+# spilling to disk when a query needs more memory than is available), or as Polars lazy
+# queries, where the filter, group-by and top n run as one optimised plan across all cores and
+# only the small result is converted back to pandas for plotly.
+# DuckDB and Polars are optional, pip install duckdb / polars to use them.
+import os
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+import aggregate
+import ingest
+
+# Backend used when none is passed, can be set with the SEMS_QUERY_BACKEND env variable
+QUERY_BACKEND = os.environ.get("SEMS_QUERY_BACKEND", "pandas")
+
+# DuckDB writes to this directory when a query doesn't fit in memory
+DUCKDB_TEMP_DIR = os.path.join(ingest.CACHE_DIR, "duckdb")
+
+_duckdb = threading.local()
+
+# Sums of the averaged values are rounded to this many decimals before dividing. Every engine
+# adds up a group in its own order, so their sums differ in the last bits and a mean of 5.005
+# came out as 5.00 on one backend and 5.01 on another. The exports hold values with at most 2
+# decimals, so this only removes the summation error
+MEAN_SUM_DECIMALS = 6
+
+# Columns already converted for Polars: id(df) -> (weakref to df, {column: polars Series})
+# dropped when the df is garbage collected
+_polars_columns = {}
+_polars_lock = threading.Lock()
+
+
+# Backends that can be used here, pandas is always available
+def available_backends():
+    backends = ["pandas"]
+    for name in ("duckdb", "polars"):
+        try:
+            __import__(name)
+        except ImportError:
+            continue
+        backends.append(name)
+    return backends
+
+
+# DuckDB connection of the current thread (a connection can't be shared between threads)
+def _duckdb_connection():
+    if getattr(_duckdb, "conn", None) is None:
+        import duckdb
+        os.makedirs(DUCKDB_TEMP_DIR, exist_ok=True)
+        _duckdb.conn = duckdb.connect(config={"temp_directory": DUCKDB_TEMP_DIR})
+    return _duckdb.conn
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+# Run a query against df registered as the table `sems`
+def _duckdb_query(df, sql, params):
+    conn = _duckdb_connection()
+    conn.register("sems", df)
+    try:
+        return conn.execute(sql, params).df()
+    finally:
+        conn.unregister("sems")
+
+
+# Give the by columns of a DuckDB result the categories of df, so every backend sorts them the same
+def _match_categories(result, df, by_cols):
+    for col in by_cols:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            result[col] = result[col].astype(df[col].dtype)
+    return result
+
+
+# SQL condition and parameters for a where dict (column == value, a list matches any of them)
+def _sql_where(where, by_cols):
+    conditions = [f"{_quote(col)} IS NOT NULL" for col in by_cols]
+    params = []
+    for col, value in (where or {}).items():
+        if isinstance(value, (list, tuple, set)):
+            value = list(value)
+            if not value:
+                conditions.append("FALSE")
+                continue
+            conditions.append(f"CAST({_quote(col)} AS VARCHAR) IN ({', '.join('?' * len(value))})")
+            params += [str(v) for v in value]
+        else:
+            conditions.append(f"CAST({_quote(col)} AS VARCHAR) = ?")
+            params.append(str(value))
+    return " AND ".join(conditions), params
+
+
+# Polars column for a df column, categoricals are converted to their integer codes (-1 is missing)
+# so any kind of category converts without copying strings, and groups sort in category order
+def _polars_series(col):
+    import polars as pl
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return pl.Series(col.name, col.cat.codes.to_numpy().astype(np.int32))
+    return pl.from_pandas(col)
+
+
+# Lazy frame holding `columns` of df, each column is only converted once per df
+def _polars_frame(df, columns):
+    import polars as pl
+    key = id(df)
+    with _polars_lock:
+        entry = _polars_columns.get(key)
+        if entry is None or entry[0]() is not df:
+            entry = (weakref.ref(df, lambda _, key=key: _polars_columns.pop(key, None)), {})
+            _polars_columns[key] = entry
+        converted = entry[1]
+        for col in columns:
+            if col not in converted:
+                converted[col] = _polars_series(df[col])
+        return pl.DataFrame([converted[col] for col in columns]).lazy()
+
+
+# Polars filter for a where dict, rows with a missing value in a by column are dropped too
+# Values are matched to categoricals the way pandas compares them, against the categories
+def _polars_where(df, where, by_cols):
+    import polars as pl
+    condition = pl.lit(True)
+    for col in by_cols:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            condition &= pl.col(col) >= 0
+        else:
+            condition &= pl.col(col).is_not_null()
+    for col, value in (where or {}).items():
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            values = np.flatnonzero(df[col].cat.categories.isin(values)).tolist()
+        condition &= pl.col(col).is_in(values)
+    return condition
+
+
+# Collect a Polars query and give its by columns back their categories
+def _polars_result(query, df, by_cols):
+    result = query.collect().to_pandas()
+    for col in by_cols:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            result[col] = pd.Categorical.from_codes(result[col].to_numpy(), dtype=df[col].dtype)
+    return result
+
+
+# Rows of df matching every column == value pair in `where` (pandas backend)
+def _pandas_where(df, where):
+    if not where:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for col, value in where.items():
+        if isinstance(value, (list, tuple, set)):
+            mask &= df[col].isin(list(value)).to_numpy()
+        else:
+            mask &= (df[col] == value).to_numpy()
+    return df[mask]
+
+
+# Sort a result largest first, ties in `by` order, and return the by columns as plain values
+def _finish(result, by_cols, value, n):
+    result = result.sort_values(by_cols, kind="mergesort", ignore_index=True)
+    result = result.sort_values(value, ascending=False, kind="mergesort", ignore_index=True)
+    if n is not None:
+        result = result.head(n)
+    for col in by_cols:
+        result[col] = result[col].astype(object)
+    return result
+
+
+# Number of SEMS per value of `by` (a column or list of columns) matching `where`, largest first
+# weight: column holding a count per row (e.g. 'Count' of the count cube), None counts rows
+# Returns a df of the by columns and Count, n limits it to the top n rows
+def top_counts(df, by, n=None, where=None, weight=None, backend=None):
+    backend = backend or QUERY_BACKEND
+    by_cols = [by] if isinstance(by, str) else list(by)
+    if backend == "pandas":
+        sub = _pandas_where(df, where)
+        grouped = sub.groupby(by_cols, observed=True)
+        counts = grouped[weight].sum() if weight else grouped.size()
+        result = counts.rename("Count").reset_index()
+    elif backend == "duckdb":
+        condition, params = _sql_where(where, by_cols)
+        keys = ", ".join(_quote(col) for col in by_cols)
+        count = f"SUM({_quote(weight)})" if weight else "COUNT(*)"
+        result = _duckdb_query(
+            df, f"SELECT {keys}, {count} AS Count FROM sems WHERE {condition} GROUP BY {keys}", params)
+        result = _match_categories(result, df, by_cols)
+    elif backend == "polars":
+        import polars as pl
+        columns = list(dict.fromkeys(by_cols + list(where or {}) + ([weight] if weight else [])))
+        count = pl.col(weight).sum() if weight else pl.len()
+        query = (_polars_frame(df, columns)
+                 .filter(_polars_where(df, where, by_cols))
+                 .group_by(by_cols)
+                 .agg(count.alias("Count"))
+                 # top n inside the plan, ties in category order like the other backends
+                 .sort(["Count"] + by_cols, descending=[True] + [False] * len(by_cols)))
+        if n is not None:
+            query = query.head(n)
+        result = _polars_result(query, df, by_cols)
+    else:
+        raise ValueError(f"Unknown query backend {backend!r}, expected one of {available_backends()}")
+    result["Count"] = result["Count"].astype("int64")
+    return _finish(result, by_cols, "Count", n)
+
+
+# Average of `value` per value of `by` matching `where`, rounded to `decimals`, largest first
+# Every backend only sums and counts the values of each group, the average is worked out here
+# (see MEAN_SUM_DECIMALS) so the backends round it the same way
+# Returns a df of the by columns and the value column, n limits it to the top n rows
+def top_means(df, by, value, n=None, where=None, decimals=2, backend=None):
+    backend = backend or QUERY_BACKEND
+    by_cols = [by] if isinstance(by, str) else list(by)
+    if backend == "pandas":
+        sub = _pandas_where(df, where)
+        result = sub.groupby(by_cols, observed=True)[value].agg(["sum", "count"]).reset_index()
+    elif backend == "duckdb":
+        condition, params = _sql_where(where, by_cols)
+        keys = ", ".join(_quote(col) for col in by_cols)
+        result = _duckdb_query(
+            df, f'SELECT {keys}, SUM({_quote(value)}) AS "sum", COUNT({_quote(value)}) AS "count" FROM sems '
+                f"WHERE {condition} GROUP BY {keys}", params)
+        result = _match_categories(result, df, by_cols)
+    elif backend == "polars":
+        import polars as pl
+        columns = list(dict.fromkeys(by_cols + list(where or {}) + [value]))
+        query = (_polars_frame(df, columns)
+                 .filter(_polars_where(df, where, by_cols))
+                 .group_by(by_cols)
+                 .agg(pl.col(value).sum().alias("sum"), pl.col(value).count().alias("count")))
+        # rounded and cut to the top n in pandas, so ties after rounding break the same way
+        result = _polars_result(query, df, by_cols)
+    else:
+        raise ValueError(f"Unknown query backend {backend!r}, expected one of {available_backends()}")
+    # groups with no values at all (every value missing) have no average
+    result = result[result["count"] > 0]
+    total = result["sum"].astype(float).round(MEAN_SUM_DECIMALS)
+    result = result[by_cols].assign(**{value: (total / result["count"]).round(decimals)})
+    return _finish(result, by_cols, value, n)
+
+
+# Queries run by the dashboard sections, used to check the backends agree
+PARITY_QUERIES = [
+    ("counts", dict(by="Sales Region")),
+    ("counts", dict(by=["Sales Region", "Priority"], where={"SEM Status": "Open"})),
+    ("counts", dict(by=["Sales Region", "CAT"])),
+    ("counts", dict(by="Sold-To ID", n=10)),
+    ("counts", dict(by="Sold-To ID", n=10, where={"SEM Status": "Open"})),
+    ("counts", dict(by="Carrier")),
+    ("counts", dict(by="Carrier", n=10, where={"SEM Status": "Open"})),
+    ("counts", dict(by="SEM Sub issue Type", n=10)),
+    ("counts", dict(by="SEM Issue Type", n=3)),
+    ("means", dict(by="Carrier", value="Action Age [Days]", n=10)),
+    ("means", dict(by="Sold-To ID", value="Action Age [Days]")),
+    ("cube", dict(by="Sales Region")),
+    ("cube", dict(by=["Sales Region", "Priority"], where={"SEM Status": "Open"})),
+    ("cube", dict(by="Sold-To ID", n=10, where={"SEM Status": "Open"})),
+    ("cube", dict(by="CAT", where={"SEM Status": ["Open", "Closed"]})),
+]
+
+
+# Run PARITY_QUERIES on df with every backend (all the available ones by default),
+# "cube" queries run on the count cube of df
+# Returns a list of (query, difference) for every query whose results differ, empty if they all match
+def parity_check(df, backends=None):
+    backends = backends or available_backends()
+    cube = aggregate.count_cube(df)
+    mismatches = []
+    for kind, kwargs in PARITY_QUERIES:
+        if kind == "cube":
+            results = [top_counts(cube, weight="Count", backend=backend, **kwargs) for backend in backends]
+            # the cube has to give the same counts as the rows it was built from
+            results.append(top_counts(df, backend=backends[0], **kwargs))
+        else:
+            query = top_counts if kind == "counts" else top_means
+            results = [query(df, backend=backend, **kwargs) for backend in backends]
+        for other in results[1:]:
+            try:
+                pd.testing.assert_frame_equal(results[0], other, check_dtype=False)
+            except AssertionError as error:
+                mismatches.append(((kind, kwargs), str(error)))
+    return mismatches
+
+
+# python backend.py <workbook.xlsx> checks the backends agree on an export,
+# python backend.py on a generated one (see synthetic.py)
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            sems_df, _ = ingest.load_sems(f.read())
+    else:
+        import synthetic
+        sems_df = synthetic.prepared_sems(20_000, seed=1)
+    mismatches = parity_check(sems_df)
+    for query, difference in mismatches:
+        print(query, difference, sep="\n")
+    print(f"{len(PARITY_QUERIES) - len(mismatches)}/{len(PARITY_QUERIES)} queries match")
+    sys.exit(1 if mismatches else 0)
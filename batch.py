@@ -0,0 +1,151 @@
+# Headless batch run of the SEMS report, no Streamlit needed (e.g. the Monday report from cron)
+# For every SEMS workbook this writes the KPI snapshot as json and csv and the action day
+# follow up file, the same numbers and file the dashboard gives for the same date range.
+# A folder is processed file by file in parallel worker processes.
+#
+#   python batch.py exports/ --out reports/ --action-days 10 --workers 4
+#   python batch.py dach.xlsx uk.xlsx --merge --name western-europe --start 2023-01-01
+import argparse
+import glob
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import pandas as pd
+
+import followup
+import ingest
+import report
+
+
+# Workbooks to process: the files given plus every .xlsx file in the folders given, in name order
+# (Excel's ~$ lock files are skipped)
+def find_workbooks(paths):
+    workbooks = []
+    for path in paths:
+        if os.path.isdir(path):
+            workbooks += sorted(file for file in glob.glob(os.path.join(path, "*.xlsx"))
+                                if not os.path.basename(file).startswith("~$"))
+        else:
+            workbooks.append(path)
+    return workbooks
+
+
+# Load and filter workbooks through the ingest cache, several workbooks are merged into one
+# dataset (one row per SEM ID) the same way as uploading them together
+def load_workbooks(paths, streaming=False):
+    loaded = []
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        loaded.append(ingest.load_sems(data, streaming=streaming or len(data) > ingest.STREAMING_THRESHOLD_BYTES))
+    return ingest.merge_loaded(loaded)
+
+
+# Run the report for one dataset (one workbook, or several with --merge) and write its files
+# to options["out"] as <name>-kpis.json, <name>-kpis.csv and <name>-follow-up-<today>.<ext>
+# Returns a summary dict of what was written
+def run_report(name, paths, options):
+    start = time.perf_counter()
+    sems_df, info = load_workbooks(paths, options["streaming"])
+    df = report.dashboard_frame(sems_df, options["start"], options["end"])
+    today = options["today"]
+    os.makedirs(options["out"], exist_ok=True)
+    prefix = os.path.join(options["out"], name)
+
+    table = report.kpi_snapshot(df)
+    table.to_csv(prefix + "-kpis.csv", index=False)
+    created = df["Created On"].dropna()
+    with open(prefix + "-kpis.json", "w") as f:
+        f.write(report.kpi_json(
+            table, name=name, files=[os.path.abspath(path) for path in paths], dataset_key=info["key"],
+            start=str(created.min().date()) if len(created) else None,
+            end=str(created.max().date()) if len(created) else None,
+            generated_on=str(today), rows=len(df)))
+
+    extension = "zip" if followup.is_zip_export(options["format"], options["split_by"], options["zip"]) \
+        else followup.EXPORT_FORMATS[options["format"]][1]
+    follow_up_path = f"{prefix}-follow-up-{today:%Y-%m-%d}.{extension}"
+    follow_up_rows = report.write_follow_up(df, options["action_days"], today, followup.load_holiday_calendars(),
+                                            options["format"], follow_up_path, options["split_by"], options["zip"])
+    return {"name": name, "rows": len(df), "follow_up_rows": follow_up_rows,
+            "files": [prefix + "-kpis.json", prefix + "-kpis.csv", follow_up_path],
+            "seconds": time.perf_counter() - start}
+
+
+# run_report for a worker process, errors are returned rather than raised so one bad workbook
+# doesn't stop the others
+def _run_job(job):
+    name, paths, options = job
+    logging.basicConfig(level=options["log_level"], format="%(asctime)s %(processName)s %(message)s")
+    try:
+        return run_report(name, paths, options)
+    except Exception as error:
+        ingest.logger.exception("Report for %s failed", name)
+        return {"name": name, "error": f"{type(error).__name__}: {error}"}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Write SEMS KPI snapshots and follow up files without the dashboard")
+    parser.add_argument("paths", nargs="+", help="SEMS workbooks (.xlsx) or folders of them")
+    parser.add_argument("--out", default="reports", help="folder the reports are written to (default: reports)")
+    parser.add_argument("--start", help="first day of SEMS created (YYYY-MM-DD, default: earliest in the data)")
+    parser.add_argument("--end", help="last day of SEMS created (YYYY-MM-DD, default: latest in the data)")
+    parser.add_argument("--action-days", type=int, default=10,
+                        help="business days without action for a SEM to be followed up (default: 10)")
+    parser.add_argument("--today", help="date business days are counted up to (YYYY-MM-DD, default: today)")
+    parser.add_argument("--format", choices=list(followup.EXPORT_FORMATS), default="xlsx",
+                        help="follow up file format (default: xlsx)")
+    parser.add_argument("--split-by", choices=followup.EXPORT_SPLITS,
+                        help="one sheet (or with --zip, one file) per value of this column")
+    parser.add_argument("--zip", action="store_true", help="zip of one follow up file per group")
+    parser.add_argument("--merge", action="store_true", help="merge every workbook into one report")
+    parser.add_argument("--name", help="name of the merged report (default: merged)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes for several workbooks (default: one per CPU)")
+    parser.add_argument("--streaming", action="store_true", help="low memory ingest for very large workbooks")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every step")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    log_level = logging.INFO if args.verbose else logging.WARNING
+    logging.basicConfig(level=log_level, format="%(asctime)s %(processName)s %(message)s")
+
+    workbooks = find_workbooks(args.paths)
+    if not workbooks:
+        print("No SEMS workbooks found", file=sys.stderr)
+        return 2
+    options = {"out": args.out, "start": args.start, "end": args.end, "action_days": args.action_days,
+               "today": pd.Timestamp(args.today).date() if args.today else date.today(),
+               "format": args.format, "split_by": args.split_by, "zip": args.zip,
+               "streaming": args.streaming, "log_level": log_level}
+    if args.merge:
+        jobs = [(args.name or "merged", workbooks, options)]
+    else:
+        jobs = [(os.path.splitext(os.path.basename(path))[0], [path], options) for path in workbooks]
+
+    workers = max(1, min(args.workers, len(jobs)))
+    if workers == 1:
+        results = [_run_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_run_job, jobs))
+
+    failed = 0
+    for result in results:
+        if "error" in result:
+            failed += 1
+            print(f"{result['name']}: FAILED {result['error']}", file=sys.stderr)
+        else:
+            print(f"{result['name']}: {result['rows']} SEMS, {result['follow_up_rows']} to follow up "
+                  f"({result['seconds']:.1f}s) -> {', '.join(result['files'])}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,369 @@
+# Stage by stage benchmark of the dashboard on synthetic SEMS exports (see synthetic.py)
+# Every stage the dashboard runs between an upload and the follow up file is timed on its own,
+# at each size, and the results are written as json so runs can be compared.
+#
+#   python benchmark.py                                  # 10k, 100k and 1M rows
+#   python benchmark.py --sizes 10000 100000 --backend duckdb --out bench/duckdb.json
+#
+# Workbooks are generated once per size and seed and kept in --workbooks, the 1M row workbook
+# takes a few minutes to write and much longer to parse through openpyxl.
+import argparse
+import io
+import json
+import os
+import statistics
+import time
+from datetime import datetime
+
+import pandas as pd
+import plotly.express as px
+
+import aggregate
+import backend
+import charts
+import diagnostics
+import followup
+import ingest
+import kpi
+import report
+import synthetic
+import trend
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# Days of data the dashboard sections are run on (the sidebar's default is the last 30 days,
+# reports usually cover a quarter)
+DASHBOARD_DAYS = 90
+
+# Action day threshold of the follow up file
+ACTION_DAYS = 10
+
+open_sems = {"SEM Status": "Open"}
+
+# Colours of app.py's charts
+CAT_COLOURS = {"RO": "gold", "AOU": "#c552e4", "TEL": "#00d1ff"}
+PRIORITY_COLOURS = {"P1": "gold", "P2": "#00d1ff"}
+STATUS_COLOURS = {"Open": "gold", "Closed": "#00d1ff"}
+DEEP_DIVE_COLOURS = ["#FFAC81", "#FF928B", "#FEC3A6", "#EFE9AE", "#CDEAC0"]
+
+
+# Figures as app.py draws them: labelled histograms of a counts frame, grouped histograms and
+# line-only scatter trends
+def _histogram(counts, x, y, title, colour="gold", **kwargs):
+    return px.histogram(data_frame=counts, x=x, y=y, title=title, color_discrete_sequence=[colour], text_auto=True,
+                        **kwargs)
+
+
+def _grouped_histogram(counts, x, title, color, colours):
+    fig = px.histogram(data_frame=counts, x=x, y="Count", title=title, color=color, text_auto=True,
+                       color_discrete_map=colours)
+    return fig.update_layout(barmode="group")
+
+
+def _grouped_bar(counts, x, title, color, colours):
+    return charts.count_bar(counts, x, title=title, color=color, color_discrete_map=colours).update_layout(
+        barmode="group")
+
+
+def _trend(fig):
+    fig.update_layout(xaxis=dict(showgrid=False), yaxis=dict(showgrid=False))
+    return fig.update_traces(mode="lines")
+
+
+# Daily counts of a carrier / customer with its trendline (see trend.py)
+def _entity_trend(counts, title, colour):
+    fig = px.scatter(data_frame=counts, x="Date", y="Count", title=title, color_discrete_sequence=[colour])
+    fig.add_scatter(x=counts["Date"], y=counts["Trend"], name="Trend", line_color="gold", showlegend=False)
+    return _trend(fig)
+
+
+# Every dashboard section runs the same queries as app.py and returns chart name -> function
+# building the chart's figure the way app.py does, the queries are timed as the section and the
+# figures as the figure construction stage
+def main_kpis(df, cube, query_backend):
+    table = kpi.kpi_table(cube)
+    kpi.kpi_row(table)
+    kpi.period_comparison(table, "FW")
+    kpi.period_comparison(table, "Quarter")
+    aggregate.most_common(cube, "Assigned To Team", open_sems)
+    aggregate.most_common(cube, "SEM Issue Type", open_sems)
+    return {}
+
+
+def open_sems_section(df, cube, query_backend):
+    weeks = df["FW"].nunique()
+    status = charts.count_frame(cube, "SEM Status")
+    open_region = charts.count_frame(cube, "Sales Region", open_sems)
+    open_cat = charts.count_frame(cube, "CAT", open_sems)
+    top_open = {column: aggregate.top_counts(cube, column, n=10, where=open_sems)
+                for column in ["Sold-To ID", "Assigned To Team", "SEM Issue Type"]}
+    for column in ["Assigned To Team", "Sales Region", "CAT", "Sold-To ID"]:
+        aggregate.most_common(cube, column, open_sems)
+    figures = {
+        "sem_status": lambda: charts.count_bar(status, "SEM Status", title="Histogram of SEM Status",
+                                               color_discrete_sequence=["gold"]).update_xaxes(
+            categoryorder="total descending"),
+        "open_region": lambda: charts.count_bar(open_region, "Sales Region", title="Histogram of Open SEMS by Region",
+                                                color_discrete_sequence=["gold"]).update_xaxes(
+            categoryorder="total descending"),
+        "open_cat": lambda: charts.count_bar(open_cat, "CAT", title="Histogram of CAT Frequency", color="CAT",
+                                             color_discrete_map=CAT_COLOURS),
+        "top10_partners_open": lambda: _histogram(top_open["Sold-To ID"], "Sold-To ID", "Count",
+                                                  "Top 10 Partners by Open Orders"),
+        "top10_open_team": lambda: _histogram(top_open["Assigned To Team"], "Assigned To Team", "Count",
+                                              "Top 10 Teams by Open Orders"),
+        "top10_open_issue": lambda: _histogram(top_open["SEM Issue Type"], "SEM Issue Type", "Count",
+                                               "Top 10 Issues by Open Orders"),
+    }
+    if weeks >= 3:
+        weekly = aggregate.cube_counts(cube, "FW").reset_index(name="Count")
+        figures["open_trend"] = lambda: _trend(px.scatter(data_frame=weekly, x="FW", y="Count", title="Open SEM Trend",
+                                                          color_discrete_sequence=["gold"]))
+    if weeks >= 2:
+        status_weekly = charts.count_frame(cube, ["FW", "SEM Status"], {"SEM Status": ["Open", "Closed"]})
+        figures["status_weekly"] = lambda: _grouped_bar(status_weekly, "FW", "SEM Status Weekly", "SEM Status",
+                                                        STATUS_COLOURS)
+    return figures
+
+
+def category_section(df, cube, query_backend):
+    cat_counts = charts.count_frame(cube, "CAT")
+    largest = aggregate.top_counts(cube, "CAT")
+    aggregate.top_counts(cube, "CAT", where=open_sems)
+    aggregate.cube_total(cube, {**open_sems, "CAT": largest["CAT"].values[0], "Priority": "P1"})
+    figures = {
+        "cat_frequency": lambda: charts.count_bar(cat_counts, "CAT", title="Histogram of CAT Frequency", color="CAT",
+                                                  color_discrete_map=CAT_COLOURS),
+        "cat_pie": lambda: charts.count_pie(cat_counts, "CAT", title="PieChart of CAT Frequency", hole=0.6,
+                                            color="CAT", color_discrete_map=CAT_COLOURS),
+    }
+    if df["FW"].nunique() > 2:
+        weekly = aggregate.cube_counts(cube, ["FW", "CAT"]).reset_index(name="Count")
+        weekly_open = aggregate.cube_counts(cube, ["FW", "CAT"], where=open_sems).unstack(fill_value=0).stack() \
+            .reset_index(name="Count")
+        figures["cat_trend"] = lambda: _trend(px.scatter(data_frame=weekly, x="FW", y="Count", color="CAT",
+                                                         title="Total No. SEM Trend", color_discrete_map=CAT_COLOURS))
+        figures["cat_open_trend"] = lambda: px.line(data_frame=weekly_open, x="FW", y="Count", color="CAT",
+                                                    title="Open SEM Trend", color_discrete_map=CAT_COLOURS) \
+            .update_layout(xaxis=dict(showgrid=False), yaxis=dict(showgrid=False))
+    return figures
+
+
+def region_section(df, cube, query_backend):
+    def counts(by, n=None, where=None):
+        return backend.top_counts(cube, by, n=n, where=where, weight="Count", backend=query_backend)
+    total = counts("Sales Region")
+    open_priority = counts(["Sales Region", "Priority"], where=open_sems)
+    cat = counts(["Sales Region", "CAT"])
+    counts("Sales Region", n=1, where=open_sems)
+    return {
+        "total_by_region": lambda: _histogram(total, "Sales Region", "Count", "Total SEMS by Region"),
+        "open_priority_by_region": lambda: _grouped_histogram(open_priority, "Sales Region",
+                                                              "P1 vs P2 Open SEMS by Partner", "Priority",
+                                                              PRIORITY_COLOURS),
+        "cat_by_region": lambda: _grouped_histogram(cat, "Sales Region", "Total SEMS per CAT Breakdown by Region",
+                                                    "CAT", CAT_COLOURS),
+    }
+
+
+# Overall trend and top 10 issues / root causes, straight off the dashboard frame like app.py
+def additional_analysis_section(df, cube, query_backend):
+    def counts(column):
+        x = df.groupby(column, observed=True).size()
+        counts = pd.DataFrame(x, columns=["Count"])
+        counts[column] = counts.index
+        return counts
+
+    def top10(counts, column, title):
+        fig = _histogram(counts, column, "Count", title)
+        return fig.update_layout(xaxis=dict(showgrid=False), yaxis=dict(showgrid=False))
+
+    issues = counts("SEM Issue Type").sort_values("Count", ascending=[False]).head(n=10)
+    root_causes = counts("Root Cause").sort_values("Count", ascending=[False]).head(n=10)
+    figures = {
+        "top10_issues": lambda: top10(issues, "SEM Issue Type", "Top 10 Most Common Issues"),
+        "top10_root_causes": lambda: top10(root_causes, "Root Cause", "Top 10 Root Cause"),
+    }
+    if df["FW"].nunique() > 2:
+        weekly = counts("FW")
+        figures["overall_trend"] = lambda: _trend(px.scatter(data_frame=weekly, x="FW", y="Count",
+                                                             title="Overall Trend of SEMS",
+                                                             color_discrete_sequence=["gold"]))
+    return figures
+
+
+# Top 5 deep dives of the Carrier and Customer sections
+# charts: (chart name, column, top n, title before the name, small x ticks) per chart of a deep dive
+def _deep_dives(df, column, totals, charts_per_value, query_backend):
+    index = aggregate.partition_index(df, column)
+    trends = trend.trend_lines(df, column)
+    figures = {}
+    for i, colour in enumerate(DEEP_DIVE_COLOURS[:len(totals)]):
+        value = str(totals[column].iloc[i])
+        rows = aggregate.partition_rows(df, index, value)
+        for chart, by, n, title, small_ticks in charts_per_value:
+            counts = backend.top_counts(rows, by, n=n, backend=query_backend)
+
+            def figure(counts=counts, by=by, title=title + value, colour=colour, small_ticks=small_ticks):
+                fig = _histogram(counts, by, "Count", title, colour)
+                return fig.update_layout(xaxis=dict(tickfont=dict(size=7.5))) if small_ticks else fig
+            figures[f"deep_dive_{i}_{chart}"] = figure
+        counts = trend.entity_trend(trends, value)
+        figures[f"deep_dive_{i}_trend"] = lambda counts=counts, value=value, colour=colour: _entity_trend(
+            counts, value + " SEM Trend", colour)
+    return figures
+
+
+def carrier_section(df, cube, query_backend):
+    totals = backend.top_counts(df, "Carrier", backend=query_backend)
+    top_open = backend.top_counts(df, "Carrier", n=10, where=open_sems, backend=query_backend)
+    action_age = backend.top_means(df, "Carrier", "Action Age [Days]", n=10, backend=query_backend)
+    figures = {
+        "top10_carriers": lambda: _histogram(totals.head(n=10), "Carrier", "Count", "Top 10 Carriers by SEMS created"),
+        "top10_carriers_open": lambda: _histogram(top_open, "Carrier", "Count", "Top 10 Carriers by Open SEMS"),
+        "action_day_hist": lambda: _histogram(action_age, "Carrier", "Action Age [Days]",
+                                              "Top 10 Carriers by Action Day Length"),
+    }
+    figures.update(_deep_dives(df, "Carrier", totals, [
+        ("sub_issues", "SEM Sub issue Type", 10, "Top 10 SEM Sub-Issues for ", False),
+        ("customers_affected", "Sold-To ID", 10, "Top 10 Customers affected by ", False),
+    ], query_backend))
+    return figures
+
+
+def customer_section(df, cube, query_backend):
+    totals = backend.top_counts(df, "Sold-To ID", backend=query_backend)
+    top15 = backend.top_counts(df, "Sold-To ID", n=15, backend=query_backend)
+    top_open = backend.top_counts(df, "Sold-To ID", n=10, where=open_sems, backend=query_backend)
+    action_age = backend.top_means(df, "Sold-To ID", "Action Age [Days]", n=10, backend=query_backend)
+    waiting = backend.top_means(df, "Sold-To ID", "Action Age [Days]", backend=query_backend)
+    waiting = waiting[waiting["Action Age [Days]"] > 10]
+    figures = {
+        "top15_customers": lambda: _histogram(top15, "Sold-To ID", "Count", "Top 15 Customers by Total SEMS"),
+        "top10_customers_open": lambda: _histogram(top_open, "Sold-To ID", "Count", "Top 10 Customers by Open SEMS"),
+        "action_day_hist_top10": lambda: _histogram(action_age, "Sold-To ID", "Action Age [Days]",
+                                                    "Longest waiting Customers (by Average Action Day)"),
+        "action_day_hist": lambda: _histogram(waiting, "Sold-To ID", "Action Age [Days]",
+                                              "Customers whose Avg Action Days >10"),
+    }
+    figures.update(_deep_dives(df, "Sold-To ID", totals, [
+        ("sub_issues", "SEM Sub issue Type", 8, "SEM Sub-Issues for ", True),
+        ("carriers_affecting", "Carrier", 5, "Carriers affecting ", False),
+        ("issues", "SEM Issue Type", 3, "SEM Issues for ", True),
+    ], query_backend))
+    return figures
+
+
+# The sections app.py's section selector offers (its Partner and Priority blocks can't be picked)
+SECTIONS = {
+    "Main KPIs": main_kpis,
+    "Open SEMS": open_sems_section,
+    "Category": category_section,
+    "Region": region_section,
+    "Additional Analysis": additional_analysis_section,
+    "Carrier": carrier_section,
+    "Customer": customer_section,
+}
+
+
+# Build every section figure, serialised the way st.plotly_chart sends it
+# Returns the total payload in bytes
+def build_figures(figures):
+    return sum(charts.figure_bytes(figure()) for figure in figures.values())
+
+
+# Time fn() `repeat` times, returns its last result and the timings
+def _time(fn, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - start)
+    return result, seconds
+
+
+# Synthetic workbook with `rows` rows, generated on the first run and reused after that
+def workbook(rows, seed, folder):
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"sems-{rows}-seed{seed}.xlsx")
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        synthetic.write_workbook(synthetic.generate_sems(rows, seed), path + ".tmp")
+        os.replace(path + ".tmp", path)
+        ingest.logger.warning("Generated %s in %.1fs", path, time.perf_counter() - start)
+    return path
+
+
+# Run every stage on a workbook of `rows` rows
+# Returns a list of {"stage", "seconds" (fastest run), "median", "runs", "rows"} dicts
+def run_size(rows, seed=0, repeat=3, query_backend="pandas", folder="bench"):
+    stages = []
+
+    def record(stage, fn, count=len, runs=repeat):
+        result, seconds = _time(fn, runs)
+        stages.append({"stage": stage, "seconds": min(seconds), "median": statistics.median(seconds),
+                       "runs": len(seconds), "rows": count(result) if count else None})
+        print(f"  {stage:<32} {min(seconds):9.4f}s", flush=True)
+        return result
+
+    with open(workbook(rows, seed, folder), "rb") as f:
+        data = f.read()
+    rules = ingest.load_exclusion_rules()
+    # parsing is slow and always the same work, it is only run once
+    raw_df = record("ingest", lambda: ingest.read_excel(data), runs=1)
+    filtered, _ = record("data_filter", lambda: ingest.data_filter(raw_df, rules), count=lambda r: len(r[0]))
+    sems_df = record("prepare dates and categoricals",
+                     lambda: ingest.to_categoricals(ingest.prepare_dates(filtered.reset_index(drop=True))))
+    end = sems_df["Created On"].max()
+    start = end - pd.Timedelta(days=DASHBOARD_DAYS - 1)
+    df = record("date slicing", lambda: report.dashboard_frame(sems_df, start, end))
+    cube = record("count cube", lambda: aggregate.count_cube(df))
+
+    figures = {}
+    for name, section in SECTIONS.items():
+        section_figures = record(f"section: {name}", lambda: section(df, cube, query_backend))
+        figures.update({f"{name}: {chart}": figure for chart, figure in section_figures.items()})
+    record("figure construction", lambda: build_figures(figures), count=lambda payload: payload)
+
+    calendars = followup.load_holiday_calendars()
+    today = (end + pd.Timedelta(days=1)).date()
+    follow_up = record("follow up rows", lambda: followup.action_day_follow_up(df, ACTION_DAYS, today, calendars))
+    export = followup.export_frame(follow_up)
+    record("excel export", lambda: _excel_bytes(export), count=len)
+    return stages
+
+
+def _excel_bytes(df):
+    buffer = io.BytesIO()
+    followup.write_xlsx(df, buffer)
+    return buffer.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every dashboard stage on synthetic SEMS exports")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="rows per workbook")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of every stage but ingest (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic data (default: 0)")
+    parser.add_argument("--backend", default=backend.QUERY_BACKEND, choices=backend.available_backends(),
+                        help="query backend of the sections")
+    parser.add_argument("--workbooks", default="bench", help="folder the generated workbooks are kept in")
+    parser.add_argument("--out", help="json file to write (default: bench/benchmark-<time>.json)")
+    args = parser.parse_args(argv)
+
+    started = datetime.now()
+    results = []
+    for rows in args.sizes:
+        print(f"{rows} rows", flush=True)
+        results.append({"rows": rows, "stages": run_size(rows, args.seed, args.repeat, args.backend, args.workbooks)})
+    document = {"started": started.isoformat(timespec="seconds"), "seed": args.seed, "repeat": args.repeat,
+                "backend": args.backend, "dashboard_days": DASHBOARD_DAYS, "environment": diagnostics.environment(),
+                "results": results}
+    out = args.out or os.path.join(args.workbooks, f"benchmark-{started:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(document, f, indent=2)
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
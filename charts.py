@@ -0,0 +1,108 @@
+# Chart layer for the SEMS dashboard
+# px.histogram on the raw df puts every row in the figure JSON and leaves the counting to the
+# browser, so a 100k row upload sent megabytes per chart on every rerun. These helpers take
+# counts that are already aggregated (see aggregate.py) and build bar / pie figures holding
+# one value per bar or slice.
+import threading
+from collections import OrderedDict
+
+import plotly.express as px
+import plotly.io as pio
+from natsort import natsorted
+
+import aggregate
+
+# Most figures kept by a figure cache before the least recently used one is evicted
+FIGURE_CACHE_SIZE = 256
+
+
+# Count dataframe (`by` columns + Count) for the SEMS in the cube matching `where`
+# Ordered by `by` (fiscal weeks in natural order, FY23Q2W9 before FY23Q2W10)
+def count_frame(cube, by, where=None):
+    df = aggregate.cube_counts(cube, by, where).reset_index()
+    by_cols = [by] if isinstance(by, str) else list(by)
+    # back to plain values so plotly doesn't draw every unused category
+    for col in by_cols:
+        df[col] = df[col].astype(object)
+    return df
+
+
+# Bar chart of a count frame, bars are labelled with their count
+# Values of x are kept in natural order unless the caller reorders the axis
+def count_bar(counts, x, title, color=None, **kwargs):
+    category_orders = {x: natsorted(counts[x].unique())}
+    category_orders.update(kwargs.pop('category_orders', {}))
+    return px.bar(data_frame=counts, x=x, y='Count', color=color, title=title, text_auto=True,
+                  category_orders=category_orders, **kwargs)
+
+
+# Pie chart of a count frame
+def count_pie(counts, names, title, **kwargs):
+    return px.pie(counts, values='Count', names=names, title=title, **kwargs)
+
+
+# Size in bytes of the figure JSON sent to the browser
+# st.plotly_chart serialises the figure with plotly.io.to_json
+def figure_bytes(fig):
+    return len(pio.to_json(fig, validate=False).encode('utf-8'))
+
+
+# Size bounded LRU cache of built figures
+# Keys are (dataset key, start date, end date, query backend, section, chart id, entity) tuples so a
+# figure is only reused for the same data, view and backend. The cache is a dict like ingest's info dicts:
+#   figures: key -> {"fig": figure, "bytes": payload size or None}, oldest first
+#   max_figures, hits, misses, evictions
+def new_figure_cache(max_figures=FIGURE_CACHE_SIZE):
+    return {
+        "figures": OrderedDict(),
+        "max_figures": max_figures,
+        "hits": 0,
+        "misses": 0,
+        "evictions": 0,
+        # sessions share the cache so updates are serialised
+        "lock": threading.Lock(),
+    }
+
+
+# Cached entry for key, build() is called (outside the lock) to make the figure on a miss
+def cached_figure(cache, key, build):
+    with cache["lock"]:
+        entry = cache["figures"].get(key)
+        if entry is not None:
+            cache["figures"].move_to_end(key)
+            cache["hits"] += 1
+            return entry
+        cache["misses"] += 1
+    entry = {"fig": build(), "bytes": None}
+    with cache["lock"]:
+        cache["figures"][key] = entry
+        cache["figures"].move_to_end(key)
+        while len(cache["figures"]) > cache["max_figures"]:
+            cache["figures"].popitem(last=False)
+            cache["evictions"] += 1
+    return entry
+
+
+# Payload size of a cached entry, measured once
+def entry_bytes(entry):
+    if entry["bytes"] is None:
+        entry["bytes"] = figure_bytes(entry["fig"])
+    return entry["bytes"]
+
+
+# One line summary of the cache counters for the sidebar
+def figure_cache_summary(cache):
+    lookups = cache["hits"] + cache["misses"]
+    hit_rate = 100 * cache["hits"] / lookups if lookups else 0
+    return (f"Figure cache: {len(cache['figures'])}/{cache['max_figures']} figures, "
+            f"{cache['hits']} hits, {cache['misses']} misses ({hit_rate:.0f}% hit rate), "
+            f"{cache['evictions']} evicted")
+
+
+# Human readable size, e.g. 1.2 MB
+def format_bytes(n):
+    for unit in ('B', 'KB', 'MB'):
+        if n < 1000:
+            return f"{n:.0f} {unit}" if unit == 'B' else f"{n:.1f} {unit}"
+        n /= 1000
+    return f"{n:.1f} GB"
@@ -0,0 +1,145 @@
+# Diagnostics mode of the SEMS dashboard
+# Opt in with ?diagnostics=1 in the url, `diagnostics = true` in secrets.toml or the
+# SEMS_DIAGNOSTICS env variable. Every section (and every deep dive panel inside one) records
+# its wall time, the rows it worked on, its peak Python memory (tracemalloc) and the bytes of
+# the figures it sent to the browser, so a slow rerun can be pinned on a section.
+# A run is a plain dict kept per session, every function here is a no-op when the run is None.
+# tracemalloc traces the whole process, with several sessions rerunning at once the memory
+# peaks include their allocations too.
+import json
+import os
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+# Values of the query param / secret / env variable that switch diagnostics on
+ENABLED_VALUES = {"1", "true", "yes", "on"}
+
+
+# True if diagnostics are switched on by the query params (a value or a list of values per name,
+# e.g. st.query_params.to_dict()), the secrets (a mapping) or the env variable
+def enabled(query_params=None, secrets=None):
+    values = (query_params or {}).get("diagnostics", [])
+    values = [values] if isinstance(values, str) else list(values)
+    if secrets is not None:
+        values.append(secrets.get("diagnostics", ""))
+    values.append(os.environ.get("SEMS_DIAGNOSTICS", ""))
+    return any(str(value).strip().lower() in ENABLED_VALUES for value in values)
+
+
+# New diagnostics run, info is stored with the results (dataset key, date range...)
+# Starts tracemalloc if it isn't tracing yet, it is stopped again by finish: call that in a finally,
+# or a rerun that raises or is interrupted (st.stop, a widget change) leaves every later allocation
+# of the process traced
+def new_run(**info):
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    return {"started": datetime.now().isoformat(timespec="seconds"), "info": info, "records": [], "open": [],
+            "started_tracing": started_tracing, "began": time.perf_counter()}
+
+
+# Start measuring `name` inside the innermost open measurement (a deep dive panel inside its section)
+# rows: number of rows the section / panel works on
+def start(run, name, rows=None):
+    if run is None:
+        return
+    current, peak = tracemalloc.get_traced_memory()
+    if run["open"]:
+        _update_peak(run["open"][-1], peak)
+    tracemalloc.reset_peak()
+    parent = run["open"][-1]["record"]["stage"] if run["open"] else None
+    record = {"stage": f"{parent} / {name}" if parent else f"section: {name}", "section": name, "parent": parent,
+              "seconds": None, "rows": rows, "peak_memory_bytes": 0, "figure_bytes": 0, "figures": 0}
+    run["records"].append(record)
+    run["open"].append({"record": record, "began": time.perf_counter(), "base": current})
+
+
+# Stop the innermost measurement, its memory peak and figures count towards the one around it too
+def stop(run):
+    if run is None or not run["open"]:
+        return
+    _, peak = tracemalloc.get_traced_memory()
+    entry = run["open"].pop()
+    _update_peak(entry, peak)
+    tracemalloc.reset_peak()
+    record = entry["record"]
+    record["seconds"] = time.perf_counter() - entry["began"]
+    if run["open"]:
+        outer = run["open"][-1]
+        outer["record"]["peak_memory_bytes"] = max(outer["record"]["peak_memory_bytes"],
+                                                   entry["base"] - outer["base"] + record["peak_memory_bytes"])
+        outer["record"]["figure_bytes"] += record["figure_bytes"]
+        outer["record"]["figures"] += record["figures"]
+
+
+def _update_peak(entry, peak):
+    entry["record"]["peak_memory_bytes"] = max(entry["record"]["peak_memory_bytes"], peak - entry["base"])
+
+
+# Start a dashboard section, any section still open is stopped first
+def section(run, name, rows=None):
+    if run is None:
+        return
+    while run["open"]:
+        stop(run)
+    start(run, name, rows)
+
+
+# Count a figure sent to the browser towards the innermost open measurement
+def add_figure(run, figure_bytes):
+    if run is None or not run["open"]:
+        return
+    record = run["open"][-1]["record"]
+    record["figure_bytes"] += figure_bytes
+    record["figures"] += 1
+
+
+# Stop everything still open, called once the last section has run (or the rerun was cut short)
+def finish(run):
+    if run is None:
+        return
+    try:
+        while run["open"]:
+            stop(run)
+        run["seconds"] = time.perf_counter() - run["began"]
+    finally:
+        if run["started_tracing"]:
+            tracemalloc.stop()
+            run["started_tracing"] = False
+
+
+# Records of a run as a table for the sidebar
+def table(run):
+    records = pd.DataFrame(run["records"], columns=["stage", "seconds", "rows", "peak_memory_bytes",
+                                                    "figure_bytes", "figures"])
+    return records.rename(columns={"stage": "Stage", "seconds": "Seconds", "rows": "Rows",
+                                   "peak_memory_bytes": "Peak Memory (MB)", "figure_bytes": "Figure KB",
+                                   "figures": "Figures"}).assign(**{
+        "Peak Memory (MB)": records["peak_memory_bytes"] / 1e6,
+        "Figure KB": records["figure_bytes"] / 1e3,
+    })
+
+
+# Machine the dashboard runs on, stored with the results
+def environment():
+    versions = {"python": platform.python_version(), "pandas": pd.__version__}
+    for name in ("numpy", "plotly", "streamlit", "openpyxl", "xlsxwriter", "duckdb", "polars"):
+        try:
+            versions[name] = __import__(name).__version__
+        except ImportError:
+            continue
+    return {"platform": platform.platform(), "processor": platform.processor(), "cpus": os.cpu_count(),
+            "versions": versions}
+
+
+# Run as json, in the shape of a benchmark.py result ("stages" of one dashboard rerun)
+def to_json(run):
+    document = {"started": run["started"], **run["info"], "seconds": run.get("seconds"),
+                "environment": environment(),
+                "stages": [{key: value for key, value in record.items() if key != "parent"}
+                           for record in run["records"]]}
+    return json.dumps(document, indent=2, default=str)
@@ -0,0 +1,298 @@
+# Action Day Follow Up for the SEMS dashboard
+# Business days since a SEM was last actioned, skipping weekends and the public holidays of
+# the SEM's Sales Region. Holidays are read from the local calendar files in config/holidays
+# (one json file per region, no network lookups) and the count is done with numpy's
+# datetime64[D] business day functions, one call per region.
+import glob
+import io
+import json
+import os
+import re
+import zipfile
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+from natsort import natsorted
+
+import aggregate
+
+HOLIDAYS_DIR = os.environ.get(
+    "SEMS_HOLIDAYS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "config", "holidays"),
+)
+
+
+# Calendar files in `path`, each is {"region": <Sales Region>, "holidays": {"YYYY-MM-DD": <name>, ...}}
+# and optionally "years": [first, last], the years it lists every holiday of
+def _read_calendars(path):
+    for file in sorted(glob.glob(os.path.join(path, "*.json"))):
+        with open(file) as f:
+            yield json.load(f)
+
+
+# Load every holiday calendar in `path`
+# Returns Sales Region -> np.busdaycalendar
+def load_holiday_calendars(path=HOLIDAYS_DIR):
+    calendars = {}
+    for calendar in _read_calendars(path):
+        holidays = np.array(sorted(calendar["holidays"]), dtype="datetime64[D]")
+        calendars[calendar["region"]] = np.busdaycalendar(holidays=holidays)
+    return calendars
+
+
+# Years every holiday calendar in `path` covers: Sales Region -> (first year, last year)
+# Taken from "years" when the file has it, otherwise from the dates of its holidays
+def load_holiday_coverage(path=HOLIDAYS_DIR):
+    coverage = {}
+    for calendar in _read_calendars(path):
+        years = calendar.get("years") or [int(day[:4]) for day in calendar["holidays"]]
+        coverage[calendar["region"]] = (min(years), max(years))
+    return coverage
+
+
+# Regions whose open SEMS count business days in years their holiday calendar doesn't cover
+# (those days silently only skip weekends). Returns one message per region, empty when covered
+def calendar_coverage_warnings(df, today, coverage):
+    open_sems = df[(df["SEM Status"] == "Open").to_numpy()]
+    years = pd.to_datetime(open_sems["Modified Date Time"]).dt.year
+    first_years = years.groupby(open_sems["Sales Region"].astype(object)).min()
+    today_year = pd.Timestamp(today).year
+    messages = []
+    for region, first_year in first_years.items():
+        if region not in coverage or pd.isna(first_year):
+            continue
+        first, last = coverage[region]
+        if first_year < first or today_year > last:
+            messages.append(f"The {region} holiday calendar covers {first}-{last} only, business days of open "
+                            f"SEMS between {int(first_year)} and {today_year} outside those years skip "
+                            f"weekends but no holidays. Add the missing years to config/holidays.")
+    return messages
+
+
+# Business days from each date up to (not including) `today`
+# dates: datetime Series, regions: Sales Region Series of the same rows
+# Regions without a calendar only skip weekends. Rows with no date are <NA>
+# The count is only done once per region per calendar day in the range of the data, each row
+# then looks its value up by (region, day) so the per row work is a single gather.
+def business_days_since(dates, regions, today, calendars):
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates)
+    days = dates.to_numpy(dtype="datetime64[D]")
+    today = np.datetime64(today, "D")
+    valid = ~np.isnat(days)
+    if not valid.any():
+        return pd.arrays.IntegerArray(np.zeros(len(days), dtype=np.int64), ~valid)
+
+    if isinstance(regions.dtype, pd.CategoricalDtype):
+        codes, values = regions.cat.codes.to_numpy(), regions.cat.categories
+    else:
+        codes, values = pd.factorize(regions)
+    # one row per region, the last row (also used for missing regions) only skips weekends
+    weekends_only = np.busdaycalendar()
+    row_calendars = [calendars.get(region, weekends_only) for region in values] + [weekends_only]
+    codes = np.where(codes < 0, len(values), codes)
+
+    first = min(days[valid].min(), today)
+    span = np.arange(first, max(days[valid].max(), today) + 1)
+    table = np.stack([np.busday_count(span, today, busdaycal=calendar) for calendar in row_calendars])
+
+    offsets = np.where(valid, days - first, 0).astype(np.int64)
+    return pd.arrays.IntegerArray(table[codes, offsets], ~valid)
+
+
+# Open SEMS not actioned for at least `action_days` business days
+# Adds the Dates (day last modified) and Business Days Since Action columns
+def action_day_follow_up(df, action_days, today, calendars):
+    since_action = business_days_since(df["Modified Date Time"], df["Sales Region"], today, calendars)
+    keep = ((since_action >= action_days).fillna(False).to_numpy(dtype=bool)
+            & (df["SEM Status"] == "Open").to_numpy())
+    follow_up = df[keep].copy()
+    follow_up["Dates"] = follow_up["Modified Date Time"].dt.normalize()
+    follow_up["Business Days Since Action"] = since_action[keep]
+    return follow_up
+
+
+# Export formats of the follow up file: label, file extension, mime type
+EXPORT_FORMATS = {
+    "xlsx": ("Excel", "xlsx", "application/vnd.ms-excel"),
+    "csv": ("CSV", "csv", "text/csv"),
+    "parquet": ("Parquet", "parquet", "application/octet-stream"),
+}
+
+# Header style of the Excel export
+HEADER_FORMAT = {'bold': True, 'bottom': 2, 'bg_color': '#0AB2F7'}
+
+# Excel stores dates as days since 1899-12-30
+EXCEL_EPOCH = np.datetime64("1899-12-30", "ns")
+
+
+# Columns of the follow up file, a new df (the df passed in is not changed)
+# Date is a copy of Created On and Action Age is rounded to whole days
+def export_frame(df):
+    created = pd.to_datetime(df["Created On"])
+    return df.assign(**{
+        "Created On": created,
+        "Action Age [Days]": df["Action Age [Days]"].round(0),
+        "Date": created,
+    })
+
+
+# Width of every column in characters: the longest value or the header, whichever is longer
+# Numbers are measured from their min and max, dates have a fixed width and categoricals
+# from their categories, so only plain text columns are measured value by value
+def column_widths(df):
+    widths = []
+    for column in df.columns:
+        col = df[column]
+        if col.notna().sum() == 0:
+            longest = 0
+        elif isinstance(col.dtype, pd.CategoricalDtype):
+            used = col.cat.categories[np.unique(col.cat.codes[col.cat.codes >= 0])]
+            longest = used.astype(str).str.len().max()
+        elif pd.api.types.is_datetime64_any_dtype(col):
+            longest = 10 if is_date_only(col) else 19
+        elif pd.api.types.is_bool_dtype(col):
+            longest = 5
+        elif pd.api.types.is_numeric_dtype(col):
+            longest = max(len(str(col.min())), len(str(col.max())))
+        else:
+            lengths = col.str.len() if pd.api.types.infer_dtype(col, skipna=True) == "string" else None
+            if lengths is None:
+                lengths = col.dropna().astype(str).str.len()
+            longest = lengths.max()
+        widths.append(int(max(longest, len(str(column)))))
+    return widths
+
+
+# True if every value of a datetime column is midnight, those columns are written as dates
+def is_date_only(col):
+    values = col.dropna().to_numpy(dtype="datetime64[ns]")
+    return bool((values == values.astype("datetime64[D]")).all())
+
+
+# Column as an object array of plain values for xlsxwriter, missing values are None (left blank)
+# Datetimes become Excel serial numbers so the column's date format applies to them
+def excel_values(col):
+    if pd.api.types.is_datetime64_any_dtype(col):
+        values = col.to_numpy(dtype="datetime64[ns]")
+        serials = (values - EXCEL_EPOCH) / np.timedelta64(1, "D")
+        return pd.Series(serials).astype(object).where(col.notna().to_numpy(), None).to_numpy()
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        col = col.astype(object)
+    return col.astype(object).where(col.notna(), None).to_numpy()
+
+
+# Columns the follow up file can be split by, one sheet (or file) per value
+EXPORT_SPLITS = ["Carrier", "Assigned To Team"]
+
+# Name of the group holding rows with no value in the split column
+BLANK_GROUP = "(blank)"
+
+
+# Row positions of every group of df when split by `split_by`, in name order
+# Grouped once with aggregate.partition_index so each group is a gather of its positions
+# rather than a filter of the whole df. Without a split the whole df is one group named `name`
+def export_groups(df, split_by=None, name='Sheet1'):
+    if split_by is None:
+        return [(name, np.arange(len(df)))]
+    index = aggregate.partition_index(df, split_by)
+    groups = [(value, index[value]) for value in natsorted(index)]
+    blank = np.flatnonzero(df[split_by].isna().to_numpy())
+    if len(blank):
+        groups.append((BLANK_GROUP, blank))
+    return groups
+
+
+# Excel sheet name for a group: no []:*?/\ characters, at most 31 characters and unique
+# (Excel compares sheet names case insensitively)
+def safe_sheet_name(value, used):
+    name = re.sub(r"[\[\]:*?/\\]", "_", str(value)).strip("'")[:31] or BLANK_GROUP
+    candidate, n = name, 1
+    while candidate.lower() in used:
+        n += 1
+        suffix = f" ({n})"
+        candidate = name[:31 - len(suffix)] + suffix
+    used.add(candidate.lower())
+    return candidate
+
+
+# Write df to an xlsx workbook at `target` (a path or a binary file object)
+# xlsxwriter's constant_memory mode flushes each row to a temp file once the next row is started,
+# so the workbook is never held in memory as a whole. Rows have to be written in order, which is
+# why cells are written row by row rather than with DataFrame.to_excel (which writes by column)
+# With split_by every group gets its own sheet, the columns are converted and measured once for
+# the whole df and each sheet writes its rows straight from those arrays
+def write_xlsx(df, target, sheet_name='Sheet1', split_by=None):
+    workbook = xlsxwriter.Workbook(target, {'constant_memory': True})
+    header_format = workbook.add_format(HEADER_FORMAT)
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+    datetime_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+
+    cell_formats = []
+    for column in df.columns:
+        col = df[column]
+        cell_format = None
+        if pd.api.types.is_datetime64_any_dtype(col):
+            cell_format = date_format if is_date_only(col) else datetime_format
+        cell_formats.append(cell_format)
+    widths = column_widths(df)
+    header = [str(column) for column in df.columns]
+    columns = [excel_values(df[column]) for column in df.columns]
+
+    used = set()
+    for name, positions in export_groups(df, split_by, sheet_name):
+        worksheet = workbook.add_worksheet(safe_sheet_name(name, used))
+        for col_idx, (width, cell_format) in enumerate(zip(widths, cell_formats)):
+            worksheet.set_column(col_idx, col_idx, width, cell_format)
+        worksheet.write_row(0, 0, header, header_format)
+        if len(header):
+            worksheet.autofilter(0, 0, len(positions), len(header) - 1)
+        for row_idx, row in enumerate(zip(*[col[positions] for col in columns]), start=1):
+            worksheet.write_row(row_idx, 0, row)
+    workbook.close()
+
+
+# True if the export is a zip of per group files
+def is_zip_export(export_format, split_by=None, zip_groups=False):
+    return split_by is not None and (zip_groups or export_format != "xlsx")
+
+
+# Write df to `target` (a path or binary file object) in one of the EXPORT_FORMATS
+# split_by writes one sheet per group for Excel, zip_groups (or a split CSV / Parquet export)
+# writes a zip with one file per group instead
+def write_export(df, export_format, target, split_by=None, zip_groups=False):
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r}, expected one of {list(EXPORT_FORMATS)}")
+    if is_zip_export(export_format, split_by, zip_groups):
+        write_zip(df, export_format, target, split_by)
+    elif export_format == "xlsx":
+        write_xlsx(df, target, split_by=split_by)
+    elif export_format == "csv":
+        df.to_csv(target, index=False, date_format="%Y-%m-%d %H:%M:%S")
+    elif export_format == "parquet":
+        df.to_parquet(target, index=False)
+
+
+# Zip with one file per group of df split by `split_by`
+def write_zip(df, export_format, target, split_by):
+    extension = EXPORT_FORMATS[export_format][1]
+    used = set()
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, positions in export_groups(df, split_by):
+            buffer = io.BytesIO()
+            write_export(df.iloc[positions], export_format, buffer)
+            archive.writestr(f"{safe_sheet_name(name, used)}.{extension}", buffer.getvalue())
+
+
+# File name of the follow up file made on `today`
+def export_file_name(export_format, today, split_by=None, zip_groups=False):
+    extension = "zip" if is_zip_export(export_format, split_by, zip_groups) else EXPORT_FORMATS[export_format][1]
+    return "SEM-Follow-Up-" + today.strftime("%d/%m/%Y") + "." + extension
+
+
+# Mime type of the follow up file
+def export_mime(export_format, split_by=None, zip_groups=False):
+    if is_zip_export(export_format, split_by, zip_groups):
+        return "application/zip"
+    return EXPORT_FORMATS[export_format][2]
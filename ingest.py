@@ -0,0 +1,428 @@
+# Ingest helpers for the SEMS dashboard
+# Parsing the raw workbook through openpyxl takes tens of seconds on a large extract,
+# so the filtered dataframe is kept on local disk as a Parquet file keyed by a hash
+# of the uploaded bytes. Re-uploading the same workbook (or restarting the server)
+# then reads the Parquet file instead of going back through openpyxl.
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Directory used for the Parquet cache, can be moved with the SEMS_CACHE_DIR env variable
+CACHE_DIR = os.environ.get(
+    "SEMS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".sems_cache")
+)
+
+# Bump this whenever read_excel or data_filter change what they return
+# so stale cache files are not picked up
+CACHE_VERSION = "5"
+
+# Columns used by the dashboard sections and the filter
+DASHBOARD_COLUMNS = [
+    'SEM ID', 'FW', 'Created On', 'Modified Date Time', 'SEM Status', 'Priority', 'CAT',
+    'Sales Region', 'Carrier', 'Sold-To ID', 'Assigned To Team', 'Created by Team Name',
+    'SEM Issue Type', 'SEM Sub issue Type', 'Root Cause', 'Action Age [Days]',
+]
+
+# Columns parsed from an upload, set with the SEMS_READ_COLUMNS env variable
+#   export (default): every column but the drop_columns of the exclusion rules, the follow up
+#     file carries the rest of the export like it always has
+#   dashboard: only DASHBOARD_COLUMNS (and the columns the rules test), faster on wide exports
+#     but the follow up file then only has those columns
+READ_COLUMNS = os.environ.get("SEMS_READ_COLUMNS", "export").strip().lower()
+
+
+# Low cardinality columns stored as pandas categoricals
+# masks and groupbys on these then run on the integer codes instead of python strings
+CATEGORICAL_COLUMNS = [
+    'SEM Status', 'Priority', 'CAT', 'Sales Region', 'Carrier',
+    'Assigned To Team', 'SEM Issue Type', 'Sold-To ID',
+]
+
+# Date columns and the format they are exported in when they come through as text
+# (cells stored as real Excel dates are already datetime64 and are left alone)
+DATE_COLUMNS = {
+    'Created On': '%Y-%m-%d %H:%M:%S',
+    'Modified Date Time': '%Y-%m-%d %H:%M:%S',
+}
+
+# Rows read per chunk in streaming mode
+STREAM_CHUNK_ROWS = 50_000
+
+# Uploads larger than this are streamed by default (quarter end exports are > 1M rows)
+STREAMING_THRESHOLD_BYTES = 40 * 1024 * 1024
+
+
+# Hash of the uploaded workbook and the exclusion rules, used as the cache key
+def fingerprint(data, rules=None):
+    digest = hashlib.sha256()
+    digest.update(CACHE_VERSION.encode())
+    digest.update(READ_COLUMNS.encode())
+    if rules is not None:
+        digest.update(json.dumps(rules, sort_keys=True).encode())
+    digest.update(data)
+    return digest.hexdigest()
+
+
+# Pick the fastest xlsx reader available
+# python-calamine (Rust) is used when installed and pandas supports it (>= 2.2), otherwise openpyxl
+def excel_engine():
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return "openpyxl"
+    pandas_version = tuple(int(part) for part in pd.__version__.split(".")[:2])
+    if pandas_version < (2, 2):
+        return "openpyxl"
+    return "calamine"
+
+
+# Function telling whether a column of an upload is parsed (see READ_COLUMNS)
+def read_column_filter(rules=None, mode=READ_COLUMNS):
+    rules = rules or load_exclusion_rules()
+    if mode == "dashboard":
+        wanted = set(DASHBOARD_COLUMNS) | {rule["column"] for rule in rules["keep"] + rules["exclude"]}
+        return lambda col: col in wanted
+    if mode != "export":
+        raise ValueError(f"Unknown SEMS_READ_COLUMNS {mode!r}, expected 'export' or 'dashboard'")
+    dropped = set(rules["drop_columns"])
+    return lambda col: col not in dropped
+
+
+# Column filter for `columns`: a list of names, a function of the name or None for read_column_filter
+def _column_filter(columns, rules):
+    if columns is None:
+        return read_column_filter(rules)
+    if callable(columns):
+        return columns
+    return lambda col: col in columns
+
+
+# read in excel file to pandas df
+# only the columns picked by `columns` (see _column_filter) are parsed
+def read_excel(data, columns=None, engine=None, rules=None):
+    engine = engine or excel_engine()
+    # callable so a missing column is skipped rather than raising
+    usecols = _column_filter(columns, rules)
+    sems_df = pd.read_excel(io.BytesIO(data), sheet_name=0, engine=engine, usecols=usecols)
+    return sems_df
+
+
+# Stream the first sheet in read-only mode and filter it chunk by chunk
+# Rows rejected by data_filter are dropped as each chunk is read, so peak memory is
+# proportional to the rows kept rather than to the raw workbook.
+# Returns the filtered df, the number of rows read and the combined filter report
+# progress(rows_read, total_rows) is called after every chunk, total_rows may be None
+# when the workbook doesn't record its dimensions
+def read_excel_streaming(data, columns=None, chunk_rows=STREAM_CHUNK_ROWS, progress=None, rules=None):
+    rules = rules or load_exclusion_rules()
+    wanted = _column_filter(columns, rules)
+    workbook = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        worksheet = workbook.worksheets[0]
+        total_rows = worksheet.max_row - 1 if worksheet.max_row else None
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame(columns=DASHBOARD_COLUMNS), 0, None
+        keep = [i for i, col in enumerate(header) if wanted(col)]
+        names = [header[i] for i in keep]
+
+        chunks = []
+        rows_read = 0
+        chunk = []
+        report = None
+
+        def filter_chunk(chunk):
+            chunk_df, chunk_report = data_filter(pd.DataFrame.from_records(chunk, columns=names), rules)
+            chunks.append(chunk_df)
+            return merge_filter_reports(report, chunk_report)
+
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            chunk.append(tuple(row[i] if i < len(row) else None for i in keep))
+            if len(chunk) >= chunk_rows:
+                rows_read += len(chunk)
+                report = filter_chunk(chunk)
+                chunk = []
+                if progress is not None:
+                    progress(rows_read, total_rows)
+        if chunk or not chunks:
+            rows_read += len(chunk)
+            report = filter_chunk(chunk)
+        if progress is not None:
+            progress(rows_read, total_rows)
+    finally:
+        workbook.close()
+
+    # a chunk with an all empty column comes back as object, re-infer once everything is joined
+    sems_df = pd.concat(chunks, ignore_index=True).infer_objects()
+    return sems_df, rows_read, report
+
+
+# Exclusion rules used by data_filter, can be pointed elsewhere with the SEMS_EXCLUSION_RULES env variable
+EXCLUSION_RULES_PATH = os.environ.get(
+    "SEMS_EXCLUSION_RULES",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "config", "exclusion_rules.json"),
+)
+
+
+# Load the exclusion rules
+# drop_columns: columns removed from the df
+# keep: rows are kept only if `column` is one of `values`
+# exclude: rows are dropped if `column` contains `contains` (set "regex": true for a pattern)
+def load_exclusion_rules(path=EXCLUSION_RULES_PATH):
+    with open(path) as f:
+        rules = json.load(f)
+    for key in ("drop_columns", "keep", "exclude"):
+        rules.setdefault(key, [])
+    return rules
+
+
+# Evaluate the rules into a single boolean keep mask
+# Each column is factorized once and the rule is tested against its unique values only,
+# the per row result is then a lookup on the integer codes.
+# Returns the mask and the number of rows each rule removed (rows already removed by an
+# earlier rule are not counted again, so the counts add up to the total removed)
+def exclusion_mask(df, rules):
+    keep = np.ones(len(df), dtype=bool)
+    removed = {}
+    factorized = {}
+
+    def codes_for(col):
+        if col not in factorized:
+            factorized[col] = pd.factorize(df[col])
+        return factorized[col]
+
+    for rule in rules["keep"]:
+        codes, uniques = codes_for(rule["column"])
+        # code -1 (missing value) indexes the trailing False
+        hit = np.append(pd.Index(uniques).isin(rule["values"]), False)[codes]
+        removed[rule["name"]] = int((keep & ~hit).sum())
+        keep &= hit
+
+    for rule in rules["exclude"]:
+        codes, uniques = codes_for(rule["column"])
+        matches = pd.Series(uniques, dtype=object).astype(str).str.contains(
+            rule["contains"], regex=rule.get("regex", False), na=False).to_numpy()
+        hit = np.append(matches, False)[codes]
+        removed[rule["name"]] = int((keep & hit).sum())
+        keep &= ~hit
+
+    return keep, removed
+
+
+# Filter df to specifications required for dashboard
+# Drop all AOU,RMA,C2C sems
+# Only region needed for dashboard is Western Europe
+# (the rules live in config/exclusion_rules.json)
+# Returns the filtered df and a report of the rows removed per rule
+def data_filter(df, rules=None):
+    start = time.perf_counter()
+    rules = rules or load_exclusion_rules()
+    keep, removed = exclusion_mask(df, rules)
+    df = df.drop(rules["drop_columns"], axis=1, errors='ignore')
+    df = df[keep]
+    report = {"rows_in": len(keep), "rows_out": len(df), "removed": removed,
+              "seconds": time.perf_counter() - start}
+    return df, report
+
+
+# Add the counts of one filter report into another (streaming filters chunk by chunk)
+def merge_filter_reports(total, report):
+    if total is None:
+        return {**report, "removed": dict(report["removed"])}
+    for key in ("rows_in", "rows_out", "seconds"):
+        total[key] += report[key]
+    for name, count in report["removed"].items():
+        total["removed"][name] = total["removed"].get(name, 0) + count
+    return total
+
+
+# Parse the date columns to datetime64 and sort the df by creation date
+# The sort lets slice_dates find a date range with a binary search instead of scanning the column
+def prepare_dates(df, columns=DATE_COLUMNS):
+    df = df.copy()
+    for col, fmt in columns.items():
+        if col not in df.columns or pd.api.types.is_datetime64_any_dtype(df[col]):
+            continue
+        parsed = pd.to_datetime(df[col], format=fmt, errors="coerce")
+        # anything not in the expected format is parsed the slow way
+        unparsed = parsed.isna() & df[col].notna()
+        if unparsed.any():
+            parsed[unparsed] = pd.to_datetime(df.loc[unparsed, col], errors="coerce", dayfirst=True)
+        df[col] = parsed
+    if "Created On" in df.columns:
+        df = df.sort_values("Created On", kind="mergesort", ignore_index=True)
+    return df
+
+
+# Rows created between start and end (both inclusive, end covers the whole day)
+# df must be sorted by Created On (see prepare_dates), the result is a slice of df, not a copy
+def slice_dates(df, start, end):
+    created = df["Created On"].to_numpy()
+    start = np.datetime64(pd.Timestamp(start).normalize())
+    end = np.datetime64(pd.Timestamp(end).normalize() + pd.Timedelta(days=1))
+    lo = created.searchsorted(start, side="left")
+    hi = created.searchsorted(end, side="left")
+    return df.iloc[lo:hi]
+
+
+# Convert the low cardinality columns to categoricals
+# NOTE: groupby on a categorical includes unused categories unless observed=True is passed
+def to_categoricals(df, columns=CATEGORICAL_COLUMNS):
+    df = df.copy()
+    for col in columns:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def _cache_path(key, cache_dir):
+    return os.path.join(cache_dir, key + ".parquet")
+
+
+# Filter report written next to the cached frame, None if there isn't one
+def read_cached_filter_report(key, cache_dir=CACHE_DIR):
+    path = os.path.join(cache_dir, key + ".filter.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+# Read a previously filtered frame from the cache, None if it is not there (or unreadable)
+def read_cached(key, cache_dir=CACHE_DIR):
+    path = _cache_path(key, cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        return pd.read_parquet(path)
+    except Exception:
+        logger.warning("Could not read cached SEMS file %s, re-parsing workbook", path, exc_info=True)
+        return None
+
+
+# Write the filtered frame to the cache
+# Written to a temp file first and renamed so a half written file is never read
+def write_cached(key, df, cache_dir=CACHE_DIR, filter_report=None):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_path(key, cache_dir)
+    tmp_path = path + ".tmp"
+    try:
+        if filter_report is not None:
+            with open(os.path.join(cache_dir, key + ".filter.json"), "w") as f:
+                json.dump(filter_report, f)
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except Exception:
+        # e.g. a column with mixed types that Arrow can't store, the dashboard still works uncached
+        logger.warning("Could not cache SEMS file %s", path, exc_info=True)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# Parse and filter an uploaded workbook, going through the disk cache first
+# streaming=True reads the workbook in chunks with read_excel_streaming (for very large exports)
+# Returns the filtered df and a dict describing the ingest (engine, rows parsed, rows kept, seconds)
+def load_sems(data, cache_dir=CACHE_DIR, streaming=False, progress=None, rules=None):
+    start = time.perf_counter()
+    rules = rules or load_exclusion_rules()
+    key = fingerprint(data, rules)
+    sems_df = read_cached(key, cache_dir)
+    if sems_df is not None:
+        info = {"key": key, "engine": "cache", "rows_parsed": len(sems_df), "rows_kept": len(sems_df),
+                "seconds": time.perf_counter() - start,
+                "memory_bytes": int(sems_df.memory_usage(deep=True).sum()),
+                "filter": read_cached_filter_report(key, cache_dir)}
+        return sems_df, info
+
+    if streaming:
+        engine = "openpyxl (streaming)"
+        sems_df, rows_parsed, filter_report = read_excel_streaming(data, progress=progress, rules=rules)
+        parse_seconds = time.perf_counter() - start
+    else:
+        engine = excel_engine()
+        raw_df = read_excel(data, engine=engine, rules=rules)
+        parse_seconds = time.perf_counter() - start
+        rows_parsed = len(raw_df)
+        sems_df, filter_report = data_filter(raw_df, rules)
+        sems_df = sems_df.reset_index(drop=True)
+        del raw_df
+    sems_df = to_categoricals(prepare_dates(sems_df))
+    info = {"key": key, "engine": engine, "rows_parsed": rows_parsed, "rows_kept": len(sems_df),
+            "seconds": time.perf_counter() - start, "parse_seconds": parse_seconds,
+            "memory_bytes": int(sems_df.memory_usage(deep=True).sum()),
+            "filter": filter_report}
+    logger.info("Parsed %d SEMS rows (%d kept) with %s in %.2fs",
+                info["rows_parsed"], info["rows_kept"], engine, parse_seconds)
+    write_cached(key, sems_df, cache_dir, filter_report)
+    return sems_df, info
+
+
+# Fingerprint of a dataset made of several files, from the fingerprints of the files
+# (order independent, the same files give the same key whatever order they were uploaded in)
+def combined_fingerprint(keys):
+    if len(keys) == 1:
+        return keys[0]
+    return hashlib.sha256("\n".join(sorted(keys)).encode()).hexdigest()
+
+
+# Combine SEMS dfs into one with a single row per SEM ID
+# The row with the latest Modified Date Time wins (on a tie the later df in the list),
+# rows with no SEM ID are all kept. Returns the df (sorted by Created On, with categoricals)
+# and the number of duplicate rows dropped
+def merge_sems(frames):
+    # categoricals with different categories become object columns here, to_categoricals fixes that
+    combined = pd.concat(frames, ignore_index=True)
+    combined = combined.sort_values("Modified Date Time", kind="mergesort", na_position="first")
+    has_id = combined["SEM ID"].notna()
+    latest = ~combined["SEM ID"].duplicated(keep="last") | ~has_id
+    merged = combined[latest]
+    merged = to_categoricals(merged.sort_values("Created On", kind="mergesort", ignore_index=True))
+    return merged, int((~latest).sum())
+
+
+# Add newly loaded files to a merged dataset
+# loaded: (sems_df, info) pairs from load_sems for the files not merged yet
+# merged, merged_info: the result of a previous merge_loaded call, or None to start from scratch
+# Only the new files have been parsed, so rows_parsed and seconds of the info cover the new files
+# only, the filter report covers every file; keys lists the fingerprint of every file in the dataset
+def merge_loaded(loaded, merged=None, merged_info=None):
+    start = time.perf_counter()
+    frames = [sems_df for sems_df, _ in loaded]
+    keys = [info["key"] for _, info in loaded]
+    duplicates = 0
+    if merged is not None:
+        frames.insert(0, merged)
+        keys = merged_info["keys"] + keys
+        duplicates = merged_info["duplicates"]
+    if len(frames) == 1:
+        sems_df, dropped = frames[0], 0
+    else:
+        sems_df, dropped = merge_sems(frames)
+
+    filter_report = None
+    if merged_info is not None and merged_info["filter"] is not None:
+        filter_report = merge_filter_reports(None, merged_info["filter"])
+    for _, info in loaded:
+        if info["filter"] is not None:
+            filter_report = merge_filter_reports(filter_report, info["filter"])
+    engines = sorted({info["engine"] for _, info in loaded})
+    info = {"key": combined_fingerprint(keys), "keys": keys, "files": len(keys),
+            "engine": ", ".join(engines) if engines else "cache",
+            "rows_parsed": sum(info["rows_parsed"] for _, info in loaded),
+            "rows_kept": len(sems_df), "duplicates": duplicates + dropped,
+            "seconds": sum(info["seconds"] for _, info in loaded) + time.perf_counter() - start,
+            "memory_bytes": int(sems_df.memory_usage(deep=True).sum()),
+            "filter": filter_report}
+    return sems_df, info
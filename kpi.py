@@ -0,0 +1,88 @@
+# KPI engine for the SEMS dashboard
+# Every KPI on the Main KPIs page (overall, week on week and quarter on quarter) is computed
+# from the count cube in one pass and returned as a table, the st.metric widgets only
+# read values out of that table.
+import numpy as np
+import pandas as pd
+from natsort import natsort_keygen
+
+# Count KPIs, the percentage KPIs are derived from these
+COUNT_KPIS = ['SEMS', 'Open', 'P1', 'Open P1']
+
+# Percentage KPIs and the (part, whole) counts they are calculated from
+PERCENT_KPIS = {
+    '% Open': ('Open', 'SEMS'),
+    '% P1': ('P1', 'SEMS'),
+    '% Open P1': ('Open P1', 'Open'),
+}
+
+
+# Quarter of a fiscal week, e.g. FY23Q2W5 -> FY23Q2
+def fw_quarter(fw):
+    fw = str(fw)
+    return fw.split('W', 1)[0] if 'W' in fw else fw
+
+
+# Table of every KPI for the whole range ('All'), every quarter ('Quarter') and every week ('FW')
+# One row per Level/Period, periods are in natural order (FY23Q2W9 before FY23Q2W10)
+def kpi_table(cube):
+    is_open = (cube['SEM Status'] == 'Open').to_numpy()
+    is_p1 = (cube['Priority'] == 'P1').to_numpy()
+    count = cube['Count'].to_numpy()
+    weights = pd.DataFrame({
+        'SEMS': count,
+        'Open': count * is_open,
+        'P1': count * is_p1,
+        'Open P1': count * (is_open & is_p1),
+    })
+    fw = cube['FW'].astype(object)
+
+    levels = [weights.sum().to_frame().T.assign(Level='All', Period='All')]
+    for level, periods in (('Quarter', fw.map(fw_quarter, na_action='ignore')), ('FW', fw)):
+        # rows with no FW are in the totals but not in any period
+        by_period = weights[periods.notna().to_numpy()].groupby(periods.dropna().to_numpy()).sum()
+        by_period = by_period.sort_index(key=natsort_keygen())
+        levels.append(by_period.rename_axis('Period').reset_index().assign(Level=level))
+
+    table = pd.concat(levels, ignore_index=True)
+    table[COUNT_KPIS] = table[COUNT_KPIS].astype('int64')
+    for name, (part, whole) in PERCENT_KPIS.items():
+        with np.errstate(divide='ignore', invalid='ignore'):
+            table[name] = (100 * table[part] / table[whole].replace(0, np.nan)).round(2)
+    return table[['Level', 'Period'] + COUNT_KPIS + list(PERCENT_KPIS)]
+
+
+# KPI values for one Level/Period row of the table (the 'All' row by default)
+def kpi_row(table, level='All', period='All'):
+    rows = table[(table['Level'] == level) & (table['Period'] == period)]
+    return rows.iloc[0]
+
+
+# Compare the latest two periods of a level ('FW' or 'Quarter')
+# Returns a table indexed by KPI with Current, Previous and Change columns, or None if there
+# are fewer than two periods. Change is the % change for counts and the change in
+# percentage points for the percentage KPIs (NaN when the previous value is 0)
+def period_comparison(table, level):
+    rows = table[table['Level'] == level]
+    if len(rows) < 2:
+        return None
+    kpis = COUNT_KPIS + list(PERCENT_KPIS)
+    current = rows.iloc[-1][kpis].astype(float)
+    previous = rows.iloc[-2][kpis].astype(float)
+    change = current - previous
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change[COUNT_KPIS] = (100 * change[COUNT_KPIS] / previous[COUNT_KPIS].replace(0, np.nan)).round(2)
+    change[list(PERCENT_KPIS)] = change[list(PERCENT_KPIS)].round(2)
+    comparison = pd.DataFrame({'Current': current, 'Previous': previous, 'Change': change})
+    comparison.attrs['current_period'] = rows['Period'].iloc[-1]
+    comparison.attrs['previous_period'] = rows['Period'].iloc[-2]
+    return comparison
+
+
+# Format a KPI value for display, counts as ints and percentages with a % sign
+def format_kpi(value, percent=False):
+    if pd.isna(value):
+        return None
+    if percent:
+        return f"{round(float(value), 2)}%"
+    return int(value)
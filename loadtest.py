@@ -0,0 +1,260 @@
+# Load test of the dashboard with concurrent sessions
+# Runs N sessions of app.py at once with Streamlit's AppTest, in this process, so they share the
+# memo / singleton caches like the sessions of one server do. Every session logs in, "uploads"
+# a synthetic workbook (see synthetic.py), submits a few sets of dashboard parameters and then
+# toggles sections on and off. The time of every rerun and the process RSS are recorded, and
+# the rerun latency percentiles are reported per concurrency level.
+#
+#   python loadtest.py --sessions 1 2 4 8 --rows 20000 --out bench/loadtest.json
+#
+# Runs only on the streamlit version pinned in requirements.txt, the one the dashboard is deployed
+# with: the sessions share AppTest's mock Runtime (see share_app_test_runtime), which depends on
+# streamlit.testing internals of that version
+import argparse
+import io
+import json
+import os
+import resource
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import benchmark
+import diagnostics
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+REQUIREMENTS_PATH = os.path.join(os.path.dirname(APP_PATH), "requirements.txt")
+
+# Script every session runs: app.py with the file uploader returning the workbook
+# AppTest.from_string writes the script to a file named by its hash, the session number keeps
+# sessions from writing the same file at once
+DRIVER = '''# session {session}
+import io
+import os
+import sys
+import streamlit as st
+
+
+class Upload(io.BytesIO):
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            super().__init__(f.read())
+        self.name = os.path.basename(path)
+        self.size = len(self.getvalue())
+
+
+def file_uploader(label, *args, **kwargs):
+    upload = Upload({workbook!r})
+    return [upload] if kwargs.get("accept_multiple_files") else upload
+
+
+st.sidebar.file_uploader = file_uploader
+st.file_uploader = file_uploader
+sys.path.insert(0, {folder!r})
+with open({app!r}) as f:
+    exec(compile(f.read(), {app!r}, "exec"), {{"__name__": "__main__"}})
+'''
+
+ALL_SECTIONS = ["Main KPI's", 'Open SEMS', 'Carrier', 'Customer', 'Region', "Category", "Additional Analysis",
+                "Action Day Follow Up"]
+
+
+# Parameter sets a session submits: (days of data up to the last day in the workbook, sections, action days)
+# Sessions start at different sets so they aren't all asking for the same view at once
+PARAMETER_SETS = [
+    (30, ["Main KPI's"], 10),
+    (90, ["Main KPI's", "Open SEMS", "Region"], 10),
+    (365, ["Carrier", "Customer"], 5),
+    (90, ALL_SECTIONS, 15),
+]
+
+# Sections switched on and off one at a time after the parameter sets
+TOGGLED_SECTIONS = ["Category", "Carrier", "Customer", "Action Day Follow Up"]
+
+
+# Resident set size of this process in bytes (the peak if the current size can't be read)
+def rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+# Streamlit version pinned in requirements.txt (streamlit==x.y.z), None if it isn't pinned
+def pinned_streamlit(path=REQUIREMENTS_PATH):
+    with open(path) as f:
+        for line in f:
+            name, _, version = line.split("#")[0].strip().partition("==")
+            if name.strip().lower() == "streamlit" and version:
+                return version.strip()
+    return None
+
+
+# Widget of an AppTest element list by label (startswith)
+def _widget(elements, label):
+    for element in elements:
+        if element.label.startswith(label):
+            return element
+    raise LookupError(f"No widget labelled {label!r}")
+
+
+# AppTest runs one app at a time: every run installs its own mock Runtime, secrets and appTest
+# config and takes them down again when it is done, under the sessions still running. Here all
+# sessions share one mock Runtime (and so one set of cache_data / cache_resource caches, like one
+# server), the secrets and the config are set once before the first session starts, the way AppTest
+# sets them for a run
+def share_app_test_runtime(password):
+    from unittest.mock import MagicMock
+
+    import streamlit as st
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.secrets import Secrets
+    from streamlit.testing.v1 import app_test
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = app_test.MediaFileManager(app_test.MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = app_test.MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    # the mock every AppTest run sets up (and clears) lands on this subclass, not on Runtime
+    app_test.Runtime = type("SessionRuntime", (Runtime,), {})
+    st.secrets = Secrets()
+    st.secrets._secrets = {"password": password}
+    config.set_option("global.appTest", True)
+
+
+# One session: log in, submit every parameter set, toggle sections
+# Appends a {"session", "step", "seconds", "errors"} dict per rerun to `reruns`
+def run_session(session, workbook, last_day, password, reruns, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    driver = DRIVER.format(session=session, workbook=os.path.abspath(workbook), folder=os.path.dirname(APP_PATH),
+                           app=APP_PATH)
+    at = AppTest.from_string(driver, default_timeout=timeout)
+
+    def rerun(step, action):
+        start = time.perf_counter()
+        try:
+            action().run()
+            errors = [str(exception.value) for exception in at.exception]
+            # every page of the app has either the password or the parameters form
+            if not errors and not at.text_input and not at.date_input:
+                errors = ["Empty page, the run rendered neither the login nor the parameters form"]
+        except Exception as error:
+            errors = [f"{type(error).__name__}: {error}"]
+        reruns.append({"session": session, "step": step, "seconds": time.perf_counter() - start, "errors": errors})
+
+    rerun("open", lambda: at)
+    rerun("log in", lambda: at.text_input(key="password").input(password))
+
+    def submit(days, sections, action_days):
+        _widget(at.date_input, "Start Date").set_value(last_day - timedelta(days=days - 1))
+        _widget(at.date_input, "End Date").set_value(last_day)
+        _widget(at.multiselect, "Pick which Dashboards").set_value(sections)
+        _widget(at.slider, "Select minimum number of Action Days").set_value(action_days)
+        return _widget(at.button, "Update Dashboard Parameters").click()
+
+    order = PARAMETER_SETS[session % len(PARAMETER_SETS):] + PARAMETER_SETS[:session % len(PARAMETER_SETS)]
+    for days, sections, action_days in order:
+        rerun(f"submit {days}d {len(sections)} sections", lambda: submit(days, sections, action_days))
+
+    days, sections, action_days = order[-1]
+    for section in TOGGLED_SECTIONS:
+        toggled = [s for s in sections if s != section] if section in sections else sections + [section]
+        rerun(f"toggle {section}", lambda: submit(days, toggled, action_days))
+
+
+# Run `sessions` sessions at once, RSS is sampled every `sample_seconds` while they run
+# Returns a summary of the level plus every rerun
+def run_level(sessions, workbook, last_day, password, timeout=600, sample_seconds=0.2):
+    reruns = []
+    rss = [rss_bytes()]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(sample_seconds):
+            rss.append(rss_bytes())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=run_session, args=(i, workbook, last_day, password, reruns, timeout))
+               for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    sampler.join()
+    rss.append(rss_bytes())
+
+    seconds = np.array([rerun["seconds"] for rerun in reruns])
+    return {
+        "sessions": sessions,
+        "reruns": len(reruns),
+        "errors": sum(len(rerun["errors"]) for rerun in reruns),
+        "wall_seconds": time.perf_counter() - started,
+        "p50": float(np.percentile(seconds, 50)),
+        "p95": float(np.percentile(seconds, 95)),
+        "p99": float(np.percentile(seconds, 99)),
+        "max": float(seconds.max()),
+        "rss_start_bytes": rss[0],
+        "rss_peak_bytes": max(rss),
+        "rss_end_bytes": rss[-1],
+        "rerun_log": reruns,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent session load test of the SEMS dashboard")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="concurrency levels, sessions running at once (default: 1 2 4 8)")
+    parser.add_argument("--rows", type=int, default=20_000, help="rows of the synthetic workbook (default: 20000)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic workbook (default: 0)")
+    parser.add_argument("--workbook", help="use this workbook instead of a synthetic one")
+    parser.add_argument("--workbooks", default="bench", help="folder synthetic workbooks are kept in")
+    parser.add_argument("--password", default="loadtest", help="password the sessions log in with")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds a single rerun may take")
+    parser.add_argument("--out", help="json file to write (default: bench/loadtest-<time>.json)")
+    args = parser.parse_args(argv)
+
+    import streamlit
+    if streamlit.__version__ != pinned_streamlit():
+        parser.error(f"streamlit {streamlit.__version__} is installed, the load test runs on the version pinned "
+                     f"in requirements.txt ({pinned_streamlit()}), pip install -r requirements.txt")
+
+    workbook = args.workbook or benchmark.workbook(args.rows, args.seed, args.workbooks)
+    with open(workbook, "rb") as f:
+        created = pd.read_excel(io.BytesIO(f.read()), usecols=["Created On"])["Created On"]
+    last_day = pd.to_datetime(created).max().date()
+
+    share_app_test_runtime(args.password)
+    started = datetime.now()
+    levels = []
+    print(f"{'sessions':>8} {'reruns':>7} {'errors':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'peak RSS':>10}")
+    for sessions in args.sessions:
+        level = run_level(sessions, workbook, last_day, args.password, args.timeout)
+        levels.append(level)
+        print(f"{sessions:>8} {level['reruns']:>7} {level['errors']:>7} {level['p50']:>7.2f}s {level['p95']:>7.2f}s "
+              f"{level['p99']:>7.2f}s {level['max']:>7.2f}s {level['rss_peak_bytes'] / 1e6:>8.0f}MB", flush=True)
+
+    out = args.out or os.path.join(args.workbooks, f"loadtest-{started:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({"started": started.isoformat(timespec="seconds"), "workbook": os.path.abspath(workbook),
+                   "environment": diagnostics.environment(), "levels": levels}, f, indent=2)
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
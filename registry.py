@@ -0,0 +1,179 @@
+# Process wide registry of prepared SEMS datasets
+# st.experimental_memo hands every session its own copy of what it returns, so every analyst
+# uploading the same weekly export held their own parsed frame and aggregates, and nothing capped
+# how much the process kept. The registry keeps one prepared frame per dataset key (the content
+# hash of the workbooks, see ingest.fingerprint) and the aggregates derived from it, shared by
+# every session. Sessions must treat what they get as read only.
+# Datasets not used for ttl_seconds are dropped, and the least recently used ones are dropped
+# while the registry holds more than max_bytes. Like the figure cache (see charts.py) the
+# registry is a dict:
+#   datasets: key -> {"value", "bytes", "derived", "loaded", "used", "hits"}, least recently used first
+#     bytes: size of the dataset and its aggregates
+#     derived: aggregate name -> {"value", "bytes"}, least recently used first
+#   loading: key -> lock held while the dataset is loaded, sessions asking for it meanwhile wait
+#   max_bytes, ttl_seconds, bytes, hits, misses, evictions, expired
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import charts
+
+# Most bytes of datasets and aggregates kept before the least recently used dataset is dropped
+MAX_BYTES = int(os.environ.get("SEMS_REGISTRY_MAX_BYTES", 1_000_000_000))
+
+# Seconds a dataset nobody uses is kept
+TTL_SECONDS = float(os.environ.get("SEMS_REGISTRY_TTL_SECONDS", 4 * 3600))
+
+
+def new_registry(max_bytes=MAX_BYTES, ttl_seconds=TTL_SECONDS):
+    return {
+        "datasets": OrderedDict(),
+        "loading": {},
+        "max_bytes": max_bytes,
+        "ttl_seconds": ttl_seconds,
+        "bytes": 0,
+        "hits": 0,
+        "misses": 0,
+        "evictions": 0,
+        "expired": 0,
+        "lock": threading.Lock(),
+    }
+
+
+# Approximate memory held by a dataset or aggregate: frames, arrays and dicts / tuples / lists of them
+def nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(nbytes(k) + nbytes(v) for k, v in value.items())
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+# Dataset for key, load() is called to make it on a miss
+# Only one session loads a key at a time, the others wait for it and share the result
+def get_dataset(registry, key, load):
+    with registry["lock"]:
+        entry = _use(registry, key)
+        if entry is not None:
+            return entry["value"]
+        loading = registry["loading"].setdefault(key, threading.Lock())
+    with loading:
+        with registry["lock"]:
+            entry = _use(registry, key)
+            if entry is not None:
+                return entry["value"]
+            registry["misses"] += 1
+        try:
+            value = load()
+            size = nbytes(value)
+            with registry["lock"]:
+                now = time.time()
+                registry["datasets"][key] = {"value": value, "bytes": size, "derived": OrderedDict(),
+                                             "loaded": now, "used": now, "hits": 0}
+                registry["bytes"] += size
+                _evict(registry, keep=key)
+        finally:
+            with registry["lock"]:
+                registry["loading"].pop(key, None)
+    return value
+
+
+# Dataset for key if the registry holds it, else None (doesn't count as a hit or miss)
+def peek(registry, key):
+    with registry["lock"]:
+        entry = registry["datasets"].get(key)
+        return entry["value"] if entry is not None else None
+
+
+# Aggregate `name` (e.g. ("count cube", start, end)) of the dataset key, build() is called
+# (outside the lock) to make it the first time. Aggregates count towards the dataset's bytes and
+# are dropped with it; if the dataset has been dropped already the aggregate is built but not kept
+def get_derived(registry, key, name, build):
+    with registry["lock"]:
+        entry = registry["datasets"].get(key)
+        if entry is not None and name in entry["derived"]:
+            entry["derived"].move_to_end(name)
+            return entry["derived"][name]["value"]
+    value = build()
+    with registry["lock"]:
+        entry = registry["datasets"].get(key)
+        if entry is None:
+            return value
+        if name in entry["derived"]:
+            # another session built it meanwhile, share theirs
+            return entry["derived"][name]["value"]
+        size = nbytes(value)
+        entry["derived"][name] = {"value": value, "bytes": size}
+        entry["bytes"] += size
+        registry["bytes"] += size
+        _evict(registry, keep=key)
+    return value
+
+
+# Entry of key marked as used, None if the registry doesn't hold it (call with the lock held)
+def _use(registry, key):
+    _evict(registry)
+    entry = registry["datasets"].get(key)
+    if entry is not None:
+        registry["datasets"].move_to_end(key)
+        entry["used"] = time.time()
+        entry["hits"] += 1
+        registry["hits"] += 1
+    return entry
+
+
+# Drop expired datasets, then the least recently used ones while over the byte budget
+# The dataset `keep` (just loaded or given an aggregate) is never dropped for the budget, its least
+# recently used aggregates are dropped instead, but not the newest one (call with the lock held)
+def _evict(registry, keep=None):
+    now = time.time()
+    for key, entry in list(registry["datasets"].items()):
+        if key != keep and now - entry["used"] > registry["ttl_seconds"]:
+            registry["bytes"] -= registry["datasets"].pop(key)["bytes"]
+            registry["expired"] += 1
+    for key in list(registry["datasets"]):
+        if registry["bytes"] <= registry["max_bytes"]:
+            break
+        if key != keep:
+            registry["bytes"] -= registry["datasets"].pop(key)["bytes"]
+            registry["evictions"] += 1
+    entry = registry["datasets"].get(keep)
+    while entry is not None and registry["bytes"] > registry["max_bytes"] and len(entry["derived"]) > 1:
+        _, derived = entry["derived"].popitem(last=False)
+        entry["bytes"] -= derived["bytes"]
+        registry["bytes"] -= derived["bytes"]
+        registry["evictions"] += 1
+
+
+# One line summary of the registry for the sidebar
+def registry_summary(registry):
+    with registry["lock"]:
+        lookups = registry["hits"] + registry["misses"]
+        hit_rate = 100 * registry["hits"] / lookups if lookups else 0
+        return (f"Dataset registry: {len(registry['datasets'])} dataset(s), "
+                f"{charts.format_bytes(registry['bytes'])} of {charts.format_bytes(registry['max_bytes'])}, "
+                f"{registry['hits']} hits, {registry['misses']} misses ({hit_rate:.0f}% hit rate), "
+                f"{registry['evictions']} evicted, {registry['expired']} expired")
+
+
+# Datasets in the registry as a table, most recently used first
+def registry_table(registry):
+    now = time.time()
+    with registry["lock"]:
+        rows = [{"Dataset": key[:12], "Size (MB)": entry["bytes"] / 1e6, "Aggregates": len(entry["derived"]),
+                 "Hits": entry["hits"], "Idle (min)": (now - entry["used"]) / 60,
+                 "Expires In (min)": max(registry["ttl_seconds"] - (now - entry["used"]), 0) / 60}
+                for key, entry in reversed(registry["datasets"].items())]
+    return pd.DataFrame(rows, columns=["Dataset", "Size (MB)", "Aggregates", "Hits", "Idle (min)",
+                                       "Expires In (min)"])
@@ -0,0 +1,78 @@
+# Report pipeline of the SEMS dashboard, without any Streamlit
+# The steps the dashboard runs between the upload and the Main KPIs / follow up file, as plain
+# functions so they can be run from the command line (see batch.py) as well as from app.py:
+#   ingest.load_sems -> dashboard_frame -> kpi_snapshot / write_follow_up
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+import aggregate
+import followup
+import ingest
+import kpi
+
+
+# Add the Quarter column (FY23Q2W5 -> FY23Q2) to the df, a new df is returned
+def add_quarters(df):
+    return df.assign(Quarter=np.where(df['FW'].str.contains('W'),
+                                      df['FW'].str.split('W').str[0],
+                                      df['FW']))
+
+
+# Rows of the loaded SEMS df created between start and end (inclusive) with the Quarter column,
+# the df every dashboard section is drawn from. No start / end covers the whole df
+def dashboard_frame(sems_df, start=None, end=None):
+    created = sems_df["Created On"].dropna()
+    if start is None:
+        start = created.min() if len(created) else pd.Timestamp.today()
+    if end is None:
+        end = created.max() if len(created) else pd.Timestamp.today()
+    return add_quarters(ingest.slice_dates(sems_df, start, end))
+
+
+# Every Main KPI of the df (overall, per quarter and per week), see kpi.kpi_table
+def kpi_snapshot(df):
+    return kpi.kpi_table(aggregate.count_cube(df))
+
+
+# df with plain values json can hold, missing values as None
+def _json_records(df):
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+# KPI snapshot as a json document: the KPI table plus the week on week and quarter on quarter
+# comparisons the Main KPIs page shows. extra is added to the top level (source file, dates...)
+def kpi_json(table, **extra):
+    comparisons = {}
+    for name, level in (("week_on_week", "FW"), ("quarter_on_quarter", "Quarter")):
+        comparison = kpi.period_comparison(table, level)
+        if comparison is None:
+            comparisons[name] = None
+            continue
+        comparisons[name] = {
+            "current_period": comparison.attrs["current_period"],
+            "previous_period": comparison.attrs["previous_period"],
+            "kpis": _json_records(comparison.rename_axis("KPI").reset_index()),
+        }
+    document = {**extra, "kpis": _json_records(table), **comparisons}
+    return json.dumps(document, indent=2, default=str)
+
+
+# Write the action day follow up file of df to `target` (a path or binary file object)
+# Open SEMS not actioned for `action_days`+ business days, see followup.py for the formats
+# coverage: years the calendars cover (followup.load_holiday_coverage() by default), a warning is
+# logged for every region whose business days run outside them
+# Returns the number of SEMS in the file
+def write_follow_up(df, action_days, today, calendars, export_format, target, split_by=None, zip_groups=False,
+                    coverage=None):
+    start = time.perf_counter()
+    coverage = followup.load_holiday_coverage() if coverage is None else coverage
+    for message in followup.calendar_coverage_warnings(df, today, coverage):
+        ingest.logger.warning(message)
+    follow_up_df = followup.action_day_follow_up(df, action_days, today, calendars)
+    followup.write_export(followup.export_frame(follow_up_df), export_format, target,
+                          split_by=split_by, zip_groups=zip_groups)
+    ingest.logger.info("Wrote follow up file of %d SEMS in %.2fs", len(follow_up_df), time.perf_counter() - start)
+    return len(follow_up_df)
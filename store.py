@@ -0,0 +1,205 @@
+# Local SEMS history store
+# Uploads are upserted into a SQLite file (one row per SEM ID, the latest Modified Date Time wins)
+# so the history builds up across uploads and sessions, and the dashboard can be opened on
+# several quarters of data without uploading anything. The dashboard reads only the date range it
+# shows (see load_history), the Created On index answers it.
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+import ingest
+
+# Location of the store, can be moved with the SEMS_STORE_PATH env variable
+STORE_PATH = os.environ.get(
+    "SEMS_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".sems_store", "sems.sqlite")
+)
+
+# Columns the store starts with, the other columns of an upload (every export column but the rules'
+# drop_columns, see ingest.READ_COLUMNS) are added to it as they come, the follow up file built on
+# the store then has the same columns as the one built on the upload
+STORE_COLUMNS = ingest.DASHBOARD_COLUMNS
+
+# Columns with an index (SEM ID has a unique index, used for the upsert)
+INDEXED_COLUMNS = ['Created On', 'FW', 'Carrier', 'Sold-To ID']
+
+# Dates are stored as text in this format, so they sort and compare as text
+STORE_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _index_name(column):
+    return "idx_sems_" + "".join(c if c.isalnum() else "_" for c in column.lower())
+
+
+# Open the store, creating the file and tables if they don't exist yet
+# sems: the SEMS history, files: every file upserted (fingerprint, filter report, its columns in order
+# and which of them are dates),
+# meta: a generation number bumped on every upsert, used in the dataset key
+# Changes are committed when the block exits without an error and the connection is closed
+@contextmanager
+def connect(path=STORE_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            _create_tables(conn)
+            yield conn
+    finally:
+        conn.close()
+
+
+def _create_tables(conn):
+    columns = ", ".join(_quote(column) for column in STORE_COLUMNS)
+    conn.executescript(f"""
+        CREATE TABLE IF NOT EXISTS sems ({columns});
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_sems_sem_id ON sems ("SEM ID");
+        CREATE TABLE IF NOT EXISTS files (key TEXT PRIMARY KEY, loaded_at TEXT, rows INTEGER, filter TEXT);
+        CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER);
+        INSERT OR IGNORE INTO meta VALUES ('generation', 0);
+    """)
+    # stores made before the files' columns were kept
+    _add_columns(conn, "files", ["columns"])
+    for column in INDEXED_COLUMNS:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {_index_name(column)} ON sems ({_quote(column)})")
+
+
+# Columns of a table, in order
+def _table_columns(conn, table="sems"):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+# Add the columns a table doesn't have yet (they are NULL in the rows already there)
+def _add_columns(conn, table, columns):
+    existing = set(_table_columns(conn, table))
+    for column in columns:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {_quote(column)}")
+            existing.add(column)
+
+
+# Fingerprints of the files already in the store
+def stored_keys(path=STORE_PATH):
+    with connect(path) as conn:
+        return {key for key, in conn.execute("SELECT key FROM files")}
+
+
+# Number of SEMS in the store
+def row_count(path=STORE_PATH):
+    with connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM sems").fetchone()[0]
+
+
+# Key of the store's current contents (of the SEMS created between start and end if given),
+# changes with every upsert
+def store_key(path=STORE_PATH, start=None, end=None):
+    with connect(path) as conn:
+        generation = conn.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+    return hashlib.sha256(f"{os.path.abspath(path)}:{generation}:{start}:{end}".encode()).hexdigest()
+
+
+# Values of column in more than `minimum` SEMS of the store, most frequent first (like
+# value_counts), counted by sqlite on the column's index without reading the history
+def top_values(column, minimum, path=STORE_PATH):
+    with connect(path) as conn:
+        return [value for value, in conn.execute(
+            f"SELECT {_quote(column)} FROM sems WHERE {_quote(column)} IS NOT NULL GROUP BY {_quote(column)} "
+            f"HAVING COUNT(*) > ? ORDER BY COUNT(*) DESC", (minimum,))]
+
+
+# df with the given columns and plain values sqlite can hold
+def _to_rows(df, columns):
+    out = pd.DataFrame(index=df.index)
+    for column in columns:
+        if column not in df.columns:
+            out[column] = None
+            continue
+        col = df[column]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            col = col.dt.strftime(STORE_DATE_FORMAT)
+        elif isinstance(col.dtype, pd.CategoricalDtype):
+            col = col.astype(object)
+        out[column] = col.astype(object).where(col.notna(), None)
+    return out
+
+
+# Upsert the SEMS of the files loaded by ingest.load_sems into the store
+# loaded: (sems_df, info) pairs, files whose fingerprint is already stored are skipped
+# A SEM ID already in the store is only replaced by a row with the same or a later
+# Modified Date Time, rows without a SEM ID are always added
+# Returns the number of rows upserted
+def upsert(loaded, path=STORE_PATH):
+    start = time.perf_counter()
+    modified = _quote('Modified Date Time')
+    rows = 0
+    with connect(path) as conn:
+        stored = {key for key, in conn.execute("SELECT key FROM files")}
+        for sems_df, info in loaded:
+            if info["key"] in stored:
+                continue
+            # loaded in order of Modified Date Time, so the latest of any duplicates is upserted last
+            sems_df = sems_df.sort_values('Modified Date Time', kind='mergesort', na_position='first')
+            _add_columns(conn, "sems", sems_df.columns)
+            # a replaced row takes every column from the new one, columns this file doesn't have become NULL
+            table_columns = _table_columns(conn)
+            columns = ", ".join(_quote(column) for column in table_columns)
+            updates = ", ".join(f"{_quote(column)} = excluded.{_quote(column)}" for column in table_columns)
+            conn.executemany(
+                f"INSERT INTO sems ({columns}) VALUES ({', '.join('?' * len(table_columns))}) "
+                f"ON CONFLICT (\"SEM ID\") DO UPDATE SET {updates} "
+                f"WHERE excluded.{modified} >= sems.{modified} OR sems.{modified} IS NULL",
+                _to_rows(sems_df, table_columns).itertuples(index=False, name=None),
+            )
+            conn.execute("INSERT INTO files (key, loaded_at, rows, filter, columns) VALUES (?, ?, ?, ?, ?)",
+                         (info["key"], time.strftime(STORE_DATE_FORMAT), len(sems_df), json.dumps(info["filter"]),
+                          json.dumps({"names": [str(column) for column in sems_df.columns],
+                                      "dates": [str(column) for column in sems_df.columns
+                                                if pd.api.types.is_datetime64_any_dtype(sems_df[column])]})))
+            stored.add(info["key"])
+            rows += len(sems_df)
+        if rows:
+            conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'generation'")
+    ingest.logger.info("Upserted %d SEMS rows into %s in %.2fs", rows, path, time.perf_counter() - start)
+    return rows
+
+
+# Read the SEMS history, optionally only rows created between start and end (inclusive, whole days)
+# The date range is answered by the Created On index. Returns the df, in the same shape as
+# ingest.load_sems (sorted by Created On, with categoricals, the columns in the order of the
+# latest upload), and an info dict like merge_loaded's
+def load_history(path=STORE_PATH, start=None, end=None):
+    began = time.perf_counter()
+    query = "SELECT * FROM sems"
+    params = []
+    if start is not None and end is not None:
+        query += ' WHERE "Created On" >= ? AND "Created On" < ?'
+        params = [pd.Timestamp(start).strftime(STORE_DATE_FORMAT),
+                  (pd.Timestamp(end).normalize() + pd.Timedelta(days=1)).strftime(STORE_DATE_FORMAT)]
+    query += ' ORDER BY "Created On"'
+    with connect(path) as conn:
+        sems_df = pd.read_sql_query(query, conn, params=params)
+        files = conn.execute("SELECT key, filter, columns FROM files ORDER BY loaded_at, rowid").fetchall()
+    columns = next((json.loads(columns) for _, _, columns in reversed(files) if columns), {"names": [], "dates": []})
+    order = [column for column in columns["names"] if column in sems_df.columns]
+    sems_df = sems_df[order + [column for column in sems_df.columns if column not in order]]
+    dates = dict.fromkeys((column for column in columns["dates"] if column in sems_df.columns), STORE_DATE_FORMAT)
+    sems_df = ingest.to_categoricals(ingest.prepare_dates(sems_df, {**dates, **ingest.DATE_COLUMNS}))
+
+    filter_report = None
+    for _, report, _ in files:
+        report = json.loads(report) if report else None
+        if report is not None:
+            filter_report = ingest.merge_filter_reports(filter_report, report)
+    info = {"key": store_key(path, start, end), "keys": [key for key, _, _ in files], "files": len(files),
+            "engine": "history store", "rows_parsed": 0, "rows_kept": len(sems_df), "duplicates": 0,
+            "seconds": time.perf_counter() - began,
+            "memory_bytes": int(sems_df.memory_usage(deep=True).sum()),
+            "filter": filter_report}
+    return sems_df, info
@@ -0,0 +1,160 @@
+# Synthetic SEMS exports
+# Production extracts can't be shared, so performance problems are reproduced on generated
+# workbooks instead. The columns match the SEMS export (including the columns the dashboard
+# drops) and the values are skewed like the real data: a few carriers and customers have most
+# of the SEMS, most SEMS are in Western Europe and some are from teams the data filter removes.
+#
+#   python synthetic.py 100000 sems-100k.xlsx --seed 1
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import followup
+import ingest
+
+# Sales Regions, the first four are the ones the dashboard keeps
+REGIONS = ['DACH', 'UK&I', 'South Europe', 'North Europe', 'Americas', 'APJ', 'Middle East & Africa']
+REGION_WEIGHTS = [0.3, 0.22, 0.2, 0.13, 0.08, 0.05, 0.02]
+
+CARRIERS = ['DHL', 'UPS', 'TNT', 'DPD', 'GLS', 'FedEx (EU)', 'PostNord', 'Bring', 'SEUR', 'BRT', 'Hermes',
+            'Geodis', 'Kuehne + Nagel', 'DB Schenker', 'Royal Mail', 'An Post', 'Poste Italiane', 'Chronopost',
+            'Colissimo', 'Correos', 'CTT', 'Austrian Post', 'Swiss Post', 'bpost', 'PostNL', 'Posten Norge',
+            'Itella', 'InPost', 'Dachser', 'RMA Logistics']
+TEAMS = ['Order Management', 'Logistics EMEA', 'Carrier Management', 'Customer Care', 'Returns Desk',
+         'Trade Compliance', 'C2C Desk', 'Escalations']
+CREATED_BY_TEAMS = ['Customer Care', 'Sales Ops', 'Logistics EMEA', 'RMA Team', 'CSS CRU', 'C2C Desk', 'Partner Portal']
+CREATED_BY_WEIGHTS = [0.4, 0.2, 0.15, 0.1, 0.06, 0.05, 0.04]
+
+# Issue types and their sub issues
+ISSUES = {
+    'Delivery Delay': ['Missed delivery date', 'Stuck in customs', 'Stuck in hub', 'Failed delivery attempt',
+                       'Wrong address', 'Consignee not available'],
+    'Damage': ['Damaged packaging', 'Damaged product', 'Wet goods', 'Crushed pallet'],
+    'Loss': ['Lost in transit', 'Partial delivery', 'Missing pallet'],
+    'Documentation': ['Missing POD', 'Wrong invoice', 'Missing customs documents'],
+    'Pickup': ['Failed pickup', 'Late pickup', 'Pickup not booked'],
+}
+ISSUE_WEIGHTS = [0.45, 0.2, 0.15, 0.12, 0.08]
+ROOT_CAUSES = ['Carrier', 'Customs', 'Customer', 'Warehouse', 'Order Entry', 'Weather', 'Unknown']
+ROOT_CAUSE_WEIGHTS = [0.4, 0.15, 0.15, 0.1, 0.08, 0.02, 0.1]
+
+# Number of distinct customers per 1000 SEMS (at least 50)
+CUSTOMERS_PER_1000 = 20
+
+
+# Weights of a Zipf like distribution over n values, the first value is the most common
+def zipf_weights(n, exponent=1.1):
+    weights = 1 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+# Fiscal week of each date, the fiscal year starts on the 1st of November (2023-11-06 -> FY24Q1W1)
+# the last days of a quarter are counted in week 13
+def fiscal_weeks(dates):
+    dates = pd.DatetimeIndex(dates)
+    fiscal_year = dates.year + (dates.month >= 11)
+    quarter = ((dates.month - 11) % 12) // 3 + 1
+    quarter_start_month = (10 + 3 * (quarter - 1)) % 12 + 1
+    quarter_start = pd.to_datetime(pd.DataFrame({
+        'year': np.where(quarter_start_month >= 11, fiscal_year - 1, fiscal_year),
+        'month': quarter_start_month, 'day': 1}))
+    week = np.minimum((dates - pd.DatetimeIndex(quarter_start)).days // 7 + 1, 13)
+    return pd.Series(fiscal_year % 100).map('FY{:02d}'.format).to_numpy() \
+        + 'Q' + quarter.astype(str) + 'W' + np.asarray(week).astype(str)
+
+
+# Generated SEMS export with `rows` rows, SEMS created on the `days` days up to `end`
+# The same seed gives the same data
+def generate_sems(rows, seed=0, end='2023-06-30', days=365):
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end)
+    # more SEMS on weekdays and a slow upward trend over the period
+    day = rng.choice(days, size=rows, p=_day_weights(end, days))
+    created = (end.normalize() - pd.to_timedelta(days - 1 - day, unit='D')
+               + pd.to_timedelta(rng.integers(7 * 3600, 19 * 3600, rows), unit='s'))
+    age = np.round(rng.gamma(1.5, 6, rows), 2)
+    modified = created + pd.to_timedelta(np.minimum(age * 86400, (end + pd.Timedelta(days=1) - created).total_seconds()),
+                                         unit='s')
+    modified = modified.floor('s')
+    # SEMS created recently are more likely to still be open
+    open_share = np.clip(0.15 + 0.6 * (day / days) ** 4, 0, 0.9)
+    status = np.where(rng.random(rows) < open_share, 'Open', np.where(rng.random(rows) < 0.9, 'Closed', 'Cancelled'))
+
+    issue_names = list(ISSUES)
+    issue = rng.choice(len(issue_names), size=rows, p=ISSUE_WEIGHTS)
+    sub_issue = np.empty(rows, dtype=object)
+    for i, name in enumerate(issue_names):
+        rows_of_issue = np.flatnonzero(issue == i)
+        sub_issue[rows_of_issue] = rng.choice(ISSUES[name], size=len(rows_of_issue),
+                                              p=zipf_weights(len(ISSUES[name]), 0.8))
+    customers = max(50, rows * CUSTOMERS_PER_1000 // 1000)
+    carrier = np.array(CARRIERS, dtype=object)[rng.choice(len(CARRIERS), size=rows, p=zipf_weights(len(CARRIERS)))]
+    carrier[rng.random(rows) < 0.01] = None
+    team = np.array(TEAMS, dtype=object)[rng.choice(len(TEAMS), size=rows, p=zipf_weights(len(TEAMS), 0.9))]
+    team[rng.random(rows) < 0.02] = None
+    priority = np.where(rng.random(rows) < 0.3, 'P1', 'P2')
+
+    return pd.DataFrame({
+        'SEM ID': 'SEM' + pd.Series(rng.permutation(rows) + 10_000_000).astype(str),
+        'FW': fiscal_weeks(created),
+        'Created On': created,
+        'Modified Date Time': modified,
+        'SEM Status': status,
+        'Priority': priority,
+        'CAT': rng.choice(['RO', 'TEL', 'AOU'], size=rows, p=[0.7, 0.22, 0.08]),
+        'Sales Region': rng.choice(REGIONS, size=rows, p=REGION_WEIGHTS),
+        'Sales District': rng.choice(['North', 'South', 'East', 'West'], size=rows),
+        'Carrier': carrier,
+        'Sold-To ID': pd.Series(rng.choice(customers, size=rows, p=zipf_weights(customers, 1.05)) + 1000).map(
+            'ST{:07d}'.format).to_numpy(),
+        'Assigned To Team': team,
+        'Assigned To User Name': pd.Series(rng.integers(1, 200, rows)).map('user{:03d}'.format).to_numpy(),
+        'Created by Team Name': rng.choice(CREATED_BY_TEAMS, size=rows, p=CREATED_BY_WEIGHTS),
+        'SEM Issue Type': np.array(issue_names, dtype=object)[issue],
+        'SEM Sub issue Type': sub_issue,
+        'Root Cause': rng.choice(ROOT_CAUSES, size=rows, p=ROOT_CAUSE_WEIGHTS),
+        'Resolution': np.where(status == 'Closed', 'Resolved with carrier', None),
+        'RMA  Nr': np.where(rng.random(rows) < 0.05, rng.integers(100000, 999999, rows).astype(str), None),
+        'Action Age [Days]': age,
+        'Wk 12/13': None,
+    })
+
+
+# Generated export the way the dashboard holds it after an upload (dashboard columns, data filter,
+# dates and categoricals, see ingest.load_sems), without writing and parsing a workbook
+def prepared_sems(rows, seed=0, **kwargs):
+    raw_df = generate_sems(rows, seed, **kwargs)
+    read = ingest.read_column_filter()
+    sems_df, _ = ingest.data_filter(raw_df[[col for col in raw_df.columns if read(col)]])
+    return ingest.to_categoricals(ingest.prepare_dates(sems_df.reset_index(drop=True)))
+
+
+# Share of the SEMS created on each of the `days` days up to `end`
+def _day_weights(end, days):
+    dates = pd.date_range(end=end.normalize(), periods=days, freq='D')
+    weights = np.where(dates.dayofweek < 5, 1.0, 0.25) * np.linspace(0.8, 1.2, days)
+    return weights / weights.sum()
+
+
+# Write a generated export as an xlsx workbook, the way the SEMS export looks (one sheet, dates as dates)
+def write_workbook(df, path):
+    followup.write_xlsx(df, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic SEMS export")
+    parser.add_argument("rows", type=int, help="number of SEMS")
+    parser.add_argument("path", help="xlsx file to write")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    parser.add_argument("--end", default="2023-06-30", help="last day SEMS are created on (default: 2023-06-30)")
+    parser.add_argument("--days", type=int, default=365, help="days of SEMS (default: 365)")
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    write_workbook(generate_sems(args.rows, args.seed, args.end, args.days), args.path)
+    print(f"Wrote {args.rows} SEMS to {args.path} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# Trendlines for the carrier and customer deep dives
+# Rather than letting plotly fit a statsmodels OLS model for every chart, the daily SEM counts of
+# every carrier (or customer) are put in one matrix and the least squares line of every row is
+# solved in closed form with a handful of matrix products.
+import numpy as np
+import pandas as pd
+
+
+# Daily SEM counts and the least squares trendline for every value of `column`
+# Like plotly's trendline="ols" the line is fitted to the days that have at least one SEM
+# Returns a dict with
+#   index: value (as a string) -> row of the matrices
+#   days: DatetimeIndex of the matrix columns
+#   counts: SEMS per value per day
+#   slope, intercept: line of each row, in SEMS per day with day 0 = days[0]
+def trend_lines(df, column, date_column='Created On'):
+    col = df[column]
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        codes, values = col.cat.codes.to_numpy(), col.cat.categories
+    else:
+        codes, values = pd.factorize(col)
+    dates = pd.to_datetime(df[date_column]).dt.normalize()
+    keep = (codes >= 0) & dates.notna().to_numpy()
+    # only the values in df get a row, a categorical's categories are every carrier / customer of
+    # the whole history and a narrow date range holds a few of them
+    # (int64 so codes * n_days can't overflow the small int type of categorical codes)
+    codes, present = pd.factorize(codes[keep])
+    codes = codes.astype(np.int64)
+    values = values[present]
+    dates = dates[keep]
+
+    if len(dates):
+        days = pd.date_range(dates.min(), dates.max(), freq='D')
+    else:
+        days = pd.DatetimeIndex([])
+    day_codes = ((dates - days[0]).dt.days.to_numpy() if len(days) else np.empty(0, dtype=np.int64))
+    n_values, n_days = len(values), len(days)
+    counts = np.bincount(codes * n_days + day_codes, minlength=n_values * n_days)
+    counts = counts.reshape(n_values, n_days)
+
+    # least squares over the observed days of each row: sums of x, y, x^2, xy over those days
+    x = np.arange(n_days, dtype=float)
+    observed = (counts > 0).astype(float)
+    n = observed.sum(axis=1)
+    sum_x = observed @ x
+    sum_xx = observed @ (x * x)
+    sum_y = counts.sum(axis=1).astype(float)
+    sum_xy = counts @ x
+    denominator = n * sum_xx - sum_x ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(denominator > 0, (n * sum_xy - sum_x * sum_y) / denominator, 0.0)
+        intercept = np.where(n > 0, (sum_y - slope * sum_x) / n, 0.0)
+
+    return {
+        "index": {str(value): i for i, value in enumerate(values)},
+        "days": days,
+        "counts": counts,
+        "slope": slope,
+        "intercept": intercept,
+    }
+
+
+# Observed daily counts and fitted trend for one value, as a Date / Count / Trend dataframe
+def entity_trend(trends, value):
+    row = trends["index"].get(str(value))
+    if row is None:
+        return pd.DataFrame({"Date": pd.DatetimeIndex([]), "Count": [], "Trend": []})
+    counts = trends["counts"][row]
+    observed = np.flatnonzero(counts)
+    return pd.DataFrame({
+        "Date": trends["days"][observed],
+        "Count": counts[observed],
+        "Trend": trends["intercept"][row] + trends["slope"][row] * observed,
+    })